@@ -1,8 +1,223 @@
-from cassandra.cluster import Cluster
+from cassandra import OperationTimedOut, Timeout, Unavailable
+from cassandra.cluster import Cluster, NoHostAvailable, ResultSet
+from cassandra.policies import DCAwareRoundRobinPolicy, TokenAwarePolicy
+from cassandra.query import SimpleStatement, Statement, BatchStatement
+from utils.bulkhead import create_bulkhead, BackendSaturated
+from utils.metrics import Query, register_gauge
+import asyncio
 import os
+import re
+import threading
 
-cluster = Cluster([os.getenv("CASSANDRA_HOST", "127.0.0.1")])
-session = cluster.connect("airport")
+CONCURRENCY = int(os.getenv("CASSANDRA_CONCURRENCY", "64"))
+NOT_CONNECTED_RETRY_AFTER = max(1, round(float(os.getenv("WARMUP_RETRY_SECONDS", "5"))))
 
+cluster = None
+session = None
+_pid = None
+_connect_lock = threading.Lock()
+
+def _cluster_options():
+    options = {
+        "port": int(os.getenv("CASSANDRA_PORT", "9042")),
+        "connect_timeout": float(os.getenv("CASSANDRA_CONNECT_TIMEOUT", "5")),
+        "executor_threads": int(os.getenv("CASSANDRA_EXECUTOR_THREADS", "2")),
+        "idle_heartbeat_interval": float(os.getenv("CASSANDRA_HEARTBEAT_SECONDS", "30")),
+    }
+    if os.getenv("CASSANDRA_PROTOCOL_VERSION"):
+        options["protocol_version"] = int(os.environ["CASSANDRA_PROTOCOL_VERSION"])
+    if os.getenv("CASSANDRA_LOCAL_DC"):
+        options["load_balancing_policy"] = TokenAwarePolicy(
+            DCAwareRoundRobinPolicy(local_dc=os.environ["CASSANDRA_LOCAL_DC"])
+        )
+    return options
+
+# Blocks until the control connection is up, so the lifespan runs it in a
+# thread. A Cluster is not fork-safe: a process that inherited one from its
+# parent drops it and connects again.
+def connect_cassandra():
+    global cluster, session, _pid
+    with _connect_lock:
+        if session is not None and _pid == os.getpid():
+            return session
+        hosts = os.getenv("CASSANDRA_HOSTS", os.getenv("CASSANDRA_HOST", "127.0.0.1"))
+        cluster = Cluster([host.strip() for host in hosts.split(",")], **_cluster_options())
+        session = cluster.connect(os.getenv("CASSANDRA_KEYSPACE", "airport"))
+        session.default_timeout = float(os.getenv("CASSANDRA_REQUEST_TIMEOUT", "10"))
+        _pid = os.getpid()
+        return session
+
+# Requests never connect: Cluster.connect blocks for up to connect_timeout,
+# which would stall the event loop and every route with it. Until warmup has
+# connected this process, Cassandra-backed requests fail fast with a 503.
 def get_cassandra_session():
-    return session
\ No newline at end of file
+    if session is None or _pid != os.getpid():
+        raise BackendSaturated("cassandra", NOT_CONNECTED_RETRY_AFTER)
+    return session
+
+def close_cassandra():
+    global cluster, session
+    # Waits for a connect still running in the warmup thread
+    with _connect_lock:
+        if _pid == os.getpid():
+            if cluster is not None:
+                cluster.shutdown()
+            elif session is not None:
+                session.shutdown()
+        cluster = session = None
+
+# Replaces the session, e.g. with an in-memory double in benchmarks
+def set_cassandra_session(new_session):
+    global session, _pid
+    session = new_session
+    _pid = os.getpid()
+
+# ResponseFuture callbacks fire on a driver thread, so results are handed
+# back to the event loop with call_soon_threadsafe.
+def _set_result(future, value):
+    if not future.done():
+        future.set_result(value)
+
+def _set_exception(future, exc):
+    if not future.done():
+        future.set_exception(exc)
+
+def _wait_page(response_future, fetch_next=False):
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    if fetch_next:
+        response_future.clear_callbacks()
+        response_future.start_fetching_next_page()
+
+    response_future.add_callbacks(
+        callback=lambda rows: loop.call_soon_threadsafe(_set_result, future, rows),
+        errback=lambda exc: loop.call_soon_threadsafe(_set_exception, future, exc)
+    )
+    return future
+
+def _statement(query, parameters=None, fetch_size=None):
+    if fetch_size is None:
+        return query, parameters
+    if isinstance(query, str):
+        return SimpleStatement(query, fetch_size=fetch_size), parameters
+    if not isinstance(query, Statement):
+        # PreparedStatement: bind here so the page size stays per-call
+        query = query.bind(parameters or ())
+        parameters = None
+    query.fetch_size = fetch_size
+    return query, parameters
+
+_CQL_TARGET = re.compile(r"^\s*(\w+)\s+(?:.*?\b(?:FROM|INTO)\s+)?([\w.]+)", re.IGNORECASE | re.DOTALL)
+_operations = {}
+
+# Metric label for a statement, e.g. "SELECT tickets_by_flight"
+def _operation(query):
+    if isinstance(query, BatchStatement):
+        return "BATCH"
+    text = query if isinstance(query, str) else getattr(query, "query_string", None)
+    if text is None:
+        text = getattr(getattr(query, "prepared_statement", None), "query_string", "")
+    operation = _operations.get(text)
+    if operation is None:
+        match = _CQL_TARGET.match(text)
+        operation = f"{match.group(1).upper()} {match.group(2)}" if match else "CQL"
+        if len(_operations) < 1000:
+            _operations[text] = operation
+    return operation
+
+def _start(query, parameters=None, fetch_size=None, paging_state=None):
+    statement, parameters = _statement(query, parameters, fetch_size)
+    return get_cassandra_session().execute_async(
+        statement, parameters, paging_state=paging_state
+    )
+
+# The statement is only sent once the bulkhead admits the query
+async def _first_page(timer, query, parameters=None, fetch_size=None, paging_state=None):
+    response_future = None
+
+    def start():
+        nonlocal response_future
+        response_future = _start(query, parameters, fetch_size, paging_state)
+        return _wait_page(response_future)
+
+    rows = await timer.wait(start)
+    return response_future, rows
+
+async def execute(query, parameters=None):
+    timer = Query("cassandra", _operation(query))
+    response_future, rows = await _first_page(timer, query, parameters)
+    rows = list(rows)
+    while response_future.has_more_pages:
+        rows.extend(await timer.wait(lambda: _wait_page(response_future, fetch_next=True)))
+    timer.rows = len(rows)
+    timer.finish()
+    return rows
+
+async def execute_one(query, parameters=None):
+    timer = Query("cassandra", _operation(query))
+    _, rows = await _first_page(timer, query, parameters)
+    timer.rows = 1 if rows else 0
+    timer.finish()
+    return rows[0] if rows else None
+
+async def iter_rows(query, parameters=None, fetch_size=1000):
+    timer = Query("cassandra", _operation(query))
+    try:
+        response_future, rows = await _first_page(timer, query, parameters, fetch_size)
+        while True:
+            for row in rows:
+                timer.rows += 1
+                yield row
+            if not response_future.has_more_pages:
+                return
+            rows = await timer.wait(lambda: _wait_page(response_future, fetch_next=True))
+    finally:
+        timer.finish()
+
+async def fetch_page(query, parameters=None, fetch_size=100, paging_state=None):
+    timer = Query("cassandra", _operation(query))
+    response_future, rows = await _first_page(timer, query, parameters, fetch_size, paging_state)
+    # Callbacks deliver bare rows; the page's ResultSet exposes its paging state
+    page = ResultSet(response_future, rows)
+    rows = list(rows)
+    next_state = page.paging_state if page.has_more_pages else None
+    timer.rows = len(rows)
+    timer.finish()
+    return rows, next_state
+
+# Runs many statements with at most `concurrency` requests in flight.
+# Results keep input order; failures are returned as exception objects.
+async def execute_concurrent(statements_and_params, concurrency=CONCURRENCY):
+    items = list(statements_and_params)
+    results = [None] * len(items)
+    positions = iter(range(len(items)))
+
+    async def worker():
+        for position in positions:
+            statement, parameters = items[position]
+            try:
+                results[position] = await execute(statement, parameters)
+            except Exception as e:
+                results[position] = e
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(items)))))
+    return results
+
+# Open connections and requests in flight per host, from the driver's pools
+def _pool_state():
+    state = getattr(session, "get_pool_state", None)
+    if state is None:
+        return []
+    samples = []
+    for host, pool in state().items():
+        labels = {"host": str(host)}
+        samples.append(({**labels, "kind": "open_connections"}, pool["open_count"]))
+        samples.append(({**labels, "kind": "in_flight"}, sum(pool["in_flights"])))
+    return samples
+
+register_gauge("cassandra_pool", "Cassandra connection pool state per host.", _pool_state)
+create_bulkhead(
+    "cassandra", max_limit=int(os.getenv("CASSANDRA_MAX_INFLIGHT", "512")),
+    overload_errors=(OperationTimedOut, Timeout, Unavailable, NoHostAvailable)
+)
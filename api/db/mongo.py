@@ -1,8 +1,160 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import AutoReconnect, ExecutionTimeout, WaitQueueTimeoutError
+from utils.bulkhead import create_bulkhead
+from utils.metrics import Query, timed, register_pool
 import os
 
-client = AsyncIOMotorClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
-db = client["airport_db"]
+# Motor option -> environment variable; unset ones keep the driver default
+MONGO_OPTIONS = {
+    "maxPoolSize": "MONGO_MAX_POOL_SIZE",
+    "minPoolSize": "MONGO_MIN_POOL_SIZE",
+    "maxIdleTimeMS": "MONGO_MAX_IDLE_TIME_MS",
+    "waitQueueTimeoutMS": "MONGO_WAIT_QUEUE_TIMEOUT_MS",
+    "connectTimeoutMS": "MONGO_CONNECT_TIMEOUT_MS",
+    "serverSelectionTimeoutMS": "MONGO_SERVER_SELECTION_TIMEOUT_MS",
+    "socketTimeoutMS": "MONGO_SOCKET_TIMEOUT_MS",
+}
+
+client = None
+db = None
+_pid = None
+
+def connect_mongo():
+    global client, db, _pid
+    options = {option: int(os.environ[env]) for option, env in MONGO_OPTIONS.items() if os.getenv(env)}
+    client = AsyncIOMotorClient(
+        os.getenv("MONGO_URI", "mongodb://localhost:27017"), appname="airport-api", **options
+    )
+    db = client[os.getenv("MONGO_DATABASE", "airport_db")]
+    _pid = os.getpid()
+    return db
+
+# Connects on first use. A client inherited across fork() shares sockets
+# with the parent, so every worker process opens its own.
+def get_mongo_database():
+    if db is None or _pid != os.getpid():
+        connect_mongo()
+    return db
+
+def close_mongo():
+    global client, db
+    if client is not None and _pid == os.getpid():
+        client.close()
+    client = db = None
+
+# Cursor methods return a new cursor lazily; the query itself runs when the
+# cursor is iterated. Everything else listed is a single awaited round trip.
+CURSOR_METHODS = {"find", "aggregate"}
+CURSOR_CHAINING = {"sort", "skip", "limit", "batch_size", "hint", "max_time_ms", "comment", "collation"}
+QUERY_METHODS = {
+    "find_one", "find_one_and_update", "find_one_and_delete", "find_one_and_replace",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "bulk_write", "count_documents",
+    "estimated_document_count", "distinct", "create_index",
+}
+
+def _returned(result):
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    return 1 if isinstance(result, dict) else 0
+
+class InstrumentedCursor:
+    def __init__(self, cursor, query: Query):
+        self._cursor = cursor
+        self._query = query
+        self._iterator = None
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name in CURSOR_CHAINING:
+            def chain(*args, **kwargs):
+                attr(*args, **kwargs)
+                return self
+            return chain
+        return attr
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._iterator is None:
+            self._iterator = self._cursor.__aiter__()
+        try:
+            doc = await self._query.wait(self._iterator.__anext__)
+        except StopAsyncIteration:
+            self._query.finish()
+            raise
+        self._query.rows += 1
+        return doc
+
+    async def to_list(self, length=None):
+        documents = await self._query.wait(lambda: self._cursor.to_list(length))
+        self._query.rows += len(documents)
+        self._query.finish()
+        return documents
+
+    def __del__(self):
+        # Cursors abandoned mid-iteration still get their time recorded
+        self._query.finish()
+
+class InstrumentedCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        operation = f"{name} {self._collection.name}"
+        if name in CURSOR_METHODS:
+            return lambda *args, **kwargs: InstrumentedCursor(attr(*args, **kwargs), Query("mongo", operation))
+        if name in QUERY_METHODS:
+            return lambda *args, **kwargs: timed("mongo", operation, lambda: attr(*args, **kwargs), _returned)
+        return attr
 
 def get_mongo_collection(name: str):
-    return db[name]
\ No newline at end of file
+    return InstrumentedCollection(get_mongo_database()[name])
+
+# One $in query for many keys; keys that match nothing are left out
+async def find_by_keys(collection, field, keys, projection):
+    documents = {}
+    async for doc in collection.find({field: {"$in": list(keys)}}, projection):
+        documents[doc[field]] = doc
+    return documents
+
+# Runs callback(session) in a multi-document transaction (the server must be
+# a replica set); commit and transient errors are retried by the driver, so
+# the callback may run more than once.
+async def run_in_transaction(callback):
+    async with await get_mongo_database().client.start_session() as session:
+        return await session.with_transaction(callback)
+
+# A standalone server only rejects transactions at the first write, so
+# warmup checks the topology up front. mongos routes to replica sets too.
+async def check_transactions():
+    hello = await get_mongo_database().command("hello")
+    if "setName" not in hello and hello.get("msg") != "isdbgrid":
+        raise RuntimeError("MongoDB is not a replica set, passenger writes need transactions")
+
+# Replaces the database, e.g. with an in-memory double in benchmarks
+def set_mongo_database(database):
+    global db, _pid
+    db = database
+    _pid = os.getpid()
+
+def _pool_size():
+    return client.options.pool_options.max_pool_size if client is not None else 0
+
+register_pool("mongo", _pool_size)
+create_bulkhead(
+    "mongo", max_limit=int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+    overload_errors=(AutoReconnect, ExecutionTimeout, WaitQueueTimeoutError)
+)
+
+# Passenger documents embed an unbounded tickets array (tickets themselves
+# are served from Cassandra), so profile lookups leave it out.
+PASSENGER_PROFILE = {"_id": 0, "tickets": 0}
+
+# Single and multi-get lookups share the aircraft cache, so both load the
+# same shape: the stored document without its ObjectId.
+AIRCRAFT_DOCUMENT = {"_id": 0}
@@ -1,10 +1,148 @@
-from neo4j import GraphDatabase
+from neo4j import AsyncGraphDatabase, READ_ACCESS, WRITE_ACCESS
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+from utils.bulkhead import create_bulkhead
+from utils.metrics import Query, register_pool
 import os
+import re
 
-driver = GraphDatabase.driver(
-    os.getenv("NEO4J_URI", "bolt://localhost:7687"),
-    auth=(os.getenv("NEO4J_USER", "neo4j"), os.getenv("NEO4J_PASSWORD", "test1234"))
-)
+POOL_SIZE = int(os.getenv("NEO4J_POOL_SIZE", "100"))
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE") or None
+
+driver = None
+_pid = None
 
+def connect_neo4j():
+    global driver, _pid
+    driver = AsyncGraphDatabase.driver(
+        os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+        auth=(os.getenv("NEO4J_USER", "neo4j"), os.getenv("NEO4J_PASSWORD", "test1234")),
+        max_connection_pool_size=POOL_SIZE,
+        connection_acquisition_timeout=float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "60")),
+        connection_timeout=float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "30")),
+        max_connection_lifetime=float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+    )
+    _pid = os.getpid()
+    return driver
+
+# Connects on first use; a driver inherited across fork() is replaced
 def get_neo4j_driver():
-    return driver
\ No newline at end of file
+    if driver is None or _pid != os.getpid():
+        connect_neo4j()
+    return driver
+
+async def close_neo4j():
+    global driver
+    if driver is not None and _pid == os.getpid():
+        await driver.close()
+    driver = None
+
+# Replaces the driver, e.g. with an in-memory double in benchmarks
+def set_neo4j_driver(new_driver):
+    global driver, _pid
+    driver = new_driver
+    _pid = os.getpid()
+
+_CYPHER_CLAUSE = re.compile(r"^\s*(\w+)")
+_CYPHER_LABEL = re.compile(r"\(\s*\w*\s*:\s*(\w+)")
+
+# Metric label for a query: first clause and first node label, e.g. "MATCH Passenger"
+def _operation(query):
+    clause = _CYPHER_CLAUSE.match(query)
+    label = _CYPHER_LABEL.search(query)
+    operation = clause.group(1).upper() if clause else "CYPHER"
+    return f"{operation} {label.group(1)}" if label else operation
+
+class InstrumentedResult:
+    def __init__(self, result, query: Query):
+        self._result = result
+        self._query = query
+        self._iterator = None
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._iterator is None:
+            self._iterator = self._result.__aiter__()
+        try:
+            record = await self._query.wait(self._iterator.__anext__)
+        except StopAsyncIteration:
+            self._query.finish()
+            raise
+        self._query.rows += 1
+        return record
+
+    async def single(self, *args, **kwargs):
+        record = await self._query.wait(lambda: self._result.single(*args, **kwargs))
+        self._query.rows += record is not None
+        self._query.finish()
+        return record
+
+    async def data(self, *keys):
+        records = await self._query.wait(lambda: self._result.data(*keys))
+        self._query.rows += len(records)
+        self._query.finish()
+        return records
+
+    async def consume(self):
+        summary = await self._query.wait(self._result.consume)
+        self._query.finish()
+        return summary
+
+class _Runner:
+    """Times run() on a session or transaction; results that are never
+    consumed (e.g. writes) are recorded when the session closes."""
+
+    def __init__(self, target, queries):
+        self._target = target
+        self._queries = queries
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    async def run(self, query, parameters=None, **kwargs):
+        timer = Query("neo4j", _operation(query))
+        self._queries.append(timer)
+        result = await timer.wait(lambda: self._target.run(query, parameters, **kwargs))
+        return InstrumentedResult(result, timer)
+
+class InstrumentedTransaction(_Runner):
+    async def commit(self):
+        timer = Query("neo4j", "COMMIT")
+        self._queries.append(timer)
+        await timer.wait(self._target.commit)
+        timer.finish()
+
+class InstrumentedSession(_Runner):
+    def __init__(self, session):
+        super().__init__(session, [])
+
+    async def __aenter__(self):
+        await self._target.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        try:
+            return await self._target.__aexit__(*exc_info)
+        finally:
+            for timer in self._queries:
+                timer.finish()
+
+    async def begin_transaction(self, *args, **kwargs):
+        return InstrumentedTransaction(await self._target.begin_transaction(*args, **kwargs), self._queries)
+
+# Read sessions are routed to followers/read replicas on neo4j:// cluster URIs.
+def get_neo4j_session(read_only: bool = True):
+    return InstrumentedSession(get_neo4j_driver().session(
+        database=NEO4J_DATABASE,
+        default_access_mode=READ_ACCESS if read_only else WRITE_ACCESS
+    ))
+
+register_pool("neo4j", lambda: POOL_SIZE)
+create_bulkhead(
+    "neo4j", max_limit=POOL_SIZE,
+    overload_errors=(ServiceUnavailable, SessionExpired, TransientError)
+)
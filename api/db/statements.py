@@ -0,0 +1,134 @@
+from db.cassandra import get_cassandra_session, NOT_CONNECTED_RETRY_AFTER
+from utils.bulkhead import BackendSaturated
+from itertools import combinations
+
+TICKET_UPDATE_COLUMNS = ("seat", "class_place", "price")
+
+# Every ticket is stored in its primary table and in two query tables
+# partitioned by passenger and by flight; the tuple is each table's full key.
+TICKET_TABLES = {
+    "tickets": ("ticket_id",),
+    "tickets_by_passenger": ("passenger_id", "booking_date", "ticket_id"),
+    "tickets_by_flight": ("flight_id", "booking_date", "ticket_id"),
+}
+
+TICKET_COLUMNS = (
+    "ticket_id", "passenger_id", "flight_id",
+    "seat", "class_place", "price", "booking_date"
+)
+
+def _insert_query(table):
+    return (
+        f"INSERT INTO {table} ({', '.join(TICKET_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in TICKET_COLUMNS)})"
+    )
+
+def _key_condition(table):
+    return " AND ".join(f"{column} = ?" for column in TICKET_TABLES[table])
+
+QUERIES = {
+    "insert_ticket": _insert_query("tickets"),
+    "insert_ticket_by_passenger": _insert_query("tickets_by_passenger"),
+    "insert_ticket_by_flight": _insert_query("tickets_by_flight"),
+    "select_ticket": "SELECT * FROM tickets WHERE ticket_id = ?",
+    "select_tickets": "SELECT * FROM tickets",
+    "select_tickets_by_passenger": "SELECT * FROM tickets_by_passenger WHERE passenger_id = ?",
+    "select_tickets_by_flight": "SELECT * FROM tickets_by_flight WHERE flight_id = ?",
+    "select_tickets_by_passenger_and_flight": """
+        SELECT * FROM tickets_by_passenger
+        WHERE passenger_id = ? AND flight_id = ? ALLOW FILTERING
+    """,
+    "delete_ticket": f"DELETE FROM tickets WHERE {_key_condition('tickets')}",
+    "delete_ticket_by_passenger": f"DELETE FROM tickets_by_passenger WHERE {_key_condition('tickets_by_passenger')}",
+    "delete_ticket_by_flight": f"DELETE FROM tickets_by_flight WHERE {_key_condition('tickets_by_flight')}",
+    "delete_passenger_tickets": "DELETE FROM tickets_by_passenger WHERE passenger_id = ?",
+    "increment_passenger_spend": "UPDATE passenger_spend SET total_cents = total_cents + ? WHERE passenger_id = ?",
+    "select_passenger_spend": "SELECT total_cents FROM passenger_spend WHERE passenger_id = ?",
+    "delete_passenger_spend": "DELETE FROM passenger_spend WHERE passenger_id = ?",
+    "select_flight_statuses": "SELECT * FROM flight_status",
+    "select_flight_status": "SELECT * FROM flight_status WHERE flight_id = ?",
+    "select_ticket_baggage": "SELECT baggage_id FROM baggage WHERE ticket_id = ?",
+    "delete_baggage": "DELETE FROM baggage WHERE baggage_id = ?",
+    "select_flight_seats": "SELECT seat FROM flight_seats WHERE flight_id = ?",
+    "claim_seat": "INSERT INTO flight_seats (flight_id, seat, ticket_id) VALUES (?, ?, ?) IF NOT EXISTS",
+    "release_seat": "DELETE FROM flight_seats WHERE flight_id = ? AND seat = ? IF ticket_id = ?",
+    "select_flight_baggage": "SELECT ticket_id FROM baggage_by_flight WHERE flight_id = ?",
+    "delete_flight_baggage": "DELETE FROM baggage_by_flight WHERE flight_id = ? AND ticket_id = ? AND baggage_id = ?",
+}
+
+_prepared = {}
+_prepared_session = None
+_select_variants = {}
+
+def _update_key(table, columns):
+    return ("update", table) + tuple(columns)
+
+def _select_key(name, columns):
+    return ("select", name) + tuple(columns)
+
+# Narrowed variants of the SELECT * queries. Routers declare the column
+# lists they can ask for at import time and all of them are prepared with
+# the fixed statements, so handlers only bind values.
+def _select_query(name, columns):
+    return QUERIES[name].replace("SELECT *", f"SELECT {', '.join(columns)}", 1)
+
+def declare_select(name, columns):
+    key = _select_key(name, columns)
+    _select_variants[key] = _select_query(name, columns)
+
+def declare_field_selects(name, allowed, key=()):
+    """Declares every column list parse_fields() can produce for ?fields=:
+    the key, then any subset of the other fields in declaration order."""
+    optional = [column for column in allowed if column not in key]
+    for size in range(len(optional) + 1):
+        for columns in combinations(optional, size):
+            declare_select(name, tuple(key) + columns)
+
+def _update_query(table, columns):
+    assignments = ", ".join(f"{column} = ?" for column in columns)
+    return f"UPDATE {table} SET {assignments} WHERE {_key_condition(table)}"
+
+# One UPDATE per ticket table and non-empty combination of columns, so
+# partial updates never build CQL at request time.
+def _update_variants():
+    for table in TICKET_TABLES:
+        for size in range(1, len(TICKET_UPDATE_COLUMNS) + 1):
+            for columns in combinations(TICKET_UPDATE_COLUMNS, size):
+                yield _update_key(table, columns), _update_query(table, columns)
+
+# Prepared statements belong to the session that prepared them. Preparing
+# blocks on a round trip per statement, so it runs in the warmup thread and
+# the set is published only once complete.
+def prepare_statements(session):
+    global _prepared, _prepared_session
+    prepared = {}
+    for name, query in QUERIES.items():
+        prepared[name] = session.prepare(query)
+    for key, query in _update_variants():
+        prepared[key] = session.prepare(query)
+    for key, query in list(_select_variants.items()):
+        prepared[key] = session.prepare(query)
+    _prepared, _prepared_session = prepared, session
+    return prepared
+
+def get_statement(name):
+    session = get_cassandra_session()
+    if _prepared_session is not session:
+        # Connected, but warmup has not finished preparing yet
+        raise BackendSaturated("cassandra", NOT_CONNECTED_RETRY_AFTER)
+    statement = _prepared.get(name)
+    if statement is None:
+        raise KeyError(f"Statement {name!r} is not declared; add it to QUERIES or declare_select()")
+    return statement
+
+def get_select_statement(name, columns=None):
+    if columns is None:
+        return get_statement(name)
+    return get_statement(_select_key(name, columns))
+
+def bind_ticket_update(table, key, values):
+    columns = tuple(column for column in TICKET_UPDATE_COLUMNS if column in values)
+    if not columns:
+        raise ValueError("No columns to update")
+    params = [values[column] for column in columns] + list(key)
+    return get_statement(_update_key(table, columns)), params
@@ -0,0 +1,74 @@
+from cassandra.query import BatchStatement, BatchType
+from db.cassandra import execute
+from db.statements import TICKET_TABLES, get_statement, bind_ticket_update
+from decimal import Decimal, ROUND_HALF_UP
+
+def ticket_from_row(row, columns=None):
+    if columns is None:
+        return {
+            "ticket_id": row.ticket_id,
+            "passenger_id": row.passenger_id,
+            "flight_id": row.flight_id,
+            "seat": row.seat,
+            "class_place": row.class_place,
+            "price": float(row.price),
+            "booking_date": row.booking_date
+        }
+    # Rows from a narrowed SELECT only carry the selected columns
+    ticket = {column: getattr(row, column) for column in columns}
+    if ticket.get("price") is not None:
+        ticket["price"] = float(ticket["price"])
+    return ticket
+
+# Writes touching all ticket tables go through a logged batch so the
+# denormalized copies cannot drift from the primary row on partial failure.
+
+def _row_value(row, column):
+    return row[column] if isinstance(row, dict) else getattr(row, column)
+
+def ticket_key(table, row):
+    return [_row_value(row, column) for column in TICKET_TABLES[table]]
+
+def insert_ticket_batch(ticket):
+    batch = BatchStatement(batch_type=BatchType.LOGGED)
+    params = (
+        ticket["ticket_id"], ticket["passenger_id"], ticket["flight_id"],
+        ticket["seat"], ticket["class_place"], ticket["price"], ticket["booking_date"]
+    )
+    batch.add(get_statement("insert_ticket"), params)
+    batch.add(get_statement("insert_ticket_by_passenger"), params)
+    batch.add(get_statement("insert_ticket_by_flight"), params)
+    return batch
+
+def update_ticket_batch(existing, values):
+    batch = BatchStatement(batch_type=BatchType.LOGGED)
+    for table in TICKET_TABLES:
+        statement, params = bind_ticket_update(table, ticket_key(table, existing), values)
+        batch.add(statement, params)
+    return batch
+
+# baggage_ids also removes the ticket's baggage from both baggage tables
+def delete_ticket_batch(existing, include_passenger_table=True, baggage_ids=()):
+    batch = BatchStatement(batch_type=BatchType.LOGGED)
+    batch.add(get_statement("delete_ticket"), ticket_key("tickets", existing))
+    batch.add(get_statement("delete_ticket_by_flight"), ticket_key("tickets_by_flight", existing))
+    if include_passenger_table:
+        batch.add(
+            get_statement("delete_ticket_by_passenger"),
+            ticket_key("tickets_by_passenger", existing)
+        )
+    ticket_id, flight_id = _row_value(existing, "ticket_id"), _row_value(existing, "flight_id")
+    for baggage_id in baggage_ids:
+        batch.add(get_statement("delete_baggage"), [baggage_id])
+        batch.add(get_statement("delete_flight_baggage"), [flight_id, ticket_id, baggage_id])
+    return batch
+
+# passenger_spend keeps a running total per passenger in integer cents,
+# since counters cannot hold decimals (and cannot join a logged batch).
+
+def to_cents(price):
+    return int((Decimal(str(price)) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+async def adjust_passenger_spend(passenger_id, delta_cents):
+    if delta_cents:
+        await execute(get_statement("increment_passenger_spend"), [delta_cents, passenger_id])
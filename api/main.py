@@ -1,13 +1,51 @@
-from fastapi import FastAPI
-from routers import aircrafts, passengers, tickets, routes
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from routers import aircrafts, passengers, tickets, flights, routes, cache, export, outbox, metrics, health
+from services.country_stats import reconcile_periodically
+from services.outbox import run_outbox_worker
+from services.route_engine import route_engine
+from services.lifecycle import warm_up, shutdown
+from utils.metrics import MetricsMiddleware
+from utils.bulkhead import BackendSaturated
+import asyncio
+
+# Nothing connects at import time, so the app can be imported before
+# gunicorn/uvicorn fork their workers; each worker connects in its lifespan.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup_task = asyncio.create_task(warm_up())
+    reconcile_task = asyncio.create_task(reconcile_periodically())
+    outbox_task = asyncio.create_task(run_outbox_worker())
+    routes_task = asyncio.create_task(route_engine.refresh_periodically())
+    yield
+    await shutdown(warmup_task, reconcile_task, outbox_task, routes_task)
 
 app = FastAPI(
     title="Airport REST API",
     description="API для работы с авиаданными",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan
 )
 
+app.add_middleware(MetricsMiddleware)
+
+# A saturated backend fails fast instead of queueing without bound
+@app.exception_handler(BackendSaturated)
+async def backend_saturated(request: Request, exc: BackendSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.backend} is overloaded, retry later"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 app.include_router(aircrafts.router, prefix="/api")
 app.include_router(passengers.router, prefix="/api")
 app.include_router(tickets.router, prefix="/api")
-app.include_router(routes.router, prefix="/api")
\ No newline at end of file
+app.include_router(flights.router, prefix="/api")
+app.include_router(routes.router, prefix="/api")
+app.include_router(export.router, prefix="/api")
+app.include_router(cache.router, prefix="/api")
+app.include_router(outbox.router, prefix="/api")
+app.include_router(metrics.router)
+app.include_router(health.router)
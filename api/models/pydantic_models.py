@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 # Aircraft
@@ -95,6 +95,33 @@ class PassengerWithTickets(Passenger):
     tickets: List[Ticket] = []
 
 
+# Batch
+class BatchItemResult(BaseModel):
+    index: int
+    status: str
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchResult(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchItemResult]
+
+class MultiGetRequest(BaseModel):
+    ids: List[str]
+
+class MultiGetItemResult(BaseModel):
+    id: str
+    status: str
+    item: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+class MultiGetResult(BaseModel):
+    found: int
+    missing: int
+    failed: int
+    results: List[MultiGetItemResult]
+
 # Other
 
 class CountryStats(BaseModel):
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException, Query, Depends, Header
+from fastapi import APIRouter, HTTPException, Query, Depends, Header, Response
 from models.pydantic_models import (
     Aircraft, AircraftCreate, AircraftUpdate, 
-    ManufacturerStats, AircraftFlights
+    ManufacturerStats, AircraftFlights, MultiGetRequest, MultiGetResult
 )
-from db.mongo import get_mongo_collection
+from db.mongo import get_mongo_collection, find_by_keys, AIRCRAFT_DOCUMENT
+from utils.pagination import encode_cursor, decode_cursor, set_next_cursor
+from utils.cache import aircraft_cache
+from utils.batch import unique_ids, mget_result
+from utils.serialization import fast_path_enabled, respond, project, mongo_projection, model_fields
+from utils.fields import fields_query, parse_fields, pick
 from datetime import datetime
 from typing import List
 import uuid
@@ -14,6 +19,9 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
+FAST_PATH = fast_path_enabled("aircrafts")
+AIRCRAFT_FIELDS = model_fields(Aircraft)
+
 def get_aircrafts_collection():
     return get_mongo_collection("aircrafts")
 
@@ -37,12 +45,15 @@ async def create_aircraft(aircraft: AircraftCreate):
 # GET: /api/aircrafts – Get Aircrafts
 @router.get("", response_model=List[Aircraft])
 async def get_aircrafts(
+    response: Response,
     status: str = Query(None, description="Фильтр по статусу"),
     min_capacity: int = Query(0, description="Минимальная вместимость"),
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
+    cursor: str = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    fields: str = fields_query()
 ):
     collection = get_aircrafts_collection()
+    selected = parse_fields(fields, AIRCRAFT_FIELDS, key=("reg_number",))
     query = {}
     
     if status:
@@ -50,19 +61,46 @@ async def get_aircrafts(
     if min_capacity > 0:
         query["capacity"] = {"$gte": min_capacity}
     
+    after = decode_cursor(cursor, "aircrafts")
+    if after:
+        query["reg_number"] = {"$gt": after}
+    
+    # Documents are validated once by response_model, or not at all on the fast path
     aircrafts = []
-    async for doc in collection.find(query).skip(offset).limit(limit):
-        aircrafts.append(Aircraft(**doc))
-    return aircrafts
+    documents = collection.find(query, mongo_projection(Aircraft, selected)).sort("reg_number", 1).limit(limit + 1)
+    async for doc in documents:
+        aircrafts.append(doc)
+    
+    if len(aircrafts) > limit:
+        aircrafts = aircrafts[:limit]
+        set_next_cursor(response, encode_cursor("aircrafts", aircrafts[-1]["reg_number"]))
+    # Partial documents do not fit response_model, so they always go out raw
+    return respond(aircrafts, FAST_PATH or selected is not None, response)
 
 # GET: /api/aircrafts/{reg_number} – Get Aircraft
 @router.get("/{reg_number}", response_model=Aircraft)
-async def get_aircraft(reg_number: str):
+async def get_aircraft(reg_number: str, fields: str = fields_query()):
     collection = get_aircrafts_collection()
-    aircraft = await collection.find_one({"reg_number": reg_number})
+    selected = parse_fields(fields, AIRCRAFT_FIELDS, key=("reg_number",))
+    aircraft = await aircraft_cache.get_or_load(
+        reg_number, lambda: collection.find_one({"reg_number": reg_number}, AIRCRAFT_DOCUMENT)
+    )
     if not aircraft:
         raise HTTPException(status_code=404, detail="Aircraft not found")
-    return aircraft
+    return respond(pick(project(aircraft, Aircraft), selected), FAST_PATH or selected is not None)
+
+# POST: /api/aircrafts/mget – Get Aircrafts By IDs
+@router.post("/mget", response_model=MultiGetResult)
+async def mget_aircrafts(request: MultiGetRequest, fields: str = fields_query()):
+    collection = get_aircrafts_collection()
+    selected = parse_fields(fields, AIRCRAFT_FIELDS, key=("reg_number",))
+    reg_numbers = unique_ids(request.ids)
+    # Cached aircraft are served from memory, the rest with one $in query
+    aircrafts = await aircraft_cache.get_or_load_many(
+        reg_numbers, lambda missing: find_by_keys(collection, "reg_number", missing, AIRCRAFT_DOCUMENT)
+    )
+    result = mget_result(reg_numbers, aircrafts, lambda aircraft: pick(project(aircraft, Aircraft), selected))
+    return respond(result, FAST_PATH or selected is not None)
 
 # PUT: /api/aircrafts/{reg_number} – Update Aircraft
 @router.put("/{reg_number}", response_model=Aircraft)
@@ -83,6 +121,7 @@ async def update_aircraft(
         {"reg_number": reg_number},
         {"$set": update_fields}
     )
+    aircraft_cache.invalidate(reg_number)
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Aircraft not found or no changes")
@@ -95,6 +134,7 @@ async def update_aircraft(
 async def delete_aircraft(reg_number: str):
     collection = get_aircrafts_collection()
     result = await collection.delete_one({"reg_number": reg_number})
+    aircraft_cache.invalidate(reg_number)
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Aircraft not found")
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from utils.cache import cache_stats
+
+router = APIRouter(
+    tags=["Cache"],
+    prefix="/cache",
+    responses={404: {"description": "Not found"}}
+)
+
+# GET: /api/cache/stats – Cache Statistics
+@router.get("/stats")
+async def get_cache_stats():
+    return {"caches": cache_stats()}
@@ -0,0 +1,47 @@
+from fastapi import APIRouter
+from db.mongo import get_mongo_collection
+from db.cassandra import iter_rows
+from db.statements import get_statement
+from db.ticket_tables import ticket_from_row
+from utils.streaming import ndjson_response
+
+router = APIRouter(
+    tags=["Export"],
+    prefix="/export",
+    responses={404: {"description": "Not found"}}
+)
+
+EXPORT_BATCH_SIZE = 1000
+
+async def mongo_documents(name: str):
+    cursor = get_mongo_collection(name).find({}, {"_id": 0}).batch_size(EXPORT_BATCH_SIZE)
+    async for doc in cursor:
+        yield doc
+
+async def ticket_rows():
+    async for row in iter_rows(get_statement("select_tickets"), fetch_size=EXPORT_BATCH_SIZE):
+        yield ticket_from_row(row)
+
+async def flight_status_rows():
+    async for row in iter_rows(get_statement("select_flight_statuses"), fetch_size=EXPORT_BATCH_SIZE):
+        yield row._asdict()
+
+# GET: /api/export/passengers – Export Passengers
+@router.get("/passengers")
+async def export_passengers():
+    return ndjson_response(mongo_documents("passengers"), "passengers.ndjson")
+
+# GET: /api/export/aircrafts – Export Aircrafts
+@router.get("/aircrafts")
+async def export_aircrafts():
+    return ndjson_response(mongo_documents("aircrafts"), "aircrafts.ndjson")
+
+# GET: /api/export/tickets – Export Tickets
+@router.get("/tickets")
+async def export_tickets():
+    return ndjson_response(ticket_rows(), "tickets.ndjson")
+
+# GET: /api/export/flight_status – Export Flight Status
+@router.get("/flight_status")
+async def export_flight_status():
+    return ndjson_response(flight_status_rows(), "flight_status.ndjson")
@@ -0,0 +1,100 @@
+from fastapi import APIRouter, HTTPException
+from db.cassandra import execute, execute_one
+from db.mongo import get_mongo_collection
+from db.statements import get_statement, get_select_statement, declare_select
+from services.seat_map import seat_map
+from utils.bulkhead import BackendSaturated
+from utils.fanout import fan_out, Lookup
+from utils.serialization import respond
+from utils.streaming import ndjson_response
+from collections import Counter
+import asyncio
+import logging
+import string
+
+router = APIRouter(
+    tags=["Flights"],
+    prefix="/flights",
+    responses={404: {"description": "Not found"}}
+)
+
+logger = logging.getLogger("flights")
+
+MANIFEST_TICKET_COLUMNS = ("ticket_id", "passenger_id", "seat", "class_place")
+declare_select("select_tickets_by_flight", MANIFEST_TICKET_COLUMNS)
+MANIFEST_PASSENGER = {"_id": 0, "passenger_id": 1, "full_name": 1, "passport": 1}
+
+async def load_baggage_counts(flight_id):
+    rows = await execute(get_statement("select_flight_baggage"), [flight_id])
+    return Counter(row.ticket_id for row in rows)
+
+async def load_manifest_passengers(passenger_ids):
+    passengers = {}
+    async for doc in get_mongo_collection("passengers").find(
+        {"passenger_id": {"$in": passenger_ids}}, MANIFEST_PASSENGER
+    ):
+        passengers[doc["passenger_id"]] = doc
+    return passengers
+
+# "9C" before "10A": rows compare as numbers, then by letter
+def seat_order(row):
+    seat = row.seat or ""
+    number = seat.rstrip(string.ascii_letters)
+    return (int(number) if number.isdigit() else float("inf"), seat)
+
+async def manifest_lines(rows, passengers, baggage):
+    for row in rows:
+        passenger = passengers.get(row.passenger_id, {})
+        yield {
+            "ticket_id": row.ticket_id,
+            "passenger_id": row.passenger_id,
+            "full_name": passenger.get("full_name"),
+            "passport": passenger.get("passport"),
+            "seat": row.seat,
+            "class_place": row.class_place,
+            "baggage_count": baggage.get(row.ticket_id, 0) if baggage is not None else None
+        }
+
+# GET: /api/flights/{flight_id}/manifest – Get Flight Manifest
+@router.get("/{flight_id}/manifest")
+async def get_flight_manifest(flight_id: str):
+    # Three queries whatever the number of passengers: the flight's
+    # tickets_by_flight partition, its baggage_by_flight partition (read
+    # alongside) and one projected $in for all passengers. Baggage counts
+    # are optional and come out as null if that read fails.
+    baggage = asyncio.ensure_future(fan_out(
+        counts=Lookup(load_baggage_counts(flight_id), "cassandra")
+    ))
+    try:
+        rows = await execute(
+            get_select_statement("select_tickets_by_flight", MANIFEST_TICKET_COLUMNS), [flight_id]
+        )
+        if not rows and not await execute_one(get_statement("select_flight_status"), [flight_id]):
+            raise HTTPException(status_code=404, detail="Flight not found")
+        passengers = await load_manifest_passengers(list({row.passenger_id for row in rows})) if rows else {}
+        counts = (await baggage)["counts"]
+    except (HTTPException, BackendSaturated):
+        raise
+    except Exception as e:
+        logger.error(f"Failed to build flight manifest: {e}")
+        raise HTTPException(status_code=500, detail="Database error")
+    finally:
+        baggage.cancel()
+
+    return ndjson_response(manifest_lines(sorted(rows, key=seat_order), passengers, counts))
+
+# GET: /api/flights/{flight_id}/seats – Get Seat Availability
+@router.get("/{flight_id}/seats")
+async def get_flight_seats(flight_id: str):
+    # Served from the in-memory seat map; only the first request for a
+    # flight (per worker) reads its flight_seats partition
+    try:
+        seats = await seat_map.get(flight_id)
+    except BackendSaturated:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to load seat map: {e}")
+        raise HTTPException(status_code=500, detail="Database error")
+    if seats is None:
+        raise HTTPException(status_code=404, detail="Flight not found")
+    return respond(seats.summary(), True)
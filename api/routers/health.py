@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from services.lifecycle import readiness
+
+router = APIRouter(
+    tags=["Health"],
+    prefix="/health"
+)
+
+# GET: /health/live – Liveness
+@router.get("/live")
+async def get_liveness():
+    return {"status": "ok"}
+
+# GET: /health/ready – Readiness
+@router.get("/ready")
+async def get_readiness():
+    state = readiness()
+    return JSONResponse(jsonable_encoder(state), status_code=200 if state["ready"] else 503)
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from utils.metrics import render
+
+router = APIRouter(tags=["Metrics"])
+
+# GET: /metrics – Prometheus Metrics
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
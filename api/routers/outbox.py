@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from services.outbox import outbox_stats
+
+router = APIRouter(
+    tags=["Outbox"],
+    prefix="/outbox",
+    responses={404: {"description": "Not found"}}
+)
+
+# GET: /api/outbox/stats – Outbox Replication Lag
+@router.get("/stats")
+async def get_outbox_stats():
+    return await outbox_stats()
@@ -1,11 +1,30 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
 from models.pydantic_models import (
     Passenger, PassengerCreate, PassengerUpdate, 
-    PassengerWithTickets, CountryStats
+    PassengerWithTickets, CountryStats, BatchResult, Ticket,
+    MultiGetRequest, MultiGetResult
 )
-from db.mongo import get_mongo_collection
-from db.cassandra import get_cassandra_session
+from db.mongo import get_mongo_collection, find_by_keys, run_in_transaction, PASSENGER_PROFILE
+from db.cassandra import execute, execute_one
+from db.statements import get_statement, get_select_statement, declare_select
+from db.ticket_tables import delete_ticket_batch, ticket_from_row
+from db.neo4j import get_neo4j_session
+from utils.bulkhead import BackendSaturated
+from utils.pagination import encode_cursor, decode_cursor, set_next_cursor
+from utils.fanout import fan_out, Lookup
+from utils.cache import passenger_cache, passenger_name_cache, ticket_cache
+from services.country_stats import adjust_country, adjust_countries, get_country_stats
+from services.outbox import append_events, mark_ready, passenger_event
+from services.seat_map import seat_map
+from utils.batch import check_batch_size, summarize, unique_ids, mget_result
+from utils.serialization import fast_path_enabled, respond, project, mongo_projection, model_fields
+from utils.fields import fields_query, parse_fields, pick
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from collections import Counter
 from typing import List
+import asyncio
+import logging
 import uuid
 from datetime import datetime
 
@@ -15,70 +34,172 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
+logger = logging.getLogger("passengers")
+
+FAST_PATH = fast_path_enabled("passengers")
+PASSENGER_FIELDS = model_fields(PassengerWithTickets)
+TICKET_FIELDS = model_fields(Ticket)
+declare_select("select_tickets_by_passenger", TICKET_FIELDS)
+PROFILE_FIELDS = tuple(field for field in model_fields(Passenger) if field != "tickets")
+HISTORY_RETURNS = {
+    "flight_id": "f.flight_id AS flight_id",
+    "departure_time": "f.departure_time AS departure_time",
+    "arrival_time": "f.arrival_time AS arrival_time",
+    "departure_airport": "dep.code AS departure_airport",
+    "arrival_airport": "arr.code AS arrival_airport"
+}
+HISTORY_FIELDS = tuple(HISTORY_RETURNS)
+
 def get_passengers_collection():
     return get_mongo_collection("passengers")
 
-def get_cassandra():
-    return get_cassandra_session()
-
 # POST: /api/passengers – Create Passenger
-@router.post("/passengers", response_model=Passenger, status_code=201)
+@router.post("", response_model=Passenger, status_code=201)
 async def create_passenger(passenger: PassengerCreate):
     collection = get_passengers_collection()
-    passenger_id = f"pas_{uuid.uuid4().hex[:8]}"
+    passenger_id = f"pas_{uuid.uuid4().hex}"
     passenger_data = {
         "passenger_id": passenger_id,
         **passenger.dict(),
         "created_at": datetime.utcnow()
     }
     
-    result = await collection.insert_one(passenger_data)
-    if not result.inserted_id:
-        raise HTTPException(status_code=500, detail="Failed to create passenger")
+    async def write(session):
+        await collection.insert_one(passenger_data, session=session)
+        await append_events(passenger_event("upsert", passenger_data), session=session)
+    
+    await run_in_transaction(write)
+    await adjust_country(passenger_data["nationality"], 1)
     
     return {**passenger_data, "tickets": []}
 
+# POST: /api/passengers/batch – Create Passengers In Bulk
+@router.post("/batch", response_model=BatchResult)
+async def create_passengers_batch(passengers: List[PassengerCreate]):
+    check_batch_size(passengers)
+    collection = get_passengers_collection()
+    created_at = datetime.utcnow()
+    documents = [
+        {
+            "passenger_id": f"pas_{uuid.uuid4().hex}",
+            **passenger.dict(),
+            "created_at": created_at
+        }
+        for passenger in passengers
+    ]
+    
+    # A transaction commits all documents or none, so one that fails is left
+    # out and the rest are written again
+    errors = {}
+    while True:
+        remaining = [index for index in range(len(documents)) if index not in errors]
+        if not remaining:
+            break
+        
+        async def write(session):
+            await collection.insert_many([documents[index] for index in remaining], ordered=False, session=session)
+            await append_events(
+                *(passenger_event("upsert", documents[index]) for index in remaining), session=session
+            )
+        
+        try:
+            await run_in_transaction(write)
+            break
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                errors[remaining[error["index"]]] = (
+                    "Duplicate passenger" if error.get("code") == 11000
+                    else "Failed to create passenger"
+                )
+            if not e.details.get("writeErrors"):
+                raise
+    
+    results = []
+    countries = Counter()
+    for index, document in enumerate(documents):
+        if index in errors:
+            results.append({"index": index, "status": "error", "error": errors[index]})
+            continue
+        results.append({"index": index, "status": "created", "id": document["passenger_id"]})
+        countries[document["nationality"]] += 1
+    
+    await adjust_countries(countries)
+    return summarize(results)
+
 # GET: /api/passengers – Get Passengers
-@router.get("/passengers", response_model=List[Passenger])
+@router.get("", response_model=List[Passenger])
 async def get_passengers(
+    response: Response,
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
+    cursor: str = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    fields: str = fields_query()
 ):
     collection = get_passengers_collection()
+    selected = parse_fields(fields, PASSENGER_FIELDS, key=("passenger_id",))
+    query = {}
+    
+    after = decode_cursor(cursor, "passengers")
+    if after:
+        query["passenger_id"] = {"$gt": after}
+    
+    # Documents are validated once by response_model, or not at all on the fast path
     passengers = []
-    async for doc in collection.find().skip(offset).limit(limit):
-        passengers.append(Passenger(**doc))
-    return passengers
+    documents = collection.find(query, mongo_projection(Passenger, selected)).sort("passenger_id", 1).limit(limit + 1)
+    async for doc in documents:
+        passengers.append(doc)
+    
+    if len(passengers) > limit:
+        passengers = passengers[:limit]
+        set_next_cursor(response, encode_cursor("passengers", passengers[-1]["passenger_id"]))
+    # Partial documents do not fit response_model, so they always go out raw
+    return respond(passengers, FAST_PATH or selected is not None, response)
 
 # GET: /api/passengers/{passenger_id} – Get Passenger
-@router.get("/passengers/{passenger_id}", response_model=PassengerWithTickets)
-async def get_passenger(passenger_id: str):
+@router.get("/{passenger_id}", response_model=PassengerWithTickets)
+async def get_passenger(passenger_id: str, fields: str = fields_query()):
     collection = get_passengers_collection()
-    passenger = await collection.find_one({"passenger_id": passenger_id})
+    selected = parse_fields(fields, PASSENGER_FIELDS, key=("passenger_id",))
+    
+    # Both lookups are keyed by passenger_id, so the profile and its tickets
+    # are fetched concurrently; tickets degrade to an empty list on failure.
+    lookups = {
+        "passenger": Lookup(
+            passenger_cache.get_or_load(
+                passenger_id, lambda: collection.find_one({"passenger_id": passenger_id}, PASSENGER_PROFILE)
+            ),
+            "mongo", required=True
+        )
+    }
+    if selected is None or "tickets" in selected:
+        lookups["rows"] = Lookup(
+            execute(get_select_statement("select_tickets_by_passenger", TICKET_FIELDS), [passenger_id]),
+            "cassandra", default=[]
+        )
+    results = await fan_out(**lookups)
+    passenger = results["passenger"]
     if not passenger:
         raise HTTPException(status_code=404, detail="Passenger not found")
     
-    cassandra = get_cassandra()
-    rows = cassandra.execute(
-        "SELECT * FROM tickets WHERE passenger_id = %s",
-        [passenger_id]
-    )
+    tickets = [ticket_from_row(row, TICKET_FIELDS) for row in results.get("rows", [])]
     
-    tickets = []
-    for row in rows:
-        tickets.append({
-            "ticket_id": row.ticket_id,
-            "flight_id": row.flight_id,
-            "seat": row.seat,
-            "class_place": row.class_place,
-            "price": float(row.price),
-            "booking_date": row.booking_date
-        })
-    
-    return {**passenger, "tickets": tickets}
+    passenger = pick({**project(passenger, PassengerWithTickets), "tickets": tickets}, selected)
+    return respond(passenger, FAST_PATH or selected is not None)
+
+# POST: /api/passengers/mget – Get Passengers By IDs
+@router.post("/mget", response_model=MultiGetResult)
+async def mget_passengers(request: MultiGetRequest, fields: str = fields_query()):
+    collection = get_passengers_collection()
+    selected = parse_fields(fields, PROFILE_FIELDS, key=("passenger_id",))
+    passenger_ids = unique_ids(request.ids)
+    # Profiles only: tickets of many passengers are better read with tickets/mget
+    passengers = await passenger_cache.get_or_load_many(
+        passenger_ids, lambda missing: find_by_keys(collection, "passenger_id", missing, PASSENGER_PROFILE)
+    )
+    result = mget_result(passenger_ids, passengers, lambda passenger: pick(project(passenger, Passenger), selected))
+    return respond(result, FAST_PATH or selected is not None)
 
 # PUT: /api/passengers/{passenger_id} – Update Passenger
-@router.put("/passengers/{passenger_id}", response_model=Passenger)
+@router.put("/{passenger_id}", response_model=Passenger)
 async def update_passenger(
     passenger_id: str, 
     update_data: PassengerUpdate
@@ -89,117 +210,140 @@ async def update_passenger(
     if not update_fields:
         raise HTTPException(status_code=400, detail="No data to update")
     
-    result = await collection.update_one(
-        {"passenger_id": passenger_id},
-        {"$set": {**update_fields, "updated_at": datetime.utcnow()}}
-    )
+    update_fields["updated_at"] = datetime.utcnow()
+    # The pre-update document tells which nationality counter to move
+    async def write(session):
+        previous = await collection.find_one_and_update(
+            {"passenger_id": passenger_id},
+            {"$set": update_fields},
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+        if previous is not None:
+            await append_events(passenger_event("upsert", previous), session=session)
+        return previous
+    
+    previous = await run_in_transaction(write)
+    passenger_cache.invalidate(passenger_id)
+    passenger_name_cache.invalidate(passenger_id)
     
-    if result.modified_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Passenger not found or no changes")
     
-    updated_passenger = await collection.find_one({"passenger_id": passenger_id})
-    return Passenger(**updated_passenger)
+    new_nationality = update_fields.get("nationality", previous.get("nationality"))
+    if new_nationality != previous.get("nationality"):
+        await adjust_country(previous.get("nationality"), -1)
+        await adjust_country(new_nationality, 1)
+    
+    updated = {**previous, **update_fields}
+    return Passenger(**updated)
 
 # DELETE: /api/passengers/{passenger_id} – Delete Passenger
-@router.delete("/passengers/{passenger_id}", status_code=204)
+@router.delete("/{passenger_id}", status_code=204)
 async def delete_passenger(passenger_id: str):
     collection = get_passengers_collection()
-    result = await collection.delete_one({"passenger_id": passenger_id})
+    events = []
+    async def write(session):
+        deleted = await collection.find_one_and_delete(
+            {"passenger_id": passenger_id}, {"nationality": 1}, session=session
+        )
+        events.clear()
+        if deleted is not None:
+            # Left unready until the passenger's tickets are deleted below
+            events.extend(await append_events(
+                passenger_event("delete", {"passenger_id": passenger_id}), session=session, ready=False
+            ))
+        return deleted
     
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Passenger not found")
+    deleted = await run_in_transaction(write)
+    passenger_cache.invalidate(passenger_id)
+    passenger_name_cache.invalidate(passenger_id)
     
-    cassandra = get_cassandra()
-    cassandra.execute(
-        "DELETE FROM tickets WHERE passenger_id = %s",
-        [passenger_id]
-    )
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Passenger not found")
+    try:
+        await adjust_country(deleted.get("nationality"), -1)
+        await delete_passenger_tickets(passenger_id)
+    finally:
+        await mark_ready(events)
     
     return
 
+async def delete_passenger_tickets(passenger_id):
+    rows = await execute(get_statement("select_tickets_by_passenger"), [passenger_id])
+    # Baggage goes in each ticket's batch, so the manifest never shows
+    # baggage of a ticket that no longer exists
+    baggage = await asyncio.gather(*(
+        execute(get_statement("select_ticket_baggage"), [row.ticket_id])
+        for row in rows
+    ))
+    await asyncio.gather(*(
+        execute(delete_ticket_batch(
+            row, include_passenger_table=False, baggage_ids=[item.baggage_id for item in items]
+        ))
+        for row, items in zip(rows, baggage)
+    ))
+    for row in rows:
+        ticket_cache.invalidate(row.ticket_id)
+    await seat_map.release_many([(row.flight_id, row.seat, row.ticket_id) for row in rows])
+    await execute(get_statement("delete_passenger_tickets"), [passenger_id])
+    await execute(get_statement("delete_passenger_spend"), [passenger_id])
+
 # GET: /api/passengers/stats/country – Get Passengers By Country
-@router.get("/passengers/stats/country", response_model=List[CountryStats])
+@router.get("/stats/country", response_model=List[CountryStats])
 async def get_passengers_by_country():
-    collection = get_passengers_collection()
-    pipeline = [
-        {"$group": {"_id": "$nationality", "count": {"$sum": 1}}},
-        {"$project": {"country": "$_id", "count": 1, "_id": 0}},
-        {"$sort": {"count": -1}}
-    ]
-    
-    result = []
-    async for doc in collection.aggregate(pipeline):
-        result.append(CountryStats(**doc))
-    return result
+    return await get_country_stats()
 
 # GET: /api/passengers/{passenger_id}/total_spent – Get Total Spent
-@router.get("/passengers/{passenger_id}/total_spent")
+@router.get("/{passenger_id}/total_spent")
 async def get_total_spent(passenger_id: str):
-    cassandra = get_cassandra()
-    
-    mongo_collection = get_mongo_collection("passengers")
-    passenger = await mongo_collection.find_one({"passenger_id": passenger_id})
-    if not passenger:
-        raise HTTPException(status_code=404, detail="Passenger not found")
-    
     try:
-        rows = cassandra.execute(
-            "SELECT price FROM tickets WHERE passenger_id = %s",
-            [passenger_id]
-        )
+        row = await execute_one(get_statement("select_passenger_spend"), [passenger_id])
+    except BackendSaturated:
+        raise
     except Exception as e:
         logger.error(f"Cassandra query failed: {e}")
         raise HTTPException(status_code=500, detail="Database error")
     
-    total = sum(float(row.price) for row in rows)
+    # No counter row means no tickets, or no such passenger
+    if row is None:
+        mongo_collection = get_mongo_collection("passengers")
+        passenger = await passenger_cache.get_or_load(
+            passenger_id, lambda: mongo_collection.find_one({"passenger_id": passenger_id}, PASSENGER_PROFILE)
+        )
+        if not passenger:
+            raise HTTPException(status_code=404, detail="Passenger not found")
+    
+    total_cents = row.total_cents if row else 0
     
     return {
         "passenger_id": passenger_id,
-        "total_spent": round(total, 2),
+        "total_spent": round(total_cents / 100, 2),
         "currency": "USD"
     }
 
 # GET: /api/passengers/{passenger_id}/travel_history – Get Travel History
-@router.get("/passengers/{passenger_id}/travel_history")
-async def get_travel_history(passenger_id: str):
-    from db.neo4j import get_neo4j_driver
-    
-    driver = get_neo4j_driver()
-    query = """
-    MATCH (p:Passenger {passenger_id: $passenger_id})-[:BOOKED_FLIGHT]->(f:Flight)
-    OPTIONAL MATCH (f)-[:DEPARTS_FROM]->(dep:Airport)
-    OPTIONAL MATCH (f)-[:ARRIVES_AT]->(arr:Airport)
-    RETURN f.flight_id AS flight_id,
-           f.departure_time AS departure_time,
-           f.arrival_time AS arrival_time,
-           dep.code AS departure_airport,
-           arr.code AS arrival_airport
-    ORDER BY f.departure_time DESC
-    """
+@router.get("/{passenger_id}/travel_history")
+async def get_travel_history(passenger_id: str, fields: str = fields_query()):
+    selected = parse_fields(fields, HISTORY_FIELDS) or HISTORY_FIELDS
+    
+    # Airports are only matched when asked for
+    query = "MATCH (p:Passenger {passenger_id: $passenger_id})-[:BOOKED_FLIGHT]->(f:Flight)\n"
+    if "departure_airport" in selected:
+        query += "OPTIONAL MATCH (f)-[:DEPARTS_FROM]->(dep:Airport)\n"
+    if "arrival_airport" in selected:
+        query += "OPTIONAL MATCH (f)-[:ARRIVES_AT]->(arr:Airport)\n"
+    query += f"RETURN {', '.join(HISTORY_RETURNS[field] for field in selected)}\n"
+    query += "ORDER BY f.departure_time DESC"
     
     history = []
-    with driver.session() as session:
-        result = session.run(query, passenger_id=passenger_id)
-        for record in result:
-            dep_time = record["departure_time"]
-            arr_time = record["arrival_time"]
-            
-            formatted_departure = (
-                dep_time.strftime("%Y-%m-%d %H:%M:%S")
-                if dep_time else None
-            )
-            
-            formatted_arrival = (
-                arr_time.strftime("%Y-%m-%d %H:%M:%S")
-                if arr_time else None
-            )
-            
-            history.append({
-                "flight_id": record["flight_id"],
-                "departure_time": formatted_departure,
-                "arrival_time": formatted_arrival,
-                "departure_airport": record["departure_airport"],
-                "arrival_airport": record["arrival_airport"]
-            })
-    
-    return {"passenger_id": passenger_id, "travel_history": history}
\ No newline at end of file
+    async with get_neo4j_session() as session:
+        result = await session.run(query, passenger_id=passenger_id)
+        async for record in result:
+            entry = {field: record[field] for field in selected}
+            for field in ("departure_time", "arrival_time"):
+                if entry.get(field):
+                    entry[field] = entry[field].strftime("%Y-%m-%d %H:%M:%S")
+            history.append(entry)
+    
+    return {"passenger_id": passenger_id, "travel_history": history}
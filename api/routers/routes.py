@@ -1,6 +1,8 @@
-from fastapi import APIRouter
-from db.neo4j import get_neo4j_driver
+from fastapi import APIRouter, Query
+from services.route_engine import route_engine, utc_timestamp, FLIGHT_FIELDS
+from utils.fields import fields_query, parse_fields, pick
 from datetime import datetime
+import os
 
 router = APIRouter(
     tags=["Routes"],
@@ -27,56 +29,52 @@ def format_airport(airport):
         "country": airport.get("country")
     }
 
+ROUTE_TYPES = {1: "direct", 2: "one_stop", 3: "two_stop"}
+DEFAULT_MIN_CONNECTION = int(os.getenv("ROUTE_MIN_CONNECTION_MINUTES", "30"))
+
+def format_route(itinerary, airports, fields=None):
+    def airport(code):
+        return format_airport(airports.get(code, {"code": code}))
+    
+    legs = len(itinerary["flights"])
+    return {
+        "type": ROUTE_TYPES.get(legs, f"{legs - 1}_stop"),
+        "flights": [pick(format_flight(flight), fields) for flight in itinerary["flights"]],
+        "departure_airport": airport(itinerary["departure_airport"]),
+        "arrival_airport": airport(itinerary["arrival_airport"]),
+        "transfer_airports": [airport(code) for code in itinerary["transfer_airports"]]
+    }
+
 # GET: /api/routes/{from_airport}/{to_airport} – Get Routes
 @router.get("/{from_airport}/{to_airport}")
-def get_routes(from_airport: str, to_airport: str):
-    driver = get_neo4j_driver()
-    results = []
+async def get_routes(
+    from_airport: str,
+    to_airport: str,
+    max_legs: int = Query(2, ge=1, le=5, description="Максимальное число перелетов"),
+    min_connection: int = Query(DEFAULT_MIN_CONNECTION, ge=0, description="Минимальное время пересадки, мин"),
+    limit: int = Query(50, ge=1, le=500),
+    depart_after: datetime = Query(None, description="Вылет не раньше"),
+    earliest: bool = Query(False, description="Только маршруты с самым ранним прибытием для каждого числа перелетов"),
+    fields: str = fields_query()
+):
+    selected = parse_fields(fields, FLIGHT_FIELDS, key=("flight_id",))
+    await route_engine.ensure_loaded()
+    network = route_engine.network
+    start = utc_timestamp(depart_after) if depart_after else None
     
-    with driver.session() as session:
-        direct_query = """
-            MATCH (a1:Airport {code: $from_code})<-[:DEPARTS_FROM]-(f:Flight)-[:ARRIVES_AT]->(a2:Airport {code: $to_code})
-            RETURN properties(f) AS flight,
-                   properties(a1) AS departure_airport,
-                   properties(a2) AS arrival_airport
-        """
-        direct_result = session.run(direct_query, from_code=from_airport, to_code=to_airport)
-        
-        for record in direct_result:
-            results.append({
-                "type": "direct",
-                "flights": [format_flight(record["flight"])],
-                "departure_airport": format_airport(record["departure_airport"]),
-                "arrival_airport": format_airport(record["arrival_airport"]),
-                "transfer_airports": []
-            })
-        
-        one_stop_query = """
-            MATCH (a1:Airport {code: $from_code})<-[:DEPARTS_FROM]-(f1:Flight)-[:ARRIVES_AT]->(via:Airport)
-            MATCH (via)<-[:DEPARTS_FROM]-(f2:Flight)-[:ARRIVES_AT]->(a2:Airport {code: $to_code})
-            WHERE f1.arrival_time < f2.departure_time
-            RETURN properties(f1) AS first_flight,
-                   properties(f2) AS second_flight,
-                   properties(a1) AS departure_airport,
-                   properties(a2) AS arrival_airport,
-                   properties(via) AS transfer_airport
-        """
-        one_stop_result = session.run(one_stop_query, from_code=from_airport, to_code=to_airport)
-        
-        for record in one_stop_result:
-            results.append({
-                "type": "one_stop",
-                "flights": [
-                    format_flight(record["first_flight"]),
-                    format_flight(record["second_flight"])
-                ],
-                "departure_airport": format_airport(record["departure_airport"]),
-                "arrival_airport": format_airport(record["arrival_airport"]),
-                "transfer_airports": [format_airport(record["transfer_airport"])]
-            })
+    if earliest:
+        itineraries = network.earliest_arrival(
+            from_airport, to_airport, max_legs=max_legs,
+            min_connection=min_connection * 60, depart_after=start
+        )
+    else:
+        itineraries = network.search(
+            from_airport, to_airport, max_legs=max_legs,
+            min_connection=min_connection * 60, limit=limit, depart_after=start
+        )
     
     return {
         "from": from_airport,
         "to": to_airport,
-        "routes": results
-    }
\ No newline at end of file
+        "routes": [format_route(itinerary, network.airports, selected) for itinerary in itineraries]
+    }
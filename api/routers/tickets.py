@@ -1,9 +1,29 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-from models.pydantic_models import Ticket, TicketCreate, TicketUpdate, TicketStats, TicketWithDetails
-from db.cassandra import get_cassandra_session
-from db.mongo import get_mongo_collection
-from db.neo4j import get_neo4j_driver
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
+from models.pydantic_models import (
+    Ticket, TicketCreate, TicketUpdate, TicketStats, TicketWithDetails, BatchResult,
+    MultiGetRequest, MultiGetResult
+)
+from db.cassandra import execute, execute_one, fetch_page, execute_concurrent
+from db.statements import get_statement, get_select_statement, declare_field_selects
+from db.ticket_tables import (
+    insert_ticket_batch, update_ticket_batch, delete_ticket_batch,
+    adjust_passenger_spend, to_cents, ticket_from_row
+)
+from db.mongo import get_mongo_collection, PASSENGER_PROFILE
+from db.neo4j import get_neo4j_session
+from utils.bulkhead import BackendSaturated
+from utils.pagination import encode_cursor, decode_cursor, set_next_cursor
+from utils.fanout import fan_out, Lookup
+from utils.cache import passenger_cache, passenger_name_cache, ticket_cache
+from utils.batch import check_batch_size, summarize, unique_ids, mget_result
+from utils.serialization import fast_path_enabled, respond, project, model_fields
+from utils.fields import fields_query, parse_fields, pick
+from services.outbox import outbox_intent, ticket_event
+from services.seat_map import seat_map
+from collections import Counter
 from datetime import datetime
+from decimal import Decimal
+import asyncio
 import uuid
 import logging
 from typing import List
@@ -16,36 +36,74 @@ router = APIRouter(
 
 logger = logging.getLogger("tickets")
 
-def get_cassandra():
-    return get_cassandra_session()
+FAST_PATH = fast_path_enabled("tickets")
+TICKET_FIELDS = model_fields(Ticket)
+TICKET_DETAIL_FIELDS = model_fields(TicketWithDetails)
+TICKET_LISTS = (
+    "select_tickets", "select_tickets_by_passenger",
+    "select_tickets_by_flight", "select_tickets_by_passenger_and_flight"
+)
+for name in TICKET_LISTS:
+    declare_field_selects(name, TICKET_FIELDS, key=("ticket_id",))
+
+async def load_ticket(ticket_id):
+    row = await execute_one(get_statement("select_ticket"), [ticket_id])
+    return ticket_from_row(row) if row else None
+
+# Runs after the ticket write has committed: a failed counter update is
+# logged rather than failing a request that already took effect, and
+# gen_cassandra.py --rebuild-spend recomputes the totals from the tickets.
+async def adjust_spend_after_write(passenger_id, delta_cents):
+    try:
+        await adjust_passenger_spend(passenger_id, delta_cents)
+    except Exception as e:
+        logger.error(f"Failed to adjust spend of {passenger_id} by {delta_cents} cents: {e}")
 
 # POST: /api/tickets – Create Ticket
 @router.post("", response_model=Ticket, status_code=201)
 async def create_ticket(ticket: TicketCreate):
-    cassandra = get_cassandra()
-    ticket_id = f"tkt_{uuid.uuid4().hex[:6]}"
+    ticket_id = f"tkt_{uuid.uuid4().hex}"
     booking_date = datetime.utcnow()
     
     mongo_collection = get_mongo_collection("passengers")
-    passenger = await mongo_collection.find_one({"passenger_id": ticket.passenger_id})
+    passenger = await passenger_cache.get_or_load(
+        ticket.passenger_id,
+        lambda: mongo_collection.find_one({"passenger_id": ticket.passenger_id}, PASSENGER_PROFILE)
+    )
     if not passenger:
         raise HTTPException(status_code=404, detail="Passenger not found")
     
-    query = """
-    INSERT INTO tickets (
-        ticket_id, passenger_id, flight_id, 
-        seat, class, price, booking_date
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-    """
+    row = {
+        "ticket_id": ticket_id,
+        "passenger_id": ticket.passenger_id,
+        "flight_id": ticket.flight_id,
+        "seat": ticket.seat,
+        "class_place": ticket.class_place,
+        "price": Decimal(str(ticket.price)),
+        "booking_date": booking_date
+    }
+    try:
+        claimed = await seat_map.claim(ticket.flight_id, ticket.seat, ticket_id)
+    except BackendSaturated:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to claim seat: {e}")
+        raise HTTPException(status_code=500, detail="Failed to create ticket")
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Seat already taken")
     
     try:
-        cassandra.execute(query, (
-            ticket_id, ticket.passenger_id, ticket.flight_id,
-            ticket.seat, ticket.class_place, ticket.price, booking_date
-        ))
+        async with outbox_intent(ticket_event("upsert", row)):
+            await execute(insert_ticket_batch(row))
     except Exception as e:
+        # A ticket that was never written must not keep its seat
+        await seat_map.release_many([(ticket.flight_id, ticket.seat, ticket_id)])
+        if isinstance(e, BackendSaturated):
+            raise
         logger.error(f"Failed to create ticket: {e}")
         raise HTTPException(status_code=500, detail="Failed to create ticket")
+    # The ticket is booked from here on, so an error must not invite a retry
+    await adjust_spend_after_write(ticket.passenger_id, to_cents(ticket.price))
     
     return {
         "ticket_id": ticket_id,
@@ -57,175 +115,298 @@ async def create_ticket(ticket: TicketCreate):
         "booking_date": booking_date
     }
 
+# POST: /api/tickets/batch – Create Tickets In Bulk
+@router.post("/batch", response_model=BatchResult)
+async def create_tickets_batch(tickets: List[TicketCreate]):
+    check_batch_size(tickets)
+    
+    # A single $in query replaces one existence check per ticket
+    mongo_collection = get_mongo_collection("passengers")
+    passenger_ids = list({ticket.passenger_id for ticket in tickets})
+    known_passengers = set()
+    async for doc in mongo_collection.find(
+        {"passenger_id": {"$in": passenger_ids}}, {"passenger_id": 1, "_id": 0}
+    ):
+        known_passengers.add(doc["passenger_id"])
+    
+    booking_date = datetime.utcnow()
+    results = [None] * len(tickets)
+    pending = []
+    for index, ticket in enumerate(tickets):
+        if ticket.passenger_id not in known_passengers:
+            results[index] = {"index": index, "status": "error", "error": "Passenger not found"}
+            continue
+        pending.append((index, {
+            "ticket_id": f"tkt_{uuid.uuid4().hex}",
+            "passenger_id": ticket.passenger_id,
+            "flight_id": ticket.flight_id,
+            "seat": ticket.seat,
+            "class_place": ticket.class_place,
+            "price": Decimal(str(ticket.price)),
+            "booking_date": booking_date
+        }))
+    
+    # Seats are claimed first; tickets that lose their seat are not written
+    claims = await seat_map.claim_many([
+        (row["flight_id"], row["seat"], row["ticket_id"]) for _, row in pending
+    ])
+    claimed = []
+    for (index, row), outcome in zip(pending, claims):
+        if isinstance(outcome, Exception):
+            logger.error(f"Failed to claim seat in batch: {outcome}")
+            results[index] = {"index": index, "status": "error", "error": "Failed to create ticket"}
+        elif not outcome:
+            results[index] = {"index": index, "status": "error", "error": "Seat already taken"}
+        else:
+            claimed.append((index, row))
+    pending = claimed
+    
+    try:
+        async with outbox_intent(*(ticket_event("upsert", row) for _, row in pending)):
+            outcomes = await execute_concurrent(
+                (insert_ticket_batch(row), None) for _, row in pending
+            )
+    except Exception as e:
+        # Nothing was written without its event; give the seats back
+        await seat_map.release_many([(row["flight_id"], row["seat"], row["ticket_id"]) for _, row in pending])
+        if isinstance(e, BackendSaturated):
+            raise
+        logger.error(f"Failed to record outbox events for ticket batch: {e}")
+        raise HTTPException(status_code=500, detail="Failed to create tickets")
+    
+    spend = Counter()
+    unwritten = []
+    for (index, row), outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"Failed to create ticket in batch: {outcome}")
+            results[index] = {"index": index, "status": "error", "error": "Failed to create ticket"}
+            unwritten.append((row["flight_id"], row["seat"], row["ticket_id"]))
+            continue
+        results[index] = {"index": index, "status": "created", "id": row["ticket_id"]}
+        spend[row["passenger_id"]] += to_cents(row["price"])
+    
+    for outcome in await execute_concurrent(
+        (get_statement("increment_passenger_spend"), [cents, passenger_id])
+        for passenger_id, cents in spend.items()
+    ):
+        if isinstance(outcome, Exception):
+            logger.error(f"Failed to update passenger spend: {outcome}")
+    
+    if unwritten:
+        await seat_map.release_many(unwritten)
+    return summarize(results)
+
 # GET: /api/tickets – Get Tickets
 @router.get("", response_model=List[Ticket])
 async def get_tickets(
+    response: Response,
     passenger_id: str = Query(None, description="Фильтр по пассажиру"),
     flight_id: str = Query(None, description="Фильтр по рейсу"),
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
+    cursor: str = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    fields: str = fields_query()
 ):
-    cassandra = get_cassandra()
-    query = "SELECT * FROM tickets"
-    params = []
-    
-    if passenger_id or flight_id:
-        query += " WHERE "
-        conditions = []
-        if passenger_id:
-            conditions.append("passenger_id = %s")
-            params.append(passenger_id)
-        if flight_id:
-            conditions.append("flight_id = %s")
-            params.append(flight_id)
-        query += " AND ".join(conditions)
-    
-    query += " LIMIT %s"
-    params.append(limit)
+    selected = parse_fields(fields, TICKET_FIELDS, key=("ticket_id",))
+    columns = selected or TICKET_FIELDS
+    
+    if passenger_id and flight_id:
+        name, params = "select_tickets_by_passenger_and_flight", [passenger_id, flight_id]
+    elif passenger_id:
+        name, params = "select_tickets_by_passenger", [passenger_id]
+    elif flight_id:
+        name, params = "select_tickets_by_flight", [flight_id]
+    else:
+        name, params = "select_tickets", []
+    
+    # The driver's paging state is only valid for the same statement and values
+    scope = ":".join(["tickets", name, ",".join(columns)] + params)
+    paging_state = decode_cursor(cursor, scope)
     
     try:
-        rows = cassandra.execute(query, params)
+        rows, next_state = await fetch_page(
+            get_select_statement(name, columns), params, fetch_size=limit, paging_state=paging_state
+        )
+        if next_state:
+            set_next_cursor(response, encode_cursor(scope, next_state))
         tickets = []
         for row in rows:
-            tickets.append({
-                "ticket_id": row.ticket_id,
-                "passenger_id": row.passenger_id,
-                "flight_id": row.flight_id,
-                "seat": row.seat,
-                "class_place": row.class_place,
-                "price": float(row.price),
-                "booking_date": row.booking_date
-            })
-        return tickets
+            tickets.append(ticket_from_row(row, columns))
+        return respond(tickets, FAST_PATH or selected is not None, response)
+    except BackendSaturated:
+        raise
     except Exception as e:
         logger.error(f"Failed to get tickets: {e}")
         raise HTTPException(status_code=500, detail="Database error")
 
+# Every ticket is its own partition, so the reads run concurrently; the
+# prepared statement carries the routing key and each one goes straight to
+# a replica that owns it (the driver's default policy is token aware).
+async def load_tickets(ticket_ids):
+    outcomes = await execute_concurrent(
+        (get_statement("select_ticket"), [ticket_id]) for ticket_id in ticket_ids
+    )
+    tickets = {}
+    for ticket_id, outcome in zip(ticket_ids, outcomes):
+        if isinstance(outcome, Exception):
+            if not isinstance(outcome, BackendSaturated):
+                logger.error(f"Failed to load ticket {ticket_id}: {outcome}")
+            tickets[ticket_id] = outcome
+        elif outcome:
+            tickets[ticket_id] = ticket_from_row(outcome[0])
+    return tickets
+
+# POST: /api/tickets/mget – Get Tickets By IDs
+@router.post("/mget", response_model=MultiGetResult)
+async def mget_tickets(request: MultiGetRequest, fields: str = fields_query()):
+    selected = parse_fields(fields, TICKET_FIELDS, key=("ticket_id",))
+    ticket_ids = unique_ids(request.ids)
+    tickets = await ticket_cache.get_or_load_many(ticket_ids, load_tickets)
+    result = mget_result(ticket_ids, tickets, lambda ticket: pick(ticket, selected))
+    return respond(result, FAST_PATH or selected is not None)
+
+async def load_passenger_name(passenger_id):
+    mongo_collection = get_mongo_collection("passengers")
+    passenger = await mongo_collection.find_one(
+        {"passenger_id": passenger_id}, {"full_name": 1, "_id": 0}
+    )
+    return passenger["full_name"] if passenger else None
+
+async def find_passenger_name(passenger_id):
+    name = await passenger_name_cache.get_or_load(
+        passenger_id, lambda: load_passenger_name(passenger_id)
+    )
+    return name or "Unknown"
+
+async def find_flight_route(flight_id):
+    async with get_neo4j_session() as session:
+        result = await session.run("""
+            MATCH (f:Flight {flight_id: $flight_id})-[:DEPARTS_FROM]->(dep:Airport)
+            MATCH (f)-[:ARRIVES_AT]->(arr:Airport)
+            RETURN dep.code AS departure, arr.code AS arrival
+        """, flight_id=flight_id)
+        
+        record = await result.single()
+        if not record:
+            return {}
+        return {
+            "departure_airport": record["departure"],
+            "arrival_airport": record["arrival"]
+        }
+
 # GET: /api/tickets/{ticket_id} – Get Ticket
 @router.get("/{ticket_id}", response_model=TicketWithDetails)
-async def get_ticket(ticket_id: str):
-    cassandra = get_cassandra()
-    query = "SELECT * FROM tickets WHERE ticket_id = %s"
+async def get_ticket(ticket_id: str, fields: str = fields_query()):
+    selected = parse_fields(fields, TICKET_DETAIL_FIELDS, key=("ticket_id",))
+    wanted = selected or TICKET_DETAIL_FIELDS
     
     try:
-        row = cassandra.execute(query, [ticket_id]).one()
-        if not row:
-            raise HTTPException(status_code=404, detail="Ticket not found")
-        
-        ticket = {
-            "ticket_id": row.ticket_id,
-            "passenger_id": row.passenger_id,
-            "flight_id": row.flight_id,
-            "seat": row.seat,
-            "class_place": row.class_place,
-            "price": float(row.price),
-            "booking_date": row.booking_date
-        }
-        
-        mongo_collection = get_mongo_collection("passengers")
-        passenger = await mongo_collection.find_one({"passenger_id": ticket["passenger_id"]})
-        ticket["passenger_name"] = passenger["full_name"] if passenger else "Unknown"
-        
-        driver = get_neo4j_driver()
-        flight_info = {}
-        with driver.session() as session:
-            result = session.run("""
-                MATCH (f:Flight {flight_id: $flight_id})-[:DEPARTS_FROM]->(dep:Airport)
-                MATCH (f)-[:ARRIVES_AT]->(arr:Airport)
-                RETURN dep.code AS departure, arr.code AS arrival
-            """, flight_id=ticket["flight_id"])
-            
-            record = result.single()
-            if record:
-                flight_info = {
-                    "departure_airport": record["departure"],
-                    "arrival_airport": record["arrival"]
-                }
-        
-        ticket["flight_route"] = f"{flight_info.get('departure_airport', '?')} → {flight_info.get('arrival_airport', '?')}"
-        
-        return ticket
-        
+        cached = await ticket_cache.get_or_load(ticket_id, lambda: load_ticket(ticket_id))
+    except BackendSaturated:
+        raise
     except Exception as e:
         logger.error(f"Failed to get ticket: {e}")
         raise HTTPException(status_code=500, detail="Database error")
+    
+    if not cached:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    
+    ticket = dict(cached)
+    
+    # Passenger name and route only depend on the ticket row, so they are
+    # fetched concurrently and fall back to placeholders if a store is slow.
+    # Lookups for fields the client did not ask for are skipped.
+    lookups = {}
+    if "passenger_name" in wanted:
+        lookups["passenger_name"] = Lookup(find_passenger_name(ticket["passenger_id"]), "mongo", default="Unknown")
+    if "flight_route" in wanted:
+        lookups["flight_info"] = Lookup(find_flight_route(ticket["flight_id"]), "neo4j", default={})
+    details = await fan_out(**lookups)
+    
+    if "passenger_name" in details:
+        ticket["passenger_name"] = details["passenger_name"]
+    if "flight_info" in details:
+        flight_info = details["flight_info"]
+        ticket["flight_route"] = f"{flight_info.get('departure_airport', '?')} → {flight_info.get('arrival_airport', '?')}"
+    
+    return respond(pick(project(ticket, TicketWithDetails), selected), FAST_PATH or selected is not None)
 
 # PUT: /api/tickets/{ticket_id} – Update Ticket
 @router.put("/{ticket_id}", response_model=Ticket)
 async def update_ticket(ticket_id: str, update_data: TicketUpdate):
-    cassandra = get_cassandra()
-    
-    existing = cassandra.execute(
-        "SELECT * FROM tickets WHERE ticket_id = %s", 
-        [ticket_id]
-    ).one()
+    existing = await execute_one(get_statement("select_ticket"), [ticket_id])
     if not existing:
         raise HTTPException(status_code=404, detail="Ticket not found")
     
-    set_clauses = []
-    params = []
-    
-    if update_data.seat is not None:
-        set_clauses.append("seat = %s")
-        params.append(update_data.seat)
-    if update_data.class_place is not None:
-        set_clauses.append("class_place = %s")
-        params.append(update_data.class_place)
-    if update_data.price is not None:
-        set_clauses.append("price = %s")
-        params.append(update_data.price)
-    
-    if not set_clauses:
+    update_fields = {k: v for k, v in update_data.dict().items() if v is not None}
+    if not update_fields:
         raise HTTPException(status_code=400, detail="No data to update")
+    if "price" in update_fields:
+        update_fields["price"] = Decimal(str(update_fields["price"]))
     
-    query = f"UPDATE tickets SET {', '.join(set_clauses)} WHERE ticket_id = %s"
-    params.append(ticket_id)
+    # A new seat is claimed before the ticket moves and the old one freed after
+    seat_change = update_fields.get("seat", existing.seat) != existing.seat
+    if seat_change:
+        try:
+            claimed = await seat_map.claim(existing.flight_id, update_fields["seat"], ticket_id)
+        except BackendSaturated:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to claim seat: {e}")
+            raise HTTPException(status_code=500, detail="Database error")
+        if not claimed:
+            raise HTTPException(status_code=409, detail="Seat already taken")
     
     try:
-        cassandra.execute(query, params)
-        updated = cassandra.execute(
-            "SELECT * FROM tickets WHERE ticket_id = %s", 
-            [ticket_id]
-        ).one()
-        return {
-            "ticket_id": updated.ticket_id,
-            "passenger_id": updated.passenger_id,
-            "flight_id": updated.flight_id,
-            "seat": updated.seat,
-            "class_place": updated.class_place,
-            "price": float(updated.price),
-            "booking_date": updated.booking_date
-        }
+        async with outbox_intent(ticket_event("upsert", {"ticket_id": ticket_id})):
+            await execute(update_ticket_batch(existing, update_fields))
     except Exception as e:
+        if seat_change:
+            await seat_map.release_many([(existing.flight_id, update_fields["seat"], ticket_id)])
+        if isinstance(e, BackendSaturated):
+            raise
         logger.error(f"Failed to update ticket: {e}")
         raise HTTPException(status_code=500, detail="Database error")
+    if seat_change:
+        await seat_map.release_many([(existing.flight_id, existing.seat, ticket_id)])
+    
+    ticket_cache.invalidate(ticket_id)
+    if "price" in update_fields:
+        await adjust_spend_after_write(
+            existing.passenger_id, to_cents(update_fields["price"]) - to_cents(existing.price)
+        )
+    # The written row is the existing one with the new values applied
+    updated = {**ticket_from_row(existing), **update_fields}
+    updated["price"] = float(updated["price"])
+    return updated
 
 # DELETE: /api/tickets/{ticket_id} – Delete Ticket
 @router.delete("/{ticket_id}", status_code=204)
 async def delete_ticket(ticket_id: str):
-    cassandra = get_cassandra()
-    
-    existing = cassandra.execute(
-        "SELECT * FROM tickets WHERE ticket_id = %s", 
-        [ticket_id]
-    ).one()
+    existing = await execute_one(get_statement("select_ticket"), [ticket_id])
     if not existing:
         raise HTTPException(status_code=404, detail="Ticket not found")
     
     try:
-        cassandra.execute(
-            "DELETE FROM baggage WHERE ticket_id = %s",
-            [ticket_id]
-        )
+        baggage = await execute(get_statement("select_ticket_baggage"), [ticket_id])
+        await asyncio.gather(*(
+            execute(get_statement("delete_baggage"), [item.baggage_id])
+            for item in baggage
+        ), *(
+            execute(get_statement("delete_flight_baggage"), [existing.flight_id, ticket_id, item.baggage_id])
+            for item in baggage
+        ))
     except Exception as e:
         logger.warning(f"Failed to delete related baggage: {e}")
     
     try:
-        cassandra.execute(
-            "DELETE FROM tickets WHERE ticket_id = %s",
-            [ticket_id]
-        )
-        return
+        async with outbox_intent(ticket_event("delete", {"ticket_id": ticket_id})):
+            await execute(delete_ticket_batch(existing))
+    except BackendSaturated:
+        raise
     except Exception as e:
         logger.error(f"Failed to delete ticket: {e}")
-        raise HTTPException(status_code=500, detail="Database error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Database error")
+    ticket_cache.invalidate(ticket_id)
+    await adjust_spend_after_write(existing.passenger_id, -to_cents(existing.price))
+    await seat_map.release_many([(existing.flight_id, existing.seat, ticket_id)])
+    return
\ No newline at end of file
@@ -0,0 +1,77 @@
+from db.mongo import get_mongo_collection
+from utils.metrics import set_task_route
+from pymongo import ReplaceOne, DeleteMany, UpdateOne
+from datetime import datetime
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger("country_stats")
+
+STATS_COLLECTION = "passenger_country_stats"
+RECONCILE_SECONDS = float(os.getenv("COUNTRY_STATS_RECONCILE_SECONDS", "3600"))
+RETRY_SECONDS = float(os.getenv("COUNTRY_STATS_RETRY_SECONDS", "60"))
+# Written by every full count (and by gen_mongodb.py); until it exists the
+# per-country documents only hold increments from API writes
+RECONCILED_MARKER = "_reconciled"
+
+# One document per nationality ({_id: country, count}). Passenger writes
+# adjust it with $inc; a pass at startup and then periodically recomputes it
+# from the passengers collection to absorb any drift.
+
+def get_stats_collection():
+    return get_mongo_collection(STATS_COLLECTION)
+
+async def adjust_country(country, delta):
+    if not country or not delta:
+        return
+    await get_stats_collection().update_one(
+        {"_id": country}, {"$inc": {"count": delta}}, upsert=True
+    )
+
+async def adjust_countries(deltas):
+    operations = [
+        UpdateOne({"_id": country}, {"$inc": {"count": delta}}, upsert=True)
+        for country, delta in deltas.items() if country and delta
+    ]
+    if operations:
+        await get_stats_collection().bulk_write(operations, ordered=False)
+
+async def reconcile():
+    pipeline = [{"$group": {"_id": "$nationality", "count": {"$sum": 1}}}]
+    counts = {}
+    async for doc in get_mongo_collection("passengers").aggregate(pipeline, allowDiskUse=True):
+        if doc["_id"]:
+            counts[doc["_id"]] = doc["count"]
+    
+    operations = [
+        ReplaceOne({"_id": country}, {"count": count}, upsert=True)
+        for country, count in counts.items()
+    ]
+    operations.append(DeleteMany({"_id": {"$nin": [*counts, RECONCILED_MARKER]}}))
+    operations.append(ReplaceOne(
+        {"_id": RECONCILED_MARKER}, {"reconciled_at": datetime.utcnow()}, upsert=True
+    ))
+    await get_stats_collection().bulk_write(operations, ordered=False)
+    logger.info(f"Reconciled nationality stats for {len(counts)} countries")
+
+async def get_country_stats():
+    collection = get_stats_collection()
+    if await collection.find_one({"_id": RECONCILED_MARKER}) is None:
+        await reconcile()
+    
+    result = []
+    async for doc in collection.find({"count": {"$gt": 0}}).sort("count", -1):
+        result.append({"country": doc["_id"], "count": doc["count"]})
+    return result
+
+async def reconcile_periodically():
+    set_task_route("country_stats")
+    while True:
+        try:
+            await reconcile()
+            delay = RECONCILE_SECONDS
+        except Exception as e:
+            logger.error(f"Nationality stats reconciliation failed: {e}")
+            delay = min(RETRY_SECONDS, RECONCILE_SECONDS)
+        await asyncio.sleep(delay)
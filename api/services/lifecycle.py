@@ -0,0 +1,105 @@
+from db.cassandra import connect_cassandra, close_cassandra, execute_one
+from db.mongo import get_mongo_database, get_mongo_collection, close_mongo, check_transactions, PASSENGER_PROFILE
+from db.neo4j import get_neo4j_driver, close_neo4j
+from db.statements import prepare_statements, get_statement
+from services.route_engine import route_engine
+from datetime import datetime
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger("lifecycle")
+
+RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+WARMUP_ROUTE_ENGINE = os.getenv("WARMUP_ROUTE_ENGINE", "1") != "0"
+
+# Startup does not wait for the databases: the lifespan starts warm_up() in
+# the background and the worker answers at once, while /health/ready stays
+# 503 until every backend has connected and answered a probe query.
+_state = {
+    "ready": False,
+    "shutting_down": False,
+    "pid": os.getpid(),
+    "started_at": datetime.utcnow(),
+    "ready_at": None,
+    "attempts": 0,
+    "errors": {},
+    "probes": {},
+}
+
+async def _probe(name, action):
+    started = time.perf_counter()
+    await action()
+    _state["probes"][name] = round((time.perf_counter() - started) * 1000, 2)
+
+async def _warm_cassandra():
+    session = await asyncio.to_thread(connect_cassandra)
+    await asyncio.to_thread(prepare_statements, session)
+    await execute_one(get_statement("select_ticket"), ("warmup",))
+
+async def _warm_mongo():
+    get_mongo_database()
+    await get_mongo_collection("passengers").find_one({}, PASSENGER_PROFILE)
+    await check_transactions()
+
+async def _warm_neo4j():
+    driver = get_neo4j_driver()
+    if hasattr(driver, "verify_connectivity"):
+        await driver.verify_connectivity()
+    if WARMUP_ROUTE_ENGINE:
+        await route_engine.ensure_loaded()
+
+WARMUPS = {
+    "cassandra": _warm_cassandra,
+    "mongo": _warm_mongo,
+    "neo4j": _warm_neo4j,
+}
+
+async def warm_up():
+    """Connects every backend, prepares statements and runs probe queries.
+    Backends that fail are retried until all of them have answered."""
+    _state["pid"] = os.getpid()
+    pending = dict(WARMUPS)
+    while True:
+        _state["attempts"] += 1
+        names = list(pending)
+        results = await asyncio.gather(
+            *(_probe(name, pending[name]) for name in names), return_exceptions=True
+        )
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                _state["errors"][name] = repr(result)
+            else:
+                _state["errors"].pop(name, None)
+                del pending[name]
+        if not pending:
+            break
+        logger.warning(f"Warmup of {', '.join(pending)} failed, retrying in {RETRY_SECONDS}s: {_state['errors']}")
+        await asyncio.sleep(RETRY_SECONDS)
+
+    _state["ready"] = True
+    _state["ready_at"] = datetime.utcnow()
+    logger.info(f"Worker {_state['pid']} ready, probes (ms): {_state['probes']}")
+
+async def shutdown(*tasks):
+    """Stops background tasks, then closes connections. Uvicorn has already
+    drained in-flight requests when the lifespan exits."""
+    _state["ready"] = False
+    _state["shutting_down"] = True
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = await asyncio.gather(
+        close_neo4j(),
+        asyncio.to_thread(close_cassandra),
+        return_exceptions=True,
+    )
+    close_mongo()
+    for error in results:
+        if isinstance(error, Exception):
+            logger.warning(f"Error while closing connections: {error!r}")
+
+def readiness():
+    return {**_state, "errors": dict(_state["errors"]), "probes": dict(_state["probes"])}
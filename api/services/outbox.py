@@ -0,0 +1,301 @@
+from db.mongo import get_mongo_collection, find_by_keys
+from db.cassandra import execute_concurrent
+from db.statements import get_statement
+from db.ticket_tables import ticket_from_row
+from db.neo4j import get_neo4j_session
+from pymongo.errors import DuplicateKeyError
+from contextlib import asynccontextmanager
+from utils.metrics import set_task_route
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+logger = logging.getLogger("outbox")
+
+OUTBOX_COLLECTION = "outbox"
+CHECKPOINT_COLLECTION = "outbox_checkpoints"
+CONSUMER = "neo4j"
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "1000"))
+POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+RETENTION_SECONDS = int(os.getenv("OUTBOX_RETENTION_SECONDS", "86400"))
+PENDING_SECONDS = float(os.getenv("OUTBOX_PENDING_SECONDS", "30"))
+LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "15"))
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Every write to a passenger or ticket records an event naming the changed
+# entity ({entity, key, op}). Events carry no state: the worker reads the
+# entity's current state from its store when applying, upserting what exists
+# and deleting what is gone, so batches can be replayed, overlap or arrive
+# late without resurrecting a deleted edge.
+#
+# A passenger change and its event commit in one MongoDB transaction. A
+# ticket lives in Cassandra, so its event is inserted with ready=False before
+# the write and flagged ready after it; an event left unready by a crash in
+# between is picked up once it is PENDING_SECONDS old and reconciled like any
+# other. A passenger delete is committed unready as well and flagged once its
+# tickets are gone from Cassandra, so ticket events applied before it cannot
+# MERGE the passenger back. Applied events expire through a TTL index.
+#
+# Only one process applies events at a time: the worker holding the lease in
+# the checkpoint document renews it before every batch, and the others poll
+# until it expires.
+
+UPSERT_PASSENGERS = """
+UNWIND $rows AS row
+MERGE (p:Passenger {passenger_id: row.passenger_id})
+SET p.full_name = row.full_name, p.nationality = row.nationality
+"""
+
+DELETE_PASSENGERS = """
+UNWIND $keys AS key
+MATCH (p:Passenger {passenger_id: key})
+DETACH DELETE p
+"""
+
+UPSERT_TICKETS = """
+UNWIND $rows AS row
+MATCH (f:Flight {flight_id: row.flight_id})
+MERGE (p:Passenger {passenger_id: row.passenger_id})
+MERGE (p)-[r:BOOKED_FLIGHT {ticket_id: row.ticket_id}]->(f)
+SET r.seat = row.seat,
+    r.class_place = row.class_place,
+    r.price = row.price,
+    r.booking_date = row.booking_date
+"""
+
+DELETE_TICKETS = """
+UNWIND $keys AS key
+MATCH ()-[r:BOOKED_FLIGHT {ticket_id: key}]->()
+DELETE r
+"""
+
+_wakeup = asyncio.Event()
+_metrics = {
+    "leader": False,
+    "batches": 0,
+    "events_applied": 0,
+    "failures": 0,
+    "last_error": None,
+    "last_batch_seconds": None,
+}
+
+def get_outbox_collection():
+    return get_mongo_collection(OUTBOX_COLLECTION)
+
+def get_checkpoint_collection():
+    return get_mongo_collection(CHECKPOINT_COLLECTION)
+
+def ticket_event(op, ticket):
+    return {"entity": "ticket", "key": ticket["ticket_id"], "op": op}
+
+def passenger_event(op, passenger):
+    return {"entity": "passenger", "key": passenger["passenger_id"], "op": op}
+
+async def append_events(*events, session=None, ready=True):
+    """Inserts the events, inside the caller's transaction if a session is
+    given. Failures propagate: a write whose event was not recorded must
+    fail too. Returns the event ids."""
+    if not events:
+        return []
+    now = datetime.utcnow()
+    documents = [{**event, "created_at": now, "applied": False, "ready": ready} for event in events]
+    result = await get_outbox_collection().insert_many(documents, ordered=True, session=session)
+    if ready:
+        _wakeup.set()
+    return result.inserted_ids
+
+@asynccontextmanager
+async def outbox_intent(*events):
+    """Records events before a write to another store. They become ready
+    when the block exits, whether the write succeeded or not, since applying
+    an event only copies the entity's current state."""
+    ids = await append_events(*events, ready=False)
+    try:
+        yield
+    finally:
+        if ids:
+            await mark_ready(ids)
+
+async def mark_ready(ids):
+    try:
+        await get_outbox_collection().update_many({"_id": {"$in": ids}}, {"$set": {"ready": True}})
+        _wakeup.set()
+    except Exception as e:
+        # The worker still applies them after PENDING_SECONDS
+        logger.warning(f"Failed to mark {len(ids)} outbox events ready: {e}")
+
+def _utc(value):
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+async def _load_passengers(keys):
+    if not keys:
+        return {}
+    return await find_by_keys(
+        get_mongo_collection("passengers"), "passenger_id", keys,
+        {"_id": 0, "passenger_id": 1, "full_name": 1, "nationality": 1}
+    )
+
+async def _load_tickets(keys):
+    keys = list(keys)
+    outcomes = await execute_concurrent((get_statement("select_ticket"), [key]) for key in keys)
+    tickets = {}
+    for key, outcome in zip(keys, outcomes):
+        if isinstance(outcome, Exception):
+            raise outcome
+        if outcome:
+            ticket = ticket_from_row(outcome[0])
+            tickets[key] = {name: _utc(value) for name, value in ticket.items()}
+    return tickets
+
+async def _apply(events):
+    keys = {"passenger": set(), "ticket": set()}
+    for event in events:
+        keys[event["entity"]].add(event["key"])
+    passengers, tickets = await asyncio.gather(
+        _load_passengers(keys["passenger"]), _load_tickets(keys["ticket"])
+    )
+    # Passengers are upserted before their tickets and deleted after them
+    statements = (
+        (UPSERT_PASSENGERS, {"rows": list(passengers.values())}),
+        (UPSERT_TICKETS, {"rows": list(tickets.values())}),
+        (DELETE_TICKETS, {"keys": sorted(keys["ticket"] - tickets.keys())}),
+        (DELETE_PASSENGERS, {"keys": sorted(keys["passenger"] - passengers.keys())}),
+    )
+    async with get_neo4j_session(read_only=False) as session:
+        tx = await session.begin_transaction()
+        try:
+            for query, parameters in statements:
+                if next(iter(parameters.values())):
+                    await tx.run(query, **parameters)
+            # A worker that lost its lease while reading must not overwrite
+            # what the new leader has applied since
+            if not await _hold_lease():
+                raise RuntimeError("Outbox lease lost during the batch")
+            await tx.commit()
+        finally:
+            if not tx.closed():
+                await tx.close()
+
+async def _hold_lease():
+    """Takes or renews the consumer lease; False while another live worker
+    holds it."""
+    now = datetime.utcnow()
+    try:
+        await get_checkpoint_collection().find_one_and_update(
+            {
+                "_id": CONSUMER,
+                "$or": [
+                    {"owner": OWNER},
+                    {"lease_until": {"$lt": now}},
+                    {"lease_until": {"$exists": False}},
+                ]
+            },
+            {"$set": {"owner": OWNER, "lease_until": now + timedelta(seconds=LEASE_SECONDS)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The document exists and its lease belongs to someone else
+        _metrics["leader"] = False
+        return False
+    _metrics["leader"] = True
+    return True
+
+async def _release_lease():
+    await get_checkpoint_collection().update_one(
+        {"_id": CONSUMER, "owner": OWNER}, {"$set": {"lease_until": datetime.utcnow()}}
+    )
+    _metrics["leader"] = False
+
+async def apply_pending(limit=BATCH_SIZE):
+    collection = get_outbox_collection()
+    stale = datetime.utcnow() - timedelta(seconds=PENDING_SECONDS)
+    query = {"applied": False, "$or": [{"ready": True}, {"created_at": {"$lt": stale}}]}
+    events = [event async for event in collection.find(query).sort("_id", 1).limit(limit)]
+    if not events:
+        return 0
+
+    started = time.perf_counter()
+    await _apply(events)
+
+    now = datetime.utcnow()
+    ids = [event["_id"] for event in events]
+    await collection.update_many(
+        {"_id": {"$in": ids}}, {"$set": {"applied": True, "applied_at": now}}
+    )
+    await get_checkpoint_collection().update_one(
+        {"_id": CONSUMER, "owner": OWNER},
+        {
+            "$set": {"last_event_id": ids[-1], "last_event_at": events[-1]["created_at"], "updated_at": now},
+            "$inc": {"applied_total": len(events)}
+        }
+    )
+    _metrics["batches"] += 1
+    _metrics["events_applied"] += len(events)
+    _metrics["last_batch_seconds"] = round(time.perf_counter() - started, 4)
+    return len(events)
+
+async def ensure_indexes():
+    collection = get_outbox_collection()
+    await collection.create_index([("applied", 1), ("_id", 1)])
+    await collection.create_index("applied_at", expireAfterSeconds=RETENTION_SECONDS)
+
+async def run_outbox_worker():
+    set_task_route("outbox")
+    indexed = False
+    failures = 0
+    try:
+        while True:
+            # Cleared before reading, so events appended meanwhile are not missed
+            _wakeup.clear()
+            try:
+                if not indexed:
+                    await ensure_indexes()
+                    indexed = True
+                applied = await apply_pending() if await _hold_lease() else 0
+                failures = 0
+            except Exception as e:
+                failures += 1
+                _metrics["failures"] += 1
+                _metrics["last_error"] = str(e)
+                logger.error(f"Failed to apply outbox events: {e}")
+                await asyncio.sleep(min(POLL_SECONDS * 2 ** failures, 60))
+                continue
+            # A full batch means there is a backlog; keep draining without waiting
+            if applied >= BATCH_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        # Hands the lease over at shutdown instead of letting it run out
+        if _metrics["leader"]:
+            try:
+                await asyncio.wait_for(_release_lease(), timeout=2)
+            except Exception as e:
+                logger.warning(f"Failed to release the outbox lease: {e}")
+
+async def outbox_stats():
+    collection = get_outbox_collection()
+    pending = await collection.count_documents({"applied": False})
+    oldest = await collection.find_one({"applied": False}, {"created_at": 1}, sort=[("_id", 1)])
+    checkpoint = await get_checkpoint_collection().find_one({"_id": CONSUMER}) or {}
+    lag = (datetime.utcnow() - oldest["created_at"]).total_seconds() if oldest else 0.0
+    return {
+        "consumer": CONSUMER,
+        "pending": pending,
+        "lag_seconds": round(lag, 3),
+        "last_event_id": str(checkpoint["last_event_id"]) if checkpoint.get("last_event_id") else None,
+        "last_event_at": checkpoint.get("last_event_at"),
+        "applied_total": checkpoint.get("applied_total", 0),
+        "owner": checkpoint.get("owner"),
+        "lease_until": checkpoint.get("lease_until"),
+        "worker": OWNER,
+        **_metrics
+    }
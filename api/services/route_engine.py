@@ -0,0 +1,293 @@
+from array import array
+from bisect import bisect_left
+from collections import deque
+from db.neo4j import get_neo4j_session
+from utils.metrics import set_task_route
+from datetime import timezone
+import asyncio
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger("route_engine")
+
+REFRESH_SECONDS = float(os.getenv("ROUTE_ENGINE_REFRESH_SECONDS", "300"))
+MAX_EXPANSIONS = int(os.getenv("ROUTE_ENGINE_MAX_EXPANSIONS", "100000"))
+
+FLIGHT_FIELDS = (
+    "flight_id", "airline_code", "airline_name", "status",
+    "departure_gate", "departure_time", "arrival_time"
+)
+AIRPORT_FIELDS = ("code", "name", "city", "country")
+
+FLIGHTS_QUERY = f"""
+    MATCH (dep:Airport)<-[:DEPARTS_FROM]-(f:Flight)-[:ARRIVES_AT]->(arr:Airport)
+    WHERE f.departure_time IS NOT NULL AND f.arrival_time IS NOT NULL
+    RETURN {", ".join(f"f.{field} AS {field}" for field in FLIGHT_FIELDS)},
+           dep.code AS departure_airport, arr.code AS arrival_airport
+"""
+AIRPORTS_QUERY = f"""
+    MATCH (a:Airport)
+    RETURN {", ".join(f"a.{field} AS {field}" for field in AIRPORT_FIELDS)}
+"""
+
+def utc_timestamp(value):
+    """Epoch seconds of a datetime; naive values are UTC, as flight times are
+    stored, rather than the server's local time."""
+    if hasattr(value, "to_native"):
+        value = value.to_native()
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+class FlightNetwork:
+    """Flight network held in flat arrays for connection-scan route search.
+
+    Every flight occupies a slot in parallel arrays (departure/arrival stop
+    and time). Active slots are kept in one global list sorted by departure
+    time and in per-airport lists, so queries only touch flights that can
+    still be caught.
+    """
+
+    def __init__(self):
+        self.airports = {}
+        self._stop_index = {}
+        self._stop_codes = []
+        self._dep_stop = array("i")
+        self._arr_stop = array("i")
+        self._dep_time = array("d")
+        self._arr_time = array("d")
+        self._flights = []
+        self._slots = {}
+        self._order = array("i")
+        self._order_times = array("d")
+        self._departures = {}
+        self._incoming = None
+
+    # Network maintenance
+
+    def _stop(self, code):
+        index = self._stop_index.get(code)
+        if index is None:
+            index = self._stop_index[code] = len(self._stop_codes)
+            self._stop_codes.append(code)
+        return index
+
+    def _insert_sorted(self, times, slots, when, slot):
+        position = bisect_left(times, when)
+        times.insert(position, when)
+        slots.insert(position, slot)
+
+    def _remove_sorted(self, times, slots, when, slot):
+        position = bisect_left(times, when)
+        while slots[position] != slot:
+            position += 1
+        del times[position]
+        del slots[position]
+
+    def add_airport(self, airport):
+        self.airports[airport["code"]] = airport
+        self._stop(airport["code"])
+
+    def upsert_flight(self, record):
+        self.remove_flight(record["flight_id"])
+        self._incoming = None
+        dep_stop = self._stop(record["departure_airport"])
+        arr_stop = self._stop(record["arrival_airport"])
+        dep_time = utc_timestamp(record["departure_time"])
+
+        slot = len(self._flights)
+        self._dep_stop.append(dep_stop)
+        self._arr_stop.append(arr_stop)
+        self._dep_time.append(dep_time)
+        self._arr_time.append(utc_timestamp(record["arrival_time"]))
+        self._flights.append({field: record[field] for field in FLIGHT_FIELDS})
+        self._slots[record["flight_id"]] = slot
+
+        self._insert_sorted(self._order_times, self._order, dep_time, slot)
+        times, slots = self._departures.setdefault(dep_stop, (array("d"), array("i")))
+        self._insert_sorted(times, slots, dep_time, slot)
+
+    def remove_flight(self, flight_id):
+        slot = self._slots.pop(flight_id, None)
+        if slot is None:
+            return
+        self._incoming = None
+        dep_time = self._dep_time[slot]
+        self._remove_sorted(self._order_times, self._order, dep_time, slot)
+        times, slots = self._departures[self._dep_stop[slot]]
+        self._remove_sorted(times, slots, dep_time, slot)
+        # The slot itself stays as a tombstone until the next full load
+        self._flights[slot] = None
+
+    # Queries
+
+    def _hops_to(self, target):
+        # Fewest legs from every stop to the target, ignoring time; used to
+        # prune itineraries that cannot arrive within max_legs.
+        if self._incoming is None:
+            self._incoming = {}
+            for slot in self._order:
+                self._incoming.setdefault(self._arr_stop[slot], set()).add(self._dep_stop[slot])
+        incoming = self._incoming
+        hops = {target: 0}
+        queue = deque([target])
+        while queue:
+            stop = queue.popleft()
+            for previous in incoming.get(stop, ()):
+                if previous not in hops:
+                    hops[previous] = hops[stop] + 1
+                    queue.append(previous)
+        return hops
+
+    def _itinerary(self, slots):
+        return {
+            "flights": [self._flights[slot] for slot in slots],
+            "departure_airport": self._stop_codes[self._dep_stop[slots[0]]],
+            "arrival_airport": self._stop_codes[self._arr_stop[slots[-1]]],
+            "transfer_airports": [self._stop_codes[self._dep_stop[slot]] for slot in slots[1:]],
+            "arrival_timestamp": self._arr_time[slots[-1]]
+        }
+
+    def search(self, origin, destination, max_legs=2, min_connection=0.0,
+               limit=50, depart_after=None):
+        """All itineraries up to max_legs, ordered by arrival time."""
+        if origin not in self._stop_index or destination not in self._stop_index:
+            return []
+        source = self._stop_index[origin]
+        target = self._stop_index[destination]
+        hops = self._hops_to(target)
+        if source not in hops:
+            return []
+
+        found = []
+        expansions = 0
+        stack = [(source, -math.inf if depart_after is None else depart_after, (), frozenset([source]))]
+        while stack and expansions < MAX_EXPANSIONS:
+            stop, ready_at, path, visited = stack.pop()
+            times, slots = self._departures.get(stop, ((), ()))
+            for position in range(bisect_left(times, ready_at), len(times)):
+                expansions += 1
+                slot = slots[position]
+                arrival_stop = self._arr_stop[slot]
+                legs = path + (slot,)
+                if arrival_stop == target:
+                    found.append(legs)
+                    continue
+                if arrival_stop in visited or len(legs) + hops.get(arrival_stop, max_legs + 1) > max_legs:
+                    continue
+                stack.append((
+                    arrival_stop,
+                    self._arr_time[slot] + min_connection,
+                    legs,
+                    visited | {arrival_stop}
+                ))
+
+        found.sort(key=lambda legs: (self._arr_time[legs[-1]], len(legs)))
+        return [self._itinerary(list(legs)) for legs in found[:limit]]
+
+    def earliest_arrival(self, origin, destination, max_legs=3, min_connection=0.0,
+                         depart_after=None):
+        """Connection scan in rounds: round k holds the earliest arrival at
+        every stop using at most k legs. Returns the Pareto set of journeys
+        (fewer legs vs. earlier arrival)."""
+        if origin not in self._stop_index or destination not in self._stop_index:
+            return []
+        source = self._stop_index[origin]
+        target = self._stop_index[destination]
+        stops = len(self._stop_codes)
+        start = -math.inf if depart_after is None else depart_after
+
+        arrival = [array("d", [math.inf]) * stops]
+        arrival[0][source] = start
+        parents = [[None] * stops]
+        first = bisect_left(self._order_times, start)
+
+        journeys = []
+        for legs in range(1, max_legs + 1):
+            previous = arrival[-1]
+            current = array("d", previous)
+            parent = list(parents[-1])
+            for position in range(first, len(self._order)):
+                slot = self._order[position]
+                dep_stop = self._dep_stop[slot]
+                reached = previous[dep_stop]
+                if reached == math.inf:
+                    continue
+                if dep_stop != source:
+                    reached += min_connection
+                if reached > self._dep_time[slot]:
+                    continue
+                arr_stop = self._arr_stop[slot]
+                if self._arr_time[slot] < current[arr_stop]:
+                    current[arr_stop] = self._arr_time[slot]
+                    parent[arr_stop] = (slot, legs)
+            arrival.append(current)
+            parents.append(parent)
+
+            if current[target] < previous[target]:
+                journeys.append(self._itinerary(self._unwind(parents, target, legs)))
+        return journeys
+
+    def _unwind(self, parents, stop, legs):
+        slots = []
+        entry = parents[legs][stop]
+        while entry is not None:
+            slot, taken_in = entry
+            slots.append(slot)
+            entry = parents[taken_in - 1][self._dep_stop[slot]]
+        slots.reverse()
+        return slots
+
+    @property
+    def flight_count(self):
+        return len(self._slots)
+
+class RouteEngine:
+    """Keeps a FlightNetwork loaded from Neo4j. The first query loads it if
+    warmup has not; after that refresh_periodically() rebuilds it in the
+    background and swaps it in, so queries never wait for a reload."""
+
+    def __init__(self):
+        self.network = FlightNetwork()
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        async with get_neo4j_session() as session:
+            result = await session.run(AIRPORTS_QUERY)
+            airports = [record.data() async for record in result]
+            result = await session.run(FLIGHTS_QUERY)
+            flights = [record.data() async for record in result]
+
+        # Built off to the side and swapped in, so queries never see a
+        # partially loaded network.
+        network = FlightNetwork()
+        for airport in airports:
+            network.add_airport(airport)
+        for flight in sorted(flights, key=lambda record: utc_timestamp(record["departure_time"])):
+            network.upsert_flight(flight)
+        self.network = network
+        self.loaded_at = time.monotonic()
+        logger.info(f"Route engine loaded {network.flight_count} flights, {len(network.airports)} airports")
+
+    async def ensure_loaded(self):
+        if self.loaded_at:
+            return
+        async with self._lock:
+            if not self.loaded_at:
+                await self.load()
+
+    async def refresh_periodically(self):
+        set_task_route("route_engine")
+        while True:
+            await asyncio.sleep(REFRESH_SECONDS)
+            try:
+                # Queries keep using the current network until load() swaps it
+                async with self._lock:
+                    await self.load()
+            except Exception as e:
+                logger.error(f"Route engine refresh failed, serving the previous network: {e}")
+
+route_engine = RouteEngine()
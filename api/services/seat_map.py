@@ -0,0 +1,252 @@
+from collections import OrderedDict
+from db.cassandra import execute, execute_one, execute_concurrent
+from db.statements import get_statement
+from db.mongo import get_mongo_collection
+from utils.bulkhead import BackendSaturated
+from utils.metrics import register_gauge, register_counter
+import asyncio
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger("seat_map")
+
+SEAT_ROWS = int(os.getenv("SEAT_MAP_ROWS", "40"))
+SEAT_LETTERS = os.getenv("SEAT_MAP_LETTERS", "ABCDEF")
+REFRESH_SECONDS = float(os.getenv("SEAT_MAP_REFRESH_SECONDS", "5"))
+MAX_FLIGHTS = int(os.getenv("SEAT_MAP_FLIGHTS", "10000"))
+
+SEAT_PATTERN = re.compile(r"^(\d+)([A-Z])$")
+
+class SeatGrid:
+    """Seats numbered row by row, SEAT_MAP_LETTERS to a row. A grid sized
+    from the aircraft's capacity ends after its last seat; without one the
+    nominal SEAT_MAP_ROWS x SEAT_MAP_LETTERS grid is used."""
+
+    __slots__ = ("size", "aircraft", "capacity")
+
+    def __init__(self, size, aircraft=None, capacity=None):
+        self.size = size
+        self.aircraft = aircraft
+        self.capacity = capacity
+
+    def index(self, seat):
+        """Bit of a seat, None if it is off the grid."""
+        match = SEAT_PATTERN.match(seat)
+        if not match:
+            return None
+        row = int(match.group(1))
+        letter = SEAT_LETTERS.find(match.group(2))
+        if row < 1 or letter < 0:
+            return None
+        index = (row - 1) * len(SEAT_LETTERS) + letter
+        return index if index < self.size else None
+
+    def label(self, index):
+        row, letter = divmod(index, len(SEAT_LETTERS))
+        return f"{row + 1}{SEAT_LETTERS[letter]}"
+
+    def describe(self):
+        return {
+            "layout": "nominal" if self.aircraft is None else "aircraft",
+            "aircraft": self.aircraft,
+            "capacity": self.capacity,
+            "rows": -(-self.size // len(SEAT_LETTERS)),
+            "letters": SEAT_LETTERS,
+        }
+
+NOMINAL_GRID = SeatGrid(SEAT_ROWS * len(SEAT_LETTERS))
+
+class FlightSeats:
+    """Occupied seats of one flight: one bit per grid seat, plus a set for
+    seat codes outside the grid. The availability summary is built once and
+    reused until a seat changes."""
+
+    __slots__ = ("flight_id", "grid", "bits", "extra", "loaded_at", "_summary")
+
+    def __init__(self, flight_id, seats=(), grid=NOMINAL_GRID):
+        self.flight_id = flight_id
+        self.grid = grid
+        self.bits = bytearray((grid.size + 7) // 8)
+        self.extra = set()
+        self.loaded_at = time.monotonic()
+        self._summary = None
+        for seat in seats:
+            self.occupy(seat)
+
+    def occupy(self, seat):
+        index = self.grid.index(seat)
+        if index is None:
+            self.extra.add(seat)
+        else:
+            self.bits[index >> 3] |= 1 << (index & 7)
+        self._summary = None
+
+    def free(self, seat):
+        index = self.grid.index(seat)
+        if index is None:
+            self.extra.discard(seat)
+        else:
+            self.bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+        self._summary = None
+
+    def summary(self):
+        if self._summary is None:
+            occupied = []
+            available = []
+            for index in range(self.grid.size):
+                taken = self.bits[index >> 3] & (1 << (index & 7))
+                (occupied if taken else available).append(self.grid.label(index))
+            self._summary = {
+                "flight_id": self.flight_id,
+                **self.grid.describe(),
+                "total": len(occupied) + len(available),
+                "occupied_count": len(occupied) + len(self.extra),
+                "available_count": len(available),
+                "occupied": occupied + sorted(self.extra),
+                "available": available,
+            }
+        return self._summary
+
+class SeatMap:
+    """Seat occupancy per flight. The flight_seats table is the source of
+    truth: a seat is claimed with INSERT ... IF NOT EXISTS, so two bookings
+    cannot get the same seat whichever worker they hit. Availability is
+    answered from the in-memory maps, which pick up other workers' bookings
+    when refreshed in the background every SEAT_MAP_REFRESH_SECONDS."""
+
+    def __init__(self):
+        self._flights = OrderedDict()
+        self._loading = {}
+        # Seat changes made here while a load is in flight, replayed on it
+        self._changes = {}
+        self.claims = 0
+        self.conflicts = 0
+        self.releases = 0
+
+    async def _grid(self, flight_id):
+        # The aircraft of a flight does not change between refreshes
+        previous = self._flights.get(flight_id)
+        if previous is not None and previous.grid is not NOMINAL_GRID:
+            return previous.grid
+        try:
+            flight = await get_mongo_collection("flights").find_one(
+                {"flight_id": flight_id}, {"_id": 0, "aircraft": 1}
+            )
+            aircraft = flight and flight.get("aircraft")
+            if not aircraft:
+                return NOMINAL_GRID
+            document = await get_mongo_collection("aircrafts").find_one(
+                {"reg_number": aircraft}, {"_id": 0, "capacity": 1}
+            )
+        except BackendSaturated:
+            return NOMINAL_GRID
+        except Exception as e:
+            logger.warning(f"Failed to load the aircraft of {flight_id}: {e}")
+            return NOMINAL_GRID
+        capacity = document and document.get("capacity")
+        return SeatGrid(capacity, aircraft, capacity) if capacity else NOMINAL_GRID
+
+    async def _load(self, flight_id):
+        rows, status, grid = await asyncio.gather(
+            execute(get_statement("select_flight_seats"), [flight_id]),
+            execute_one(get_statement("select_flight_status"), [flight_id]),
+            self._grid(flight_id),
+        )
+        changes = self._changes.pop(flight_id, [])
+        if not rows and status is None:
+            return None
+        seats = FlightSeats(flight_id, (row.seat for row in rows), grid)
+        for seat, occupied in changes:
+            if occupied:
+                seats.occupy(seat)
+            else:
+                seats.free(seat)
+        self._flights[flight_id] = seats
+        self._flights.move_to_end(flight_id)
+        while len(self._flights) > MAX_FLIGHTS:
+            self._flights.popitem(last=False)
+        return seats
+
+    def _start_load(self, flight_id):
+        task = self._loading.get(flight_id)
+        if task is None:
+            self._changes[flight_id] = []
+            task = self._loading[flight_id] = asyncio.ensure_future(self._load(flight_id))
+            task.add_done_callback(lambda done: self._loaded(flight_id, done))
+        return task
+
+    def _loaded(self, flight_id, task):
+        self._loading.pop(flight_id, None)
+        if task.cancelled() or task.exception() is not None:
+            self._changes.pop(flight_id, None)
+            if not task.cancelled():
+                logger.warning(f"Failed to load seat map of {flight_id}: {task.exception()!r}")
+
+    async def get(self, flight_id):
+        """Seat map of a flight, or None if there is no such flight."""
+        seats = self._flights.get(flight_id)
+        if seats is None:
+            return await asyncio.shield(self._start_load(flight_id))
+        self._flights.move_to_end(flight_id)
+        if time.monotonic() - seats.loaded_at >= REFRESH_SECONDS:
+            self._start_load(flight_id)
+        return seats
+
+    def _apply(self, flight_id, seat, occupied):
+        seats = self._flights.get(flight_id)
+        if seats is not None:
+            if occupied:
+                seats.occupy(seat)
+            else:
+                seats.free(seat)
+        changes = self._changes.get(flight_id)
+        if changes is not None:
+            changes.append((seat, occupied))
+
+    def _claimed(self, flight_id, seat, row):
+        # The first column of a conditional write's result is [applied];
+        # the seat is occupied either way
+        applied = bool(row[0])
+        self._apply(flight_id, seat, True)
+        if applied:
+            self.claims += 1
+        else:
+            self.conflicts += 1
+        return applied
+
+    async def claim(self, flight_id, seat, ticket_id):
+        """Takes the seat for the ticket; False if another ticket holds it."""
+        row = await execute_one(get_statement("claim_seat"), [flight_id, seat, ticket_id])
+        return self._claimed(flight_id, seat, row)
+
+    async def claim_many(self, claims):
+        """Claims (flight_id, seat, ticket_id) triples concurrently; results
+        are True, False or the exception, in input order."""
+        outcomes = await execute_concurrent(
+            (get_statement("claim_seat"), list(claim)) for claim in claims
+        )
+        return [
+            outcome if isinstance(outcome, Exception) else self._claimed(flight_id, seat, outcome[0])
+            for (flight_id, seat, _), outcome in zip(claims, outcomes)
+        ]
+
+    async def release_many(self, claims):
+        """Frees seats still held by the given tickets. Best effort: a seat
+        left claimed only blocks itself, so failures are logged, not raised."""
+        outcomes = await execute_concurrent(
+            (get_statement("release_seat"), list(claim)) for claim in claims
+        )
+        for (flight_id, seat, ticket_id), outcome in zip(claims, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning(f"Failed to release seat {seat} of {flight_id} held by {ticket_id}: {outcome}")
+            elif outcome and outcome[0][0]:
+                self.releases += 1
+                self._apply(flight_id, seat, False)
+
+seat_map = SeatMap()
+register_gauge("seat_map_flights", "Seat maps held in memory.", lambda: [({}, len(seat_map._flights))])
+register_counter("seat_map_claims_total", "Seats claimed.", lambda: [({}, seat_map.claims)])
+register_counter("seat_map_conflicts_total", "Seat claims refused as already taken.", lambda: [({}, seat_map.conflicts)])
+register_counter("seat_map_releases_total", "Seats released.", lambda: [({}, seat_map.releases)])
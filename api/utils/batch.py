@@ -0,0 +1,43 @@
+from fastapi import HTTPException
+from utils.bulkhead import BackendSaturated
+import os
+
+MAX_BATCH_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+MAX_MGET_IDS = int(os.getenv("MGET_MAX_IDS", "5000"))
+
+def check_batch_size(items, limit=MAX_BATCH_ITEMS):
+    if not items:
+        raise HTTPException(status_code=400, detail="Empty batch")
+    if len(items) > limit:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(items)} items, at most {limit} allowed"
+        )
+
+def unique_ids(ids):
+    check_batch_size(ids, MAX_MGET_IDS)
+    # First occurrence wins, so results follow the request order
+    return list(dict.fromkeys(ids))
+
+def mget_result(ids, values, render):
+    """One entry per ID: found with the rendered item, missing, or error.
+    An overloaded backend fails the whole request with 503 instead."""
+    results = []
+    found = failed = 0
+    for key in ids:
+        value = values.get(key)
+        if isinstance(value, BackendSaturated):
+            raise value
+        if isinstance(value, Exception):
+            failed += 1
+            results.append({"id": key, "status": "error", "error": "Failed to load"})
+        elif value is None:
+            results.append({"id": key, "status": "missing"})
+        else:
+            found += 1
+            results.append({"id": key, "status": "found", "item": render(value)})
+    return {"found": found, "missing": len(ids) - found - failed, "failed": failed, "results": results}
+
+def summarize(results):
+    created = sum(1 for result in results if result["status"] == "created")
+    return {"created": created, "failed": len(results) - created, "results": results}
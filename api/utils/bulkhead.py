@@ -0,0 +1,153 @@
+from collections import deque
+import asyncio
+import math
+import os
+
+class BackendSaturated(Exception):
+    def __init__(self, backend: str, retry_after: int):
+        super().__init__(f"{backend} is saturated")
+        self.backend = backend
+        self.retry_after = retry_after
+
+class Bulkhead:
+    """Concurrency limit for one backend, so a slow store can only tie up its
+    own share of the API. The limit follows observed latency: it grows while
+    recent round trips stay within `tolerance` of the long-term average and
+    shrinks in proportion once they do not (the gradient algorithm from
+    Netflix concurrency-limits). Callers beyond the limit wait in a bounded
+    queue and get BackendSaturated when it is full or their wait times out."""
+
+    def __init__(self, name: str, initial_limit: int, min_limit: int, max_limit: int,
+                 queue_size: int, queue_timeout: float, overload_errors=(),
+                 tolerance: float = 2.0, smoothing: float = 0.2):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.overload_errors = overload_errors
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.inflight = 0
+        self.short_rtt = None
+        self.long_rtt = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = {"queue_full": 0, "queue_wait": 0, "queue_timeout": 0}
+        self.overloads = 0
+        self._waiters = deque()
+
+    def retry_after(self) -> int:
+        # Roughly how long the current queue takes to drain, in whole seconds
+        backlog = (len(self._waiters) + 1) / max(self.limit, 1.0)
+        return max(1, math.ceil(backlog * (self.short_rtt or 0.0)))
+
+    async def acquire(self):
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            self.rejected["queue_full"] += 1
+            raise BackendSaturated(self.name, self.retry_after())
+        # No point queueing behind a backlog that will not drain in time
+        if self.short_rtt and len(self._waiters) / self.limit * self.short_rtt > self.queue_timeout:
+            self.rejected["queue_wait"] += 1
+            raise BackendSaturated(self.name, self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected["queue_timeout"] += 1
+                raise BackendSaturated(self.name, self.retry_after()) from None
+            raise
+        self.admitted += 1
+
+    # Later pages of an admitted query are never queued or rejected
+    def enter(self):
+        self.inflight += 1
+
+    def release(self, latency: float = None, error: BaseException = None):
+        self.inflight -= 1
+        if isinstance(error, self.overload_errors):
+            self.overloads += 1
+            self.limit = max(float(self.min_limit), self.limit * 0.9)
+        elif latency is not None:
+            self._adapt(latency)
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+    def _adapt(self, latency):
+        if self.short_rtt is None:
+            self.short_rtt = self.long_rtt = latency
+            return
+        self.short_rtt += (latency - self.short_rtt) * 0.1
+        self.long_rtt += (latency - self.long_rtt) / 600
+        # A sustained shift becomes the new normal instead of pinning the limit
+        if self.long_rtt / self.short_rtt > 2:
+            self.long_rtt *= 0.95
+        # Growth only counts while the limit is actually being used
+        if self.inflight < self.limit / 2:
+            return
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / self.short_rtt))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - self.smoothing) + target * self.smoothing
+        self.limit = max(float(self.min_limit), min(float(self.max_limit), limit))
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "queued": len(self._waiters),
+            "queue_size": self.queue_size,
+            "short_rtt": self.short_rtt,
+            "long_rtt": self.long_rtt,
+            "admitted": self.admitted,
+            "queued_total": self.queued,
+            "rejected": dict(self.rejected),
+            "overloads": self.overloads,
+        }
+
+BULKHEADS_ENABLED = os.getenv("BULKHEADS_ENABLED", "1") != "0"
+
+_bulkheads = {}
+
+def create_bulkhead(name: str, max_limit: int, overload_errors=()) -> Bulkhead:
+    if not BULKHEADS_ENABLED:
+        return None
+    env_name = name.upper()
+    max_limit = int(os.getenv(f"BULKHEAD_{env_name}_MAX", max_limit))
+    # The floor keeps event loop lag, which every backend sees, from
+    # starving healthy stores along with the slow one
+    min_limit = int(os.getenv(f"BULKHEAD_{env_name}_MIN", max(1, max_limit // 10)))
+    bulkhead = Bulkhead(
+        name,
+        initial_limit=int(os.getenv(f"BULKHEAD_{env_name}_INITIAL", max(min_limit, min(20, max_limit)))),
+        min_limit=min_limit,
+        max_limit=max_limit,
+        queue_size=int(os.getenv(f"BULKHEAD_{env_name}_QUEUE", "256")),
+        queue_timeout=float(os.getenv(f"BULKHEAD_{env_name}_QUEUE_TIMEOUT", "1")),
+        overload_errors=overload_errors,
+    )
+    _bulkheads[name] = bulkhead
+    return bulkhead
+
+def get_bulkhead(name: str):
+    return _bulkheads.get(name)
+
+def bulkhead_stats():
+    return [bulkhead.stats() for bulkhead in _bulkheads.values()]
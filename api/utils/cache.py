@@ -0,0 +1,154 @@
+from collections import OrderedDict
+from functools import partial
+import asyncio
+import os
+import time
+
+class TTLCache:
+    """In-process read-through cache with a TTL per entry and LRU eviction."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._pending = {}
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, value
+            del self._data[key]
+        self.misses += 1
+        return False, None
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+        # A load that started before the write must not repopulate the entry
+        self._pending.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+        self._pending.clear()
+
+    async def get_or_load(self, key, loader):
+        found, value = self.get(key)
+        if found:
+            return value
+
+        # Concurrent misses for the same key share a single backend read
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(loader())
+            self._pending[key] = pending
+            pending.add_done_callback(lambda future: self._store(key, future))
+        return await asyncio.shield(pending)
+
+    async def get_or_load_many(self, keys, loader):
+        """get_or_load for many keys: all misses are read by one
+        `loader(missing)` call returning {key: value}. Keys it leaves out are
+        misses (None); exception values fail only their own key and are
+        returned as they are."""
+        values = {}
+        waiting = {}
+        missing = []
+        for key in keys:
+            found, value = self.get(key)
+            if found:
+                values[key] = value
+            elif key in self._pending:
+                waiting[key] = self._pending[key]
+            else:
+                missing.append(key)
+
+        if missing:
+            # Registered like single loads, so get_or_load callers and
+            # invalidate() see these keys as in flight
+            loop = asyncio.get_running_loop()
+            futures = {}
+            for key in missing:
+                future = futures[key] = self._pending[key] = loop.create_future()
+                future.add_done_callback(partial(self._store, key))
+            batch = asyncio.ensure_future(loader(missing))
+            batch.add_done_callback(partial(_settle, futures))
+            waiting.update(futures)
+
+        for key, future in waiting.items():
+            try:
+                values[key] = await asyncio.shield(future)
+            except Exception as e:
+                values[key] = e
+        return values
+
+    def _store(self, key, future):
+        if self._pending.get(key) is not future:
+            return
+        del self._pending[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        # Misses are not cached so a freshly created entity is visible at once
+        if future.result() is not None:
+            self.set(key, future.result())
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+def _settle(futures, batch):
+    if batch.cancelled():
+        for future in futures.values():
+            future.cancel()
+        return
+    error = batch.exception()
+    loaded = {} if error is not None else batch.result()
+    for key, future in futures.items():
+        if future.done():
+            continue
+        value = error if error is not None else loaded.get(key)
+        if isinstance(value, BaseException):
+            future.set_exception(value)
+        else:
+            future.set_result(value)
+
+_caches = {}
+
+def create_cache(name: str, maxsize: int, ttl: float) -> TTLCache:
+    env_name = name.upper()
+    cache = TTLCache(
+        name,
+        maxsize=int(os.getenv(f"CACHE_{env_name}_SIZE", maxsize)),
+        ttl=float(os.getenv(f"CACHE_{env_name}_TTL", ttl))
+    )
+    _caches[name] = cache
+    return cache
+
+def cache_stats():
+    return [cache.stats() for cache in _caches.values()]
+
+aircraft_cache = create_cache("aircrafts", maxsize=1_000, ttl=300)
+passenger_cache = create_cache("passengers", maxsize=50_000, ttl=60)
+passenger_name_cache = create_cache("passenger_names", maxsize=100_000, ttl=600)
+ticket_cache = create_cache("tickets", maxsize=50_000, ttl=30)
@@ -0,0 +1,44 @@
+from dataclasses import dataclass
+from typing import Any, Awaitable
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger("fanout")
+
+BACKEND_TIMEOUTS = {
+    "mongo": float(os.getenv("MONGO_LOOKUP_TIMEOUT", "2")),
+    "cassandra": float(os.getenv("CASSANDRA_LOOKUP_TIMEOUT", "2")),
+    "neo4j": float(os.getenv("NEO4J_LOOKUP_TIMEOUT", "2")),
+}
+
+@dataclass
+class Lookup:
+    awaitable: Awaitable
+    backend: str
+    default: Any = None
+    required: bool = False
+    timeout: float = None
+
+async def _run(name: str, lookup: Lookup):
+    timeout = lookup.timeout or BACKEND_TIMEOUTS[lookup.backend]
+    try:
+        return await asyncio.wait_for(lookup.awaitable, timeout)
+    except Exception as e:
+        if lookup.required:
+            raise
+        logger.warning(f"Lookup '{name}' on {lookup.backend} failed, using fallback: {e!r}")
+        return lookup.default
+
+# Runs independent lookups concurrently; optional ones degrade to their
+# default on error or timeout, required ones propagate the failure.
+async def fan_out(**lookups: Lookup) -> dict:
+    names = list(lookups)
+    tasks = [asyncio.ensure_future(_run(name, lookups[name])) for name in names]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    return dict(zip(names, results))
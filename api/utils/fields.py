@@ -0,0 +1,30 @@
+from fastapi import HTTPException, Query
+
+# ?fields=a,b,c limits a read to the listed attributes. The selection is
+# passed down to the store (Mongo projection, CQL column list, Cypher
+# RETURN), so unrequested data is never read or sent. The entity key is
+# always included so clients can match and page through results.
+
+def fields_query():
+    return Query(None, description="Поля ответа через запятую, например passenger_id,full_name")
+
+def parse_fields(fields: str, allowed, key=()):
+    if fields is None:
+        return None
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    # Key first, then the requested fields in declaration order
+    selected = set(requested) | set(key)
+    return tuple(key) + tuple(
+        name for name in allowed if name in selected and name not in key
+    )
+
+def pick(doc, fields):
+    if fields is None:
+        return doc
+    return {name: doc[name] for name in fields if name in doc}
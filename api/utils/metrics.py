@@ -0,0 +1,312 @@
+from contextvars import ContextVar
+from utils.bulkhead import BackendSaturated, get_bulkhead, bulkhead_stats
+import bisect
+import os
+import time
+
+# Per-query latency, rows returned and errors for every backend call, tagged
+# by backend, route template and operation (e.g. "find passengers",
+# "SELECT tickets_by_flight", "MATCH Passenger"). Rendered in Prometheus
+# text format by GET /metrics; per-request totals go out in Server-Timing.
+
+BACKENDS = ("mongo", "cassandra", "neo4j")
+BUCKETS = tuple(
+    float(bound) for bound in
+    os.getenv("METRICS_BUCKETS", "0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10").split(",")
+)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") != "0"
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # "le" is inclusive, so the first bound >= value takes the sample
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+_query_seconds = {}
+_query_rows = {}
+_query_errors = {}
+_request_seconds = {}
+_inflight = dict.fromkeys(BACKENDS, 0)
+_pools = {}
+_gauges = {}
+_counters = {}
+
+class RequestTiming:
+    """Backend time spent on behalf of one HTTP request."""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.started = time.perf_counter()
+        self.backends = {}
+        self._route = None
+
+    @property
+    def route(self):
+        if self._route is not None:
+            return self._route
+        route = self.scope.get("route")
+        if route is None:
+            return "unmatched"
+        # Routes of included routers may carry only their own part of the
+        # path, so the prefix is taken from the request path itself
+        template = route.path.strip("/").split("/")
+        segments = self.scope["path"].strip("/").split("/")
+        prefix = segments[:max(0, len(segments) - len(template))]
+        self._route = "/" + "/".join(prefix + template)
+        return self._route
+
+    def add(self, backend, seconds):
+        total, count = self.backends.get(backend, (0.0, 0))
+        self.backends[backend] = (total + seconds, count + 1)
+
+    def header(self):
+        entries = [
+            f'{backend};dur={total * 1000:.2f};desc="{count} queries"'
+            for backend, (total, count) in self.backends.items()
+        ]
+        entries.append(f"app;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+_request = ContextVar("metrics_request", default=None)
+_task_route = ContextVar("metrics_task_route", default="background")
+
+# Background workers tag their queries with a name instead of a route
+def set_task_route(name: str):
+    _task_route.set(f"task:{name}")
+
+class Query:
+    """One backend query. Only time spent awaiting the backend is counted,
+    so streamed cursors are not charged for the consumer's work. The first
+    wait goes through the backend's bulkhead, which may queue or reject it."""
+
+    __slots__ = ("backend", "operation", "timing", "task_route", "elapsed", "rows", "finished",
+                 "bulkhead", "admitted", "holding", "admitted_at")
+
+    def __init__(self, backend: str, operation: str):
+        self.backend = backend
+        self.operation = operation
+        self.timing = _request.get()
+        # Captured now: an abandoned cursor may be finished from another context
+        self.task_route = _task_route.get()
+        self.elapsed = 0.0
+        self.rows = 0
+        self.finished = False
+        self.bulkhead = get_bulkhead(backend)
+        self.admitted = False
+        self.holding = False
+        self.admitted_at = None
+
+    async def admit(self):
+        """Takes a bulkhead slot; call before anything is sent to the backend."""
+        if self.admitted:
+            return
+        if self.bulkhead is not None:
+            try:
+                await self.bulkhead.acquire()
+            except BackendSaturated as e:
+                self.finish(e)
+                raise
+        self.admitted = True
+        self.holding = True
+        self.admitted_at = time.perf_counter()
+
+    async def wait(self, start):
+        """Awaits `start()`, which sends the request or fetches the next
+        page; it is only called once the query has been admitted."""
+        await self.admit()
+        bulkhead = self.bulkhead
+        holding = self.holding
+        self.holding = False
+        if bulkhead is not None and not holding:
+            bulkhead.enter()
+
+        _inflight[self.backend] += 1
+        started = time.perf_counter()
+        error = None
+        try:
+            return await start()
+        except StopAsyncIteration:
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            now = time.perf_counter()
+            self.elapsed += now - started
+            _inflight[self.backend] -= 1
+            if bulkhead is not None:
+                # The admitting round trip is the limiter's latency sample
+                if holding:
+                    bulkhead.release(now - self.admitted_at, error)
+                else:
+                    bulkhead.release(error=error)
+            if error is not None:
+                self.finish(error)
+
+    def finish(self, error=None):
+        if self.finished:
+            return
+        self.finished = True
+        route = self.timing.route if self.timing else self.task_route
+        key = (self.backend, route, self.operation)
+        histogram = _query_seconds.get(key)
+        if histogram is None:
+            histogram = _query_seconds[key] = Histogram()
+        histogram.observe(self.elapsed)
+        _query_rows[key] = _query_rows.get(key, 0) + self.rows
+        if error is not None:
+            _query_errors[key] = _query_errors.get(key, 0) + 1
+        if self.timing:
+            self.timing.add(self.backend, self.elapsed)
+
+async def timed(backend: str, operation: str, start, rows=None):
+    """Runs a single-shot backend call and records it; `rows` maps the
+    result to the number of rows it returned."""
+    query = Query(backend, operation)
+    result = await query.wait(start)
+    query.rows = rows(result) if rows else 0
+    query.finish()
+    return result
+
+def register_pool(backend: str, max_size):
+    """`max_size` is a callable so the size is read from the live client."""
+    _pools[backend] = max_size
+
+def register_gauge(name: str, help: str, collect):
+    """`collect` returns (labels, value) pairs when /metrics is scraped."""
+    _gauges.setdefault(name, (help, []))[1].append(collect)
+
+def register_counter(name: str, help: str, collect):
+    """Like register_gauge, for values that only grow since start."""
+    _counters.setdefault(name, (help, []))[1].append(collect)
+
+class MetricsMiddleware:
+    """Times requests and adds the Server-Timing header. Plain ASGI rather
+    than BaseHTTPMiddleware so streamed bodies are timed to the last chunk."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timing = RequestTiming(scope)
+        token = _request.set(timing)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timing.header().encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request.reset(token)
+            key = (scope["method"], timing.route, str(status))
+            histogram = _request_seconds.get(key)
+            if histogram is None:
+                histogram = _request_seconds[key] = Histogram()
+            histogram.observe(time.perf_counter() - timing.started)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+def _histogram_lines(name, help, histograms, names):
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for values, histogram in sorted(histograms.items()):
+        labels = _labels(names, values)
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+def _counter_lines(name, help, counters, names):
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+    lines.extend(f"{name}{{{_labels(names, values)}}} {count}" for values, count in sorted(counters.items()))
+    return lines
+
+def _gauge_lines(name, help, samples, kind="gauge"):
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        labels = _labels(labels.keys(), labels.values())
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return lines
+
+def render() -> str:
+    query_labels = ("backend", "route", "operation")
+    lines = []
+    lines += _histogram_lines(
+        "http_request_duration_seconds", "HTTP request latency.",
+        _request_seconds, ("method", "route", "status")
+    )
+    lines += _histogram_lines("db_query_duration_seconds", "Backend query latency.", _query_seconds, query_labels)
+    lines += _counter_lines("db_query_rows_total", "Rows returned by backend queries.", _query_rows, query_labels)
+    lines += _counter_lines("db_query_errors_total", "Failed backend queries.", _query_errors, query_labels)
+    lines += _gauge_lines(
+        "db_inflight_queries", "Backend queries currently awaited.",
+        [({"backend": backend}, count) for backend, count in _inflight.items()]
+    )
+
+    sizes = {backend: max_size() for backend, max_size in _pools.items()}
+    lines += _gauge_lines(
+        "db_pool_max_size", "Configured connection pool size.",
+        [({"backend": backend}, size) for backend, size in sizes.items()]
+    )
+    lines += _gauge_lines(
+        "db_pool_saturation", "In-flight queries divided by pool size.",
+        [({"backend": backend}, round(_inflight[backend] / size, 4)) for backend, size in sizes.items() if size]
+    )
+    bulkheads = bulkhead_stats()
+    lines += _gauge_lines(
+        "bulkhead_limit", "Current adaptive concurrency limit.",
+        [({"backend": state["name"]}, state["limit"]) for state in bulkheads]
+    )
+    lines += _gauge_lines(
+        "bulkhead_inflight", "Queries holding a bulkhead slot.",
+        [({"backend": state["name"]}, state["inflight"]) for state in bulkheads]
+    )
+    lines += _gauge_lines(
+        "bulkhead_queued", "Queries waiting for a bulkhead slot.",
+        [({"backend": state["name"]}, state["queued"]) for state in bulkheads]
+    )
+    lines += _gauge_lines(
+        "bulkhead_latency_seconds", "Latency averages the limit adapts to.",
+        [
+            ({"backend": state["name"], "window": window}, state[f"{window}_rtt"] or 0)
+            for state in bulkheads for window in ("short", "long")
+        ]
+    )
+    lines += _counter_lines(
+        "bulkhead_rejected_total", "Queries rejected with 503.",
+        {(state["name"], reason): count for state in bulkheads for reason, count in state["rejected"].items()},
+        ("backend", "reason")
+    )
+    lines += _counter_lines(
+        "bulkhead_overloads_total", "Backend timeouts and unavailability errors.",
+        {(state["name"],): state["overloads"] for state in bulkheads}, ("backend",)
+    )
+    for name, (help, collectors) in _gauges.items():
+        lines += _gauge_lines(name, help, [sample for collect in collectors for sample in collect()])
+    for name, (help, collectors) in _counters.items():
+        lines += _gauge_lines(name, help, [sample for collect in collectors for sample in collect()], "counter")
+    return "\n".join(lines) + "\n"
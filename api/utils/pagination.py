@@ -0,0 +1,34 @@
+from fastapi import HTTPException, Response
+import base64
+import json
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Cursors are opaque to clients: base64 of a small JSON document carrying
+# the scope they were issued for, so a token from one query is never
+# replayed against another.
+
+def encode_cursor(scope: str, position) -> str:
+    if isinstance(position, bytes):
+        position = {"paging_state": base64.b64encode(position).decode()}
+    payload = json.dumps({"scope": scope, "position": position}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, scope: str):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["scope"] != scope:
+            raise ValueError("cursor scope mismatch")
+        position = payload["position"]
+        if isinstance(position, dict) and "paging_state" in position:
+            return base64.b64decode(position["paging_state"])
+        return position
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def set_next_cursor(response: Response, cursor: str = None):
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
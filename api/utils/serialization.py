@@ -0,0 +1,70 @@
+from fastapi import Response
+from bson import ObjectId
+from datetime import date, datetime
+from decimal import Decimal
+import json
+import os
+import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Routers listed here answer reads by encoding DB rows straight to JSON
+# bytes, skipping FastAPI's response_model validation/serialization pass.
+FAST_ROUTERS = {
+    name.strip()
+    for name in os.getenv("FAST_SERIALIZATION_ROUTERS", "aircrafts,passengers,tickets").split(",")
+    if name.strip()
+}
+
+def fast_path_enabled(router_name: str) -> bool:
+    return router_name in FAST_ROUTERS
+
+# Types the stores hand back that JSON has no form for. Anything else is a
+# bug in the caller and fails loudly instead of leaking its repr.
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, ObjectId)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(content) -> bytes:
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+def model_fields(model):
+    fields = getattr(model, "model_fields", None) or model.__fields__
+    return tuple(fields)
+
+def project(doc, model):
+    if doc is None:
+        return None
+    return {field: doc[field] for field in model_fields(model) if field in doc}
+
+def mongo_projection(model, fields=None):
+    return {"_id": 0, **{field: 1 for field in fields or model_fields(model)}}
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def respond(content, fast: bool, response: Response = None, status_code: int = 200):
+    if not fast:
+        return content
+    fast_response = FastJSONResponse(content, status_code=status_code)
+    # Carry over headers set on the injected Response (e.g. X-Next-Cursor)
+    if response is not None:
+        for name, value in response.headers.items():
+            if name.lower() != "content-length":
+                fast_response.headers[name] = value
+    return fast_response
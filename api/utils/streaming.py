@@ -0,0 +1,30 @@
+from fastapi.responses import StreamingResponse
+from utils.serialization import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CHUNK_BYTES = 64 * 1024
+
+def encode_line(item) -> bytes:
+    return dumps(item) + b"\n"
+
+async def ndjson_chunks(items):
+    # The first line goes out on its own so clients see data immediately;
+    # after that lines are coalesced into chunks to cut per-send overhead.
+    # Each yield waits for the ASGI server to accept the chunk, so a slow
+    # client pauses the database cursor instead of growing a buffer.
+    buffer = bytearray()
+    first = True
+    async for item in items:
+        buffer += encode_line(item)
+        if first or len(buffer) >= CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+            first = False
+    if buffer:
+        yield bytes(buffer)
+
+def ndjson_response(items, filename: str = None) -> StreamingResponse:
+    headers = {}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(ndjson_chunks(items), media_type=NDJSON_MEDIA_TYPE, headers=headers)
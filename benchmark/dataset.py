@@ -0,0 +1,122 @@
+"""Deterministic seed data written straight into the in-memory doubles."""
+from datetime import datetime, timedelta
+from decimal import Decimal
+import random
+import uuid
+
+AIRPORT_CODES = ["SVO", "JFK", "LAX", "LED", "IST", "DXB", "HND", "LHR", "CDG", "FRA"]
+AIRLINES = [("SU", "Aeroflot"), ("DL", "Delta Airlines"), ("AA", "American Airlines"), ("TK", "Turkish Airlines")]
+COUNTRIES = ["RU", "US", "TR", "DE", "FR", "JP", "GB", "AE"]
+CLASSES = ["economy", "business", "first"]
+SEAT_LETTERS = "ABCDEF"
+
+def seat_label(index):
+    row, letter = divmod(index, len(SEAT_LETTERS))
+    return f"{row + 1}{SEAT_LETTERS[letter]}"
+
+def seed(mongo, cassandra, neo4j, passengers=5_000, flights=500, tickets_per_flight=20, seed=42):
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1)
+
+    airports = [
+        {"code": code, "name": f"{code} International Airport", "city": code.title(), "country": rng.choice(COUNTRIES)}
+        for code in AIRPORT_CODES
+    ]
+    mongo["airports"].load([dict(airport) for airport in airports])
+    for airport in airports:
+        neo4j.graph.airports[airport["code"]] = airport
+
+    aircrafts = [
+        {
+            "reg_number": f"RA-{index:05d}",
+            "model": "Airbus A320",
+            "manufacturer": "Airbus",
+            "capacity": rng.randint(100, 400),
+            "last_maintenance": now - timedelta(days=rng.randint(1, 365)),
+            "status": rng.choice(["active", "maintenance", "storage"])
+        }
+        for index in range(50)
+    ]
+    mongo["aircrafts"].load(aircrafts)
+
+    profiles = [
+        {
+            "passenger_id": f"pas_{index:08x}",
+            "full_name": f"Passenger {index}",
+            "passport": f"{index:09d}",
+            "nationality": rng.choice(COUNTRIES),
+            "contact": {"email": f"passenger{index}@example.com", "phone": f"+1555{index:07d}"},
+            "tickets": []
+        }
+        for index in range(passengers)
+    ]
+    for profile in profiles:
+        neo4j.graph.passengers[profile["passenger_id"]] = {
+            "passenger_id": profile["passenger_id"],
+            "full_name": profile["full_name"],
+            "nationality": profile["nationality"]
+        }
+
+    spend = {}
+    ticket_rows = []
+    status_rows = []
+    baggage_rows = []
+    for index in range(flights):
+        code, name = rng.choice(AIRLINES)
+        departure, arrival = rng.sample(AIRPORT_CODES, 2)
+        departure_time = now + timedelta(hours=rng.randint(0, 24 * 30))
+        flight = {
+            "flight_id": f"{code}-{1000 + index}",
+            "airline_code": code,
+            "airline_name": name,
+            "status": "scheduled",
+            "departure_gate": f"A{rng.randint(1, 40):02d}",
+            "departure_time": departure_time,
+            "arrival_time": departure_time + timedelta(hours=rng.randint(1, 12)),
+            "departure_airport": departure,
+            "arrival_airport": arrival
+        }
+        neo4j.graph.flights[flight["flight_id"]] = flight
+        status_rows.append({
+            "flight_id": flight["flight_id"], "status": "scheduled", "last_update": now,
+            "departure_airport": departure, "arrival_airport": arrival
+        })
+
+        booked = rng.sample(range(passengers), min(tickets_per_flight, passengers))
+        # Distinct seats within the grid of the flight's aircraft
+        capacity = aircrafts[index % len(aircrafts)]["capacity"]
+        seats = map(seat_label, rng.sample(range(capacity), min(len(booked), capacity)))
+        for passenger_index, seat in zip(booked, seats):
+            row = {
+                "ticket_id": f"tkt_{index:05d}{passenger_index:08x}",
+                "passenger_id": profiles[passenger_index]["passenger_id"],
+                "flight_id": flight["flight_id"],
+                "seat": seat,
+                "class_place": rng.choice(CLASSES),
+                "price": Decimal(f"{rng.uniform(50, 2000):.2f}"),
+                "booking_date": departure_time - timedelta(days=rng.randint(1, 60))
+            }
+            ticket_rows.append(row)
+            baggage_rows.append({
+                "baggage_id": uuid.UUID(int=rng.getrandbits(128)), "ticket_id": row["ticket_id"],
+                "flight_id": row["flight_id"], "weight": round(rng.uniform(5, 32), 1),
+                "status": "checked_in", "last_updated": now
+            })
+            spend[row["passenger_id"]] = spend.get(row["passenger_id"], 0) + int(row["price"] * 100)
+            neo4j.graph.add_booking({**row, "price": float(row["price"])})
+
+    mongo["passengers"].load(profiles)
+    # Flight documents link each flight to its aircraft, which sizes its seat map
+    mongo["flights"].load([
+        {"flight_id": flight_id, "aircraft": aircrafts[index % len(aircrafts)]["reg_number"]}
+        for index, flight_id in enumerate(neo4j.graph.flights)
+    ])
+    for table in ("tickets", "tickets_by_passenger", "tickets_by_flight"):
+        cassandra.load(table, ticket_rows)
+    cassandra.load("flight_status", status_rows)
+    cassandra.load("flight_seats", ticket_rows)
+    cassandra.load("baggage", baggage_rows)
+    cassandra.load("baggage_by_flight", baggage_rows)
+    cassandra.load("passenger_spend", [
+        {"passenger_id": passenger_id, "total_cents": cents} for passenger_id, cents in spend.items()
+    ])
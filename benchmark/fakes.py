@@ -0,0 +1,869 @@
+"""In-memory doubles for the Mongo database, the Cassandra session and the
+Neo4j driver, with injected latency.
+
+They implement only what the API uses: the Mongo query/update operators
+found in the routers, the fixed set of CQL statements from db.statements,
+and the Cypher query shapes issued by the routers and services.
+"""
+from bson import ObjectId
+from cassandra.query import BatchStatement, PreparedStatement
+from pymongo.errors import DuplicateKeyError
+from collections import namedtuple
+from copy import deepcopy
+import asyncio
+import random
+import re
+
+class Latency:
+    """Delay per backend call: a fixed part plus uniform jitter, in ms."""
+
+    def __init__(self, base_ms=0.0, jitter_ms=0.0):
+        self.base_ms = base_ms
+        self.jitter_ms = jitter_ms
+
+    def seconds(self):
+        return (self.base_ms + random.uniform(0, self.jitter_ms)) / 1000
+
+    async def wait(self):
+        delay = self.seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+# MongoDB
+
+def _get_path(doc, path):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+_MISSING = object()
+
+def _compare(value, operator, operand):
+    if operator == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if operator == "$ne":
+        return value != operand
+    if value is _MISSING or value is None:
+        return False
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise NotImplementedError(f"Unsupported query operator {operator}")
+
+def matches(doc, query):
+    for path, condition in query.items():
+        if path == "$or":
+            if not any(matches(doc, branch) for branch in condition):
+                return False
+            continue
+        if ".0" in path:
+            # {"array.0": {"$exists": true}} – array is non-empty
+            value = _get_path(doc, path.replace(".0", ""))
+            present = isinstance(value, list) and len(value) > 0
+            if present != bool(condition.get("$exists", True)):
+                return False
+            continue
+        value = _get_path(doc, path)
+        if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+            if not all(_compare(value, operator, operand) for operator, operand in condition.items()):
+                return False
+        elif value is _MISSING or value != condition:
+            return False
+    return True
+
+def project(doc, projection):
+    if not projection:
+        return deepcopy(doc)
+    include_id = projection.get("_id", 1)
+    fields = {key: flag for key, flag in projection.items() if key != "_id"}
+    if fields and any(fields.values()):
+        result = {}
+        for path in fields:
+            value = _get_path(doc, path)
+            if value is _MISSING:
+                continue
+            target = result
+            parts = path.split(".")
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = deepcopy(value)
+    else:
+        result = {key: deepcopy(value) for key, value in doc.items() if key not in fields}
+    if include_id and "_id" in doc:
+        result["_id"] = doc["_id"]
+    else:
+        result.pop("_id", None)
+    return result
+
+def _apply_update(doc, update):
+    for operator, values in update.items():
+        for path, value in values.items():
+            parts = path.split(".")
+            target = doc
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            if operator == "$set":
+                target[parts[-1]] = deepcopy(value)
+            elif operator == "$inc":
+                target[parts[-1]] = target.get(parts[-1], 0) + value
+            else:
+                raise NotImplementedError(f"Unsupported update operator {operator}")
+
+def _upsert_base(query):
+    return {
+        key: value for key, value in query.items()
+        if not key.startswith("$") and not isinstance(value, dict)
+    }
+
+class FakeCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = []
+        self._limit = 0
+        self._items = None
+
+    def sort(self, key, direction=1):
+        self._sort = key if isinstance(key, list) else [(key, direction)]
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def _materialize(self):
+        docs = self._collection._select(self._query)
+        for key, direction in reversed(self._sort):
+            docs.sort(key=lambda doc: _get_path(doc, key), reverse=direction < 0)
+        if self._limit:
+            docs = docs[:self._limit]
+        return [project(doc, self._projection) for doc in docs]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._items is None:
+            await self._collection.latency.wait()
+            self._items = iter(self._materialize())
+        try:
+            return next(self._items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        await self._collection.latency.wait()
+        items = self._materialize()
+        return items[:length] if length else items
+
+class FakeResult:
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+class FakeCollection:
+    def __init__(self, name, latency, indexed=()):
+        self.name = name
+        self.latency = latency
+        self._docs = {}
+        # Equality lookups on these fields avoid a full scan
+        self._indexes = {field: {} for field in indexed}
+
+    # Storage
+
+    def _index(self, doc):
+        for field, index in self._indexes.items():
+            value = doc.get(field)
+            if value is not None:
+                index.setdefault(value, set()).add(doc["_id"])
+
+    def _unindex(self, doc):
+        for field, index in self._indexes.items():
+            ids = index.get(doc.get(field))
+            if ids:
+                ids.discard(doc["_id"])
+
+    def _select(self, query):
+        for field, index in self._indexes.items():
+            value = query.get(field)
+            if value is not None and not isinstance(value, dict):
+                candidates = (self._docs[_id] for _id in index.get(value, ()))
+                break
+            # {"$in": [...]} is a set of index lookups too
+            if isinstance(value, dict) and list(value) == ["$in"]:
+                ids = set().union(*(index.get(item, ()) for item in value["$in"]))
+                candidates = (self._docs[_id] for _id in ids)
+                break
+        else:
+            candidates = self._docs.values()
+        return [doc for doc in candidates if matches(doc, query)]
+
+    def _first(self, query, sort=None):
+        docs = self._select(query)
+        for key, direction in reversed(sort or []):
+            docs.sort(key=lambda doc: _get_path(doc, key), reverse=direction < 0)
+        return docs[0] if docs else None
+
+    def load(self, documents):
+        """Bulk seeding without latency."""
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            self._docs[document["_id"]] = document
+            self._index(document)
+
+    def _insert(self, document):
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}", 11000)
+        stored = deepcopy(document)
+        self._docs[stored["_id"]] = stored
+        self._index(stored)
+        return stored["_id"]
+
+    def _update(self, doc, update):
+        self._unindex(doc)
+        _apply_update(doc, update)
+        self._index(doc)
+
+    def _delete(self, doc):
+        self._unindex(doc)
+        del self._docs[doc["_id"]]
+
+    # Motor API
+
+    def find(self, query=None, projection=None, **kwargs):
+        return FakeCursor(self, query, projection)
+
+    async def find_one(self, query=None, projection=None, sort=None, session=None):
+        await self.latency.wait()
+        doc = self._first(query or {}, sort)
+        return project(doc, projection) if doc else None
+
+    async def insert_one(self, document, session=None):
+        await self.latency.wait()
+        return FakeResult(inserted_id=self._insert(document))
+
+    async def insert_many(self, documents, ordered=True, session=None):
+        await self.latency.wait()
+        return FakeResult(inserted_ids=[self._insert(document) for document in documents])
+
+    async def update_one(self, query, update, upsert=False, session=None):
+        await self.latency.wait()
+        doc = self._first(query)
+        if doc is None:
+            if not upsert:
+                return FakeResult(matched_count=0, modified_count=0, upserted_id=None)
+            doc = _upsert_base(query)
+            _apply_update(doc, update)
+            return FakeResult(matched_count=0, modified_count=0, upserted_id=self._insert(doc))
+        self._update(doc, update)
+        return FakeResult(matched_count=1, modified_count=1, upserted_id=None)
+
+    async def update_many(self, query, update, session=None):
+        await self.latency.wait()
+        docs = self._select(query)
+        for doc in docs:
+            self._update(doc, update)
+        return FakeResult(matched_count=len(docs), modified_count=len(docs))
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=False, upsert=False, session=None):
+        await self.latency.wait()
+        doc = self._first(query)
+        if doc is None:
+            if not upsert:
+                return None
+            doc = _upsert_base(query)
+            _apply_update(doc, update)
+            self._insert(doc)
+            return project(doc, projection) if return_document else None
+        before = project(doc, projection)
+        self._update(doc, update)
+        # ReturnDocument.AFTER is True
+        return project(doc, projection) if return_document else before
+
+    async def find_one_and_delete(self, query, projection=None, session=None):
+        await self.latency.wait()
+        doc = self._first(query)
+        if doc is None:
+            return None
+        self._delete(doc)
+        return project(doc, projection)
+
+    async def delete_one(self, query, session=None):
+        await self.latency.wait()
+        doc = self._first(query)
+        if doc is not None:
+            self._delete(doc)
+        return FakeResult(deleted_count=int(doc is not None))
+
+    async def delete_many(self, query, session=None):
+        await self.latency.wait()
+        docs = self._select(query)
+        for doc in docs:
+            self._delete(doc)
+        return FakeResult(deleted_count=len(docs))
+
+    async def bulk_write(self, operations, ordered=True):
+        await self.latency.wait()
+        for operation in operations:
+            kind = type(operation).__name__
+            query = operation._filter
+            if kind == "UpdateOne":
+                doc = self._first(query)
+                if doc is not None:
+                    self._update(doc, operation._doc)
+                elif operation._upsert:
+                    doc = _upsert_base(query)
+                    _apply_update(doc, operation._doc)
+                    self._insert(doc)
+            elif kind == "ReplaceOne":
+                doc = self._first(query)
+                replacement = {**_upsert_base(query), **deepcopy(operation._doc)}
+                if doc is not None:
+                    self._delete(doc)
+                    replacement["_id"] = doc["_id"]
+                if doc is not None or operation._upsert:
+                    self._insert(replacement)
+            elif kind in ("DeleteMany", "DeleteOne"):
+                docs = self._select(query)
+                for doc in docs[:1] if kind == "DeleteOne" else docs:
+                    self._delete(doc)
+            else:
+                raise NotImplementedError(f"Unsupported bulk operation {kind}")
+        return FakeResult(acknowledged=True)
+
+    async def count_documents(self, query):
+        await self.latency.wait()
+        return len(self._select(query))
+
+    async def estimated_document_count(self):
+        await self.latency.wait()
+        return len(self._docs)
+
+    async def create_index(self, keys, **kwargs):
+        return keys if isinstance(keys, str) else "_".join(f"{key}_{direction}" for key, direction in keys)
+
+    def aggregate(self, pipeline, **kwargs):
+        # Only the single $group stage used for nationality stats
+        (stage,) = pipeline
+        group = stage["$group"]
+        field = group["_id"].lstrip("$")
+        counts = {}
+        for doc in self._docs.values():
+            key = _get_path(doc, field)
+            key = None if key is _MISSING else key
+            counts[key] = counts.get(key, 0) + 1
+        collection = FakeCollection("aggregate", self.latency)
+        collection.load([{"_id": key, "count": count} for key, count in counts.items()])
+        return FakeCursor(collection, {}, None)
+
+class FakeMongoSession:
+    """Transactions without isolation or rollback: the callback just runs."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def with_transaction(self, callback):
+        return await callback(self)
+
+class FakeMongoClient:
+    async def start_session(self):
+        return FakeMongoSession()
+
+class FakeMongoDatabase:
+    INDEXED = {
+        "passengers": ("passenger_id",),
+        "aircrafts": ("reg_number",),
+        "flights": ("flight_id",),
+        "airports": ("code",),
+    }
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.client = FakeMongoClient()
+        self._collections = {}
+
+    def __getitem__(self, name):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = FakeCollection(
+                name, self.latency, self.INDEXED.get(name, ())
+            )
+        return collection
+
+    async def command(self, name):
+        # Answers like a replica set primary, since sessions support transactions
+        if name != "hello":
+            raise NotImplementedError(name)
+        return {"isWritablePrimary": True, "setName": "fake"}
+
+# Cassandra
+
+# Partition key, clustering columns (descending ones marked) and all columns
+CASSANDRA_TABLES = {
+    "tickets": (("ticket_id",), (), (
+        "ticket_id", "passenger_id", "flight_id", "seat", "class_place", "price", "booking_date"
+    )),
+    "tickets_by_passenger": (("passenger_id",), ("-booking_date", "ticket_id"), (
+        "passenger_id", "booking_date", "ticket_id", "flight_id", "seat", "class_place", "price"
+    )),
+    "tickets_by_flight": (("flight_id",), ("booking_date", "ticket_id"), (
+        "flight_id", "booking_date", "ticket_id", "passenger_id", "seat", "class_place", "price"
+    )),
+    "passenger_spend": (("passenger_id",), (), ("passenger_id", "total_cents")),
+    "flight_status": (("flight_id",), (), (
+        "flight_id", "status", "last_update", "departure_airport", "arrival_airport"
+    )),
+    "baggage": (("baggage_id",), (), ("baggage_id", "ticket_id", "weight", "status", "last_updated")),
+    "flight_seats": (("flight_id",), ("seat",), ("flight_id", "seat", "ticket_id")),
+    "baggage_by_flight": (("flight_id",), ("ticket_id", "baggage_id"), (
+        "flight_id", "ticket_id", "baggage_id", "weight", "status"
+    )),
+}
+
+_ROW_TYPES = {}
+
+def _row_type(columns):
+    row_type = _ROW_TYPES.get(columns)
+    if row_type is None:
+        row_type = _ROW_TYPES[columns] = namedtuple("Row", columns)
+    return row_type
+
+def _normalize(query):
+    return " ".join(query.split())
+
+def _conditions(clause):
+    if not clause:
+        return []
+    return [part.split("=")[0].strip() for part in re.split(r"\s+AND\s+", clause, flags=re.I)]
+
+class CQLStatement:
+    """A parsed statement; `params` are bound positionally to `?` markers."""
+
+    INSERT = re.compile(r"INSERT INTO (\w+) \(([^)]*)\) VALUES \(([^)]*)\)( IF NOT EXISTS)?$", re.I)
+    SELECT = re.compile(r"SELECT (.+?) FROM (\w+)(?: WHERE (.+?))?( ALLOW FILTERING)?$", re.I)
+    DELETE = re.compile(r"DELETE FROM (\w+) WHERE (.+?)(?: IF (EXISTS|.+))?$", re.I)
+    UPDATE = re.compile(r"UPDATE (\w+) SET (.+?) WHERE (.+?)(?: IF (.+))?$", re.I)
+
+    def __init__(self, query):
+        self.query = _normalize(query)
+        for kind in ("INSERT", "SELECT", "DELETE", "UPDATE"):
+            match = getattr(self, kind).match(self.query)
+            if match:
+                self.kind = kind
+                getattr(self, f"_parse_{kind.lower()}")(match)
+                return
+        raise NotImplementedError(f"Unsupported CQL: {self.query}")
+
+    def _parse_insert(self, match):
+        self.table = match.group(1)
+        self.columns = [column.strip() for column in match.group(2).split(",")]
+        self.if_not_exists = bool(match.group(4))
+
+    def _parse_select(self, match):
+        columns = match.group(1).strip()
+        self.table = match.group(2)
+        self.columns = None if columns == "*" else [column.strip() for column in columns.split(",")]
+        self.where = _conditions(match.group(3))
+
+    def _parse_delete(self, match):
+        self.table = match.group(1)
+        self.where = _conditions(match.group(2))
+        self.if_exists = (match.group(3) or "").upper() == "EXISTS"
+        self.condition = _conditions(match.group(3)) if match.group(3) and not self.if_exists else []
+
+    def _parse_update(self, match):
+        self.table = match.group(1)
+        self.assignments = []
+        for assignment in match.group(2).split(","):
+            column, expression = (part.strip() for part in assignment.split("=", 1))
+            self.assignments.append((column, "+" in expression))
+        self.where = _conditions(match.group(3))
+        self.condition = _conditions(match.group(4)) if match.group(4) else []
+
+class FakePreparedStatement(PreparedStatement):
+    # Subclassed so BatchStatement.add() accepts it; binding keeps raw values
+    def __init__(self, statement, query_id):
+        self.statement = statement
+        self.query_string = statement.query
+        self.query_id = query_id
+        self.keyspace = None
+        self.routing_key_indexes = None
+        self.custom_payload = None
+        self.fetch_size = None
+        self.is_idempotent = False
+
+    def bind(self, values):
+        return FakeBoundStatement(self, list(values or ()))
+
+class FakeBoundStatement:
+    def __init__(self, prepared_statement, values):
+        self.prepared_statement = prepared_statement
+        self.values = values
+        self.fetch_size = None
+        self.keyspace = None
+        self.routing_key = None
+        self.custom_payload = None
+        self.is_idempotent = False
+
+class FakeResponseFuture:
+    # Read by cassandra.cluster.ResultSet
+    _col_names = None
+    _col_types = None
+
+    def __init__(self, rows, fetch_size, offset, latency, error=None):
+        self._rows = rows
+        self._fetch_size = fetch_size or 5000
+        self._offset = offset
+        self._latency = latency
+        self._error = error
+        self._loop = asyncio.get_running_loop()
+
+    @property
+    def has_more_pages(self):
+        return self._offset + self._fetch_size < len(self._rows)
+
+    @property
+    def _paging_state(self):
+        return str(self._offset + self._fetch_size).encode() if self.has_more_pages else None
+
+    def add_callbacks(self, callback, errback):
+        if self._error is not None:
+            self._loop.call_later(self._latency.seconds(), errback, self._error)
+            return
+        page = self._rows[self._offset:self._offset + self._fetch_size]
+        self._loop.call_later(self._latency.seconds(), callback, page)
+
+    def clear_callbacks(self):
+        pass
+
+    def start_fetching_next_page(self):
+        self._offset += self._fetch_size
+
+class FakeCassandraSession:
+    def __init__(self, latency):
+        self.latency = latency
+        self.tables = {table: {} for table in CASSANDRA_TABLES}
+        self._prepared = {}
+        self._parsed = {}
+
+    def prepare(self, query):
+        statement = self._parse(query)
+        query_id = str(len(self._prepared)).encode()
+        prepared = self._prepared[query_id] = FakePreparedStatement(statement, query_id)
+        return prepared
+
+    def _parse(self, query):
+        statement = self._parsed.get(query)
+        if statement is None:
+            statement = self._parsed[query] = CQLStatement(query)
+        return statement
+
+    # Storage
+
+    def _key(self, table, values):
+        partition, clustering, _ = CASSANDRA_TABLES[table]
+        return (
+            tuple(values[column] for column in partition),
+            tuple(values[column.lstrip("-")] for column in clustering)
+        )
+
+    def _rows(self, statement, params):
+        partition_columns, clustering, _ = CASSANDRA_TABLES[statement.table]
+        values = dict(zip(statement.where, params))
+        partitions = self.tables[statement.table]
+        if all(column in values for column in partition_columns):
+            key = tuple(values[column] for column in partition_columns)
+            candidates = [partitions.get(key, {})]
+        else:
+            candidates = partitions.values()
+
+        rows = []
+        for partition in candidates:
+            ordered = list(partition.items())
+            for position in reversed(range(len(clustering))):
+                descending = clustering[position].startswith("-")
+                ordered.sort(key=lambda item: item[0][position], reverse=descending)
+            rows.extend(
+                row for _, row in ordered
+                if all(row.get(column) == value for column, value in values.items())
+            )
+        return rows
+
+    def load(self, table, rows):
+        """Bulk seeding without latency."""
+        partitions = self.tables[table]
+        for row in rows:
+            partition, clustering = self._key(table, row)
+            partitions.setdefault(partition, {})[clustering] = dict(row)
+
+    def _execute(self, statement, params):
+        table = statement.table
+        _, _, all_columns = CASSANDRA_TABLES[table]
+        partitions = self.tables[table]
+
+        if statement.kind == "SELECT":
+            columns = tuple(statement.columns or all_columns)
+            row_type = _row_type(columns)
+            return [
+                row_type(*(row.get(column) for column in columns))
+                for row in self._rows(statement, params)
+            ]
+
+        if statement.kind == "INSERT":
+            values = dict(zip(statement.columns, params))
+            partition, clustering = self._key(table, values)
+            rows = partitions.setdefault(partition, {})
+            if statement.if_not_exists and clustering in rows:
+                existing = rows[clustering]
+                return [_row_type(("applied",) + all_columns)(False, *(existing.get(c) for c in all_columns))]
+            rows[clustering] = values
+            return [_row_type(("applied",))(True)] if statement.if_not_exists else []
+
+        # Markers come in order: SET values, WHERE key, IF condition
+        assigned_count = len(statement.assignments) if statement.kind == "UPDATE" else 0
+        key_end = assigned_count + len(statement.where)
+        key_values = dict(zip(statement.where, params[assigned_count:key_end]))
+        if statement.kind == "DELETE":
+            partition_columns, clustering_columns, _ = CASSANDRA_TABLES[table]
+            partition = tuple(key_values[column] for column in partition_columns)
+            if len(key_values) == len(partition_columns):
+                existed = partition in partitions
+                partitions.pop(partition, None)
+            else:
+                clustering = tuple(key_values[column.lstrip("-")] for column in clustering_columns)
+                existing = partitions.get(partition, {}).get(clustering)
+                existed = existing is not None
+                if statement.condition:
+                    expected = dict(zip(statement.condition, params[key_end:]))
+                    if not existed or any(existing.get(c) != v for c, v in expected.items()):
+                        return [_row_type(("applied",))(False)]
+                partitions.get(partition, {}).pop(clustering, None)
+            return [_row_type(("applied",))(existed)] if statement.if_exists or statement.condition else []
+
+        # UPDATE: an upsert, with `c = c + ?` for counters
+        assigned = params[:assigned_count]
+        partition, clustering = self._key(table, key_values)
+        rows = partitions.setdefault(partition, {})
+        if statement.condition:
+            existing = rows.get(clustering)
+            expected = dict(zip(statement.condition, params[key_end:]))
+            if existing is None or any(existing.get(c) != v for c, v in expected.items()):
+                return [_row_type(("applied",))(False)]
+        row = rows.setdefault(clustering, dict(key_values))
+        for (column, increment), value in zip(statement.assignments, assigned):
+            row[column] = (row.get(column) or 0) + value if increment else value
+        return [_row_type(("applied",))(True)] if statement.condition else []
+
+    def _run(self, statement, parameters):
+        if isinstance(statement, BatchStatement):
+            for is_prepared, query, params in statement._statements_and_parameters:
+                parsed = self._prepared[query].statement if is_prepared else self._parse(query)
+                self._execute(parsed, list(params or ()))
+            return []
+        if isinstance(statement, FakeBoundStatement):
+            return self._execute(statement.prepared_statement.statement, statement.values)
+        if isinstance(statement, FakePreparedStatement):
+            return self._execute(statement.statement, list(parameters or ()))
+        query = statement if isinstance(statement, str) else statement.query_string
+        return self._execute(self._parse(query), list(parameters or ()))
+
+    def execute_async(self, statement, parameters=None, paging_state=None, **kwargs):
+        offset = int(paging_state) if paging_state else 0
+        fetch_size = getattr(statement, "fetch_size", None)
+        if not isinstance(fetch_size, int):
+            # Statements without an explicit size carry the driver's FETCH_SIZE_UNSET
+            fetch_size = None
+        try:
+            rows = self._run(statement, parameters)
+        except Exception as e:
+            return FakeResponseFuture([], fetch_size, 0, self.latency, error=e)
+        return FakeResponseFuture(rows, fetch_size, offset, self.latency)
+
+    def execute(self, statement, parameters=None, **kwargs):
+        return self._run(statement, parameters)
+
+    def shutdown(self):
+        pass
+
+# Neo4j
+
+RETURN_ITEM = re.compile(r"(\w+)\.(\w+) AS (\w+)")
+
+class FakeRecord(dict):
+    def data(self):
+        return dict(self)
+
+class FakeNeo4jResult:
+    def __init__(self, records):
+        self._records = records
+        self._iterator = iter(records)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def single(self):
+        return self._records[0] if self._records else None
+
+    async def data(self):
+        return [record.data() for record in self._records]
+
+    async def consume(self):
+        return None
+
+class FakeGraph:
+    """Airports, flights, passengers and BOOKED_FLIGHT edges."""
+
+    def __init__(self):
+        self.airports = {}
+        self.flights = {}
+        self.passengers = {}
+        self.bookings = {}
+        self.bookings_by_passenger = {}
+
+    def add_booking(self, booking):
+        self.remove_booking(booking["ticket_id"])
+        self.bookings[booking["ticket_id"]] = booking
+        self.bookings_by_passenger.setdefault(booking["passenger_id"], {})[booking["ticket_id"]] = booking
+
+    def remove_booking(self, ticket_id):
+        booking = self.bookings.pop(ticket_id, None)
+        if booking:
+            self.bookings_by_passenger.get(booking["passenger_id"], {}).pop(ticket_id, None)
+
+    def remove_passenger(self, passenger_id):
+        self.passengers.pop(passenger_id, None)
+        for ticket_id in list(self.bookings_by_passenger.pop(passenger_id, {})):
+            self.bookings.pop(ticket_id, None)
+
+    # Query shapes
+
+    def _flight_bindings(self, flight):
+        return {
+            "f": flight,
+            "dep": self.airports.get(flight["departure_airport"], {"code": flight["departure_airport"]}),
+            "arr": self.airports.get(flight["arrival_airport"], {"code": flight["arrival_airport"]})
+        }
+
+    def _write(self, query, params):
+        rows = params.get("rows", ())
+        keys = params.get("keys", ())
+        if "DETACH DELETE p" in query:
+            for key in keys:
+                self.remove_passenger(key)
+        elif "BOOKED_FLIGHT {ticket_id: key}" in query:
+            for key in keys:
+                self.remove_booking(key)
+        elif "MERGE (p)-[r:BOOKED_FLIGHT" in query:
+            for row in rows:
+                if row["flight_id"] in self.flights:
+                    self.passengers.setdefault(row["passenger_id"], {"passenger_id": row["passenger_id"]})
+                    self.add_booking(dict(row))
+        elif "MERGE (p:Passenger" in query:
+            for row in rows:
+                self.passengers[row["passenger_id"]] = dict(row)
+
+    def _bindings(self, query, params):
+        if "(a:Airport)" in query:
+            return [{"a": airport} for airport in self.airports.values()]
+        if "[:BOOKED_FLIGHT]->(f:Flight)" in query:
+            bindings = []
+            for booking in self.bookings_by_passenger.get(params.get("passenger_id"), {}).values():
+                flight = self.flights.get(booking["flight_id"])
+                if flight:
+                    bindings.append({**self._flight_bindings(flight), "r": booking})
+            if "ORDER BY f.departure_time DESC" in query:
+                bindings.sort(key=lambda binding: binding["f"]["departure_time"], reverse=True)
+            return bindings
+        if ":Flight" in query and ("DEPARTS_FROM" in query or "ARRIVES_AT" in query):
+            flight_id = params.get("flight_id")
+            flights = [self.flights[flight_id]] if flight_id in self.flights else (
+                [] if flight_id else list(self.flights.values())
+            )
+            return [self._flight_bindings(flight) for flight in flights]
+        raise NotImplementedError(f"Unsupported Cypher: {' '.join(query.split())}")
+
+    def run(self, query, params):
+        if "UNWIND" in query or "CREATE CONSTRAINT" in query:
+            self._write(query, params)
+            return []
+        items = RETURN_ITEM.findall(query.split("RETURN", 1)[1])
+        return [
+            FakeRecord((alias, bindings[name].get(prop)) for name, prop, alias in items)
+            for bindings in self._bindings(query, params)
+        ]
+
+class FakeNeo4jTransaction:
+    def __init__(self, session):
+        self._session = session
+        self._closed = False
+
+    async def run(self, query, parameters=None, **kwargs):
+        return await self._session.run(query, parameters, **kwargs)
+
+    async def commit(self):
+        self._closed = True
+
+    async def rollback(self):
+        self._closed = True
+
+    async def close(self):
+        self._closed = True
+
+    def closed(self):
+        return self._closed
+
+class FakeNeo4jSession:
+    def __init__(self, driver):
+        self._driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def run(self, query, parameters=None, **kwargs):
+        await self._driver.latency.wait()
+        return FakeNeo4jResult(self._driver.graph.run(query, {**(parameters or {}), **kwargs}))
+
+    async def begin_transaction(self):
+        return FakeNeo4jTransaction(self)
+
+    async def close(self):
+        pass
+
+class FakeNeo4jDriver:
+    def __init__(self, latency):
+        self.latency = latency
+        self.graph = FakeGraph()
+
+    def session(self, **kwargs):
+        return FakeNeo4jSession(self)
+
+    async def close(self):
+        pass
@@ -0,0 +1,194 @@
+"""Drives the FastAPI app in-process and reports requests/sec and latency
+percentiles per scenario and concurrency level.
+
+    python benchmark/run.py --concurrency 1,8,32 --requests 500
+    python benchmark/run.py --backend real --routers tickets,passengers
+    python benchmark/run.py --compare baseline.json
+"""
+from datetime import datetime
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent / "api"))
+sys.path.insert(0, str(ROOT))
+
+import httpx
+from scenarios import SCENARIOS, discover_ids
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочное тестирование API")
+    parser.add_argument("--backend", choices=["fake", "real"], default="fake",
+                        help="fake – хранилища в памяти, real – базы из переменных окружения")
+    parser.add_argument("--concurrency", default="1,8,32,128", help="Уровни параллелизма через запятую")
+    parser.add_argument("--requests", type=int, default=500, help="Запросов на сценарий и уровень")
+    parser.add_argument("--warmup", type=int, default=20, help="Запросов прогрева перед замером")
+    parser.add_argument("--routers", default=None, help="Ограничить роутерами, через запятую")
+    parser.add_argument("--writes", action="store_true", help="Выполнять пишущие сценарии на реальных базах")
+    parser.add_argument("--latency", default="mongo=1:0.5,cassandra=1:0.5,neo4j=2:1",
+                        help="Задержка хранилищ в памяти, backend=база_мс:разброс_мс")
+    parser.add_argument("--passengers", type=int, default=5_000)
+    parser.add_argument("--flights", type=int, default=500)
+    parser.add_argument("--tickets-per-flight", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark-results.json", help="Файл для результатов в JSON")
+    parser.add_argument("--compare", default=None, help="JSON предыдущего запуска для сравнения")
+    return parser.parse_args()
+
+def parse_latency(value):
+    latency = {}
+    for item in value.split(","):
+        backend, _, spec = item.partition("=")
+        base, _, jitter = spec.partition(":")
+        latency[backend.strip()] = (float(base or 0), float(jitter or 0))
+    return latency
+
+def install_fakes(args):
+    # Imported here so a real-backend run does not need the doubles
+    from fakes import Latency, FakeMongoDatabase, FakeCassandraSession, FakeNeo4jDriver
+    from dataset import seed
+    from db.mongo import set_mongo_database
+    from db.cassandra import set_cassandra_session
+    from db.neo4j import set_neo4j_driver
+
+    latency = parse_latency(args.latency)
+    mongo = FakeMongoDatabase(Latency(*latency.get("mongo", (0, 0))))
+    cassandra = FakeCassandraSession(Latency(*latency.get("cassandra", (0, 0))))
+    neo4j = FakeNeo4jDriver(Latency(*latency.get("neo4j", (0, 0))))
+    seed(mongo, cassandra, neo4j, args.passengers, args.flights, args.tickets_per_flight, args.seed)
+
+    set_mongo_database(mongo)
+    set_cassandra_session(cassandra)
+    set_neo4j_driver(neo4j)
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return round(ordered[index] * 1000, 3)
+
+async def measure(client, scenario, ids, concurrency, requests, rng):
+    latencies = []
+    errors = 0
+    shed = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors, shed
+        for _ in remaining:
+            method, path, body = scenario.build(ids, rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                # 503 is a bulkhead rejection: load shedding, not a failure
+                rejected = response.status_code == 503
+                failed = response.status_code >= 500 and not rejected
+            except Exception:
+                rejected, failed = False, True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+            shed += rejected
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "router": scenario.router,
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "shed": shed,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+def compare(results, baseline_path):
+    baseline = {
+        (row["router"], row["scenario"], row["concurrency"]): row
+        for row in json.loads(Path(baseline_path).read_text())["results"]
+    }
+    print(f"\nСравнение с {baseline_path}")
+    print(f"{'сценарий':<32}{'conc':>6}{'rps':>12}{'Δ rps':>10}{'p99 ms':>10}{'Δ p99':>10}")
+    for row in results:
+        previous = baseline.get((row["router"], row["scenario"], row["concurrency"]))
+        if not previous:
+            continue
+        rps_delta = (row["rps"] / previous["rps"] - 1) * 100 if previous["rps"] else 0.0
+        p99_delta = (row["p99_ms"] / previous["p99_ms"] - 1) * 100 if previous["p99_ms"] else 0.0
+        print(
+            f"{row['router'] + '.' + row['scenario']:<32}{row['concurrency']:>6}"
+            f"{row['rps']:>12.1f}{rps_delta:>+9.1f}%{row['p99_ms']:>10.2f}{p99_delta:>+9.1f}%"
+        )
+
+async def wait_ready(client, timeout=120):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = await client.get("/health/ready")
+        if response.status_code == 200:
+            return
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"API not ready: {response.json().get('errors')}")
+        await asyncio.sleep(0.2)
+
+async def run(args):
+    if args.backend == "fake":
+        install_fakes(args)
+    from main import app
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    routers = set(args.routers.split(",")) if args.routers else None
+    scenarios = [
+        scenario for scenario in SCENARIOS
+        if (routers is None or scenario.router in routers)
+        and (not scenario.write or args.backend == "fake" or args.writes)
+    ]
+    rng = random.Random(args.seed)
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            await wait_ready(client)
+            ids = await discover_ids(client)
+            print(f"{'сценарий':<32}{'conc':>6}{'rps':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'shed':>6}")
+            for scenario in scenarios:
+                if args.warmup:
+                    await measure(client, scenario, ids, 1, args.warmup, rng)
+                for level in levels:
+                    row = await measure(client, scenario, ids, level, args.requests, rng)
+                    results.append(row)
+                    print(
+                        f"{scenario.router + '.' + scenario.name:<32}{level:>6}{row['rps']:>12.1f}"
+                        f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['errors']:>8}{row['shed']:>6}"
+                    )
+
+    report = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "backend": args.backend,
+            "latency": parse_latency(args.latency) if args.backend == "fake" else None,
+            "concurrency": levels,
+            "requests": args.requests,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\nРезультаты сохранены в {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,73 @@
+"""Request mix per router. Each scenario builds a request from IDs that were
+discovered through the API itself, so the same scenarios run against the
+in-memory doubles and against real databases."""
+from dataclasses import dataclass
+from typing import Callable
+import json
+
+@dataclass
+class Scenario:
+    router: str
+    name: str
+    build: Callable
+    write: bool = False
+
+def _get(path):
+    return "GET", path, None
+
+SCENARIOS = [
+    Scenario("aircrafts", "list", lambda ids, rng: _get("/api/aircrafts?limit=50")),
+    Scenario("aircrafts", "get", lambda ids, rng: _get(f"/api/aircrafts/{rng.choice(ids['aircrafts'])}")),
+    Scenario("aircrafts", "mget", lambda ids, rng: ("POST", "/api/aircrafts/mget", {"ids": rng.sample(ids["aircrafts"], 20)})),
+    Scenario("passengers", "list", lambda ids, rng: _get("/api/passengers?limit=50")),
+    Scenario("passengers", "list_fields", lambda ids, rng: _get("/api/passengers?limit=50&fields=full_name")),
+    Scenario("passengers", "get", lambda ids, rng: _get(f"/api/passengers/{rng.choice(ids['passengers'])}")),
+    Scenario("passengers", "mget", lambda ids, rng: ("POST", "/api/passengers/mget", {"ids": rng.sample(ids["passengers"], 100)})),
+    Scenario("passengers", "total_spent", lambda ids, rng: _get(f"/api/passengers/{rng.choice(ids['passengers'])}/total_spent")),
+    Scenario("passengers", "travel_history", lambda ids, rng: _get(f"/api/passengers/{rng.choice(ids['passengers'])}/travel_history")),
+    Scenario("passengers", "stats_country", lambda ids, rng: _get("/api/passengers/stats/country")),
+    Scenario("tickets", "list_by_passenger", lambda ids, rng: _get(f"/api/tickets?passenger_id={rng.choice(ids['passengers'])}")),
+    Scenario("tickets", "list_by_flight", lambda ids, rng: _get(f"/api/tickets?flight_id={rng.choice(ids['flights'])}")),
+    Scenario("tickets", "get", lambda ids, rng: _get(f"/api/tickets/{rng.choice(ids['tickets'])}")),
+    Scenario("tickets", "mget", lambda ids, rng: ("POST", "/api/tickets/mget", {"ids": rng.sample(ids["tickets"], 100)})),
+    Scenario("tickets", "create", lambda ids, rng: ("POST", "/api/tickets", {
+        "passenger_id": rng.choice(ids["passengers"]),
+        "flight_id": rng.choice(ids["flights"]),
+        "seat": f"{rng.randint(1, 40)}{rng.choice('ABCDEF')}",
+        "class_place": rng.choice(["economy", "business", "first"]),
+        "price": round(rng.uniform(50, 2000), 2)
+    }), write=True),
+    Scenario("flights", "manifest", lambda ids, rng: _get(f"/api/flights/{rng.choice(ids['flights'])}/manifest")),
+    Scenario("flights", "seats", lambda ids, rng: _get(f"/api/flights/{rng.choice(ids['flights'])}/seats")),
+    Scenario("routes", "search", lambda ids, rng: _get("/api/routes/{}/{}".format(*rng.choice(ids["routes"])))),
+    Scenario("export", "flight_status", lambda ids, rng: _get("/api/export/flight_status")),
+    Scenario("cache", "stats", lambda ids, rng: _get("/api/cache/stats")),
+    Scenario("outbox", "stats", lambda ids, rng: _get("/api/outbox/stats")),
+    Scenario("metrics", "scrape", lambda ids, rng: _get("/metrics")),
+]
+
+async def discover_ids(client, sample=500):
+    """Collects entity IDs to build requests from."""
+    async def values(path, field):
+        response = await client.get(path)
+        response.raise_for_status()
+        return [item[field] for item in response.json()]
+
+    ids = {
+        "passengers": await values(f"/api/passengers?limit={sample}&fields=passenger_id", "passenger_id"),
+        "aircrafts": await values(f"/api/aircrafts?limit={sample}&fields=reg_number", "reg_number"),
+        "tickets": await values(f"/api/tickets?limit={sample}&fields=ticket_id", "ticket_id"),
+        "flights": [],
+        "routes": [],
+    }
+    response = await client.get("/api/export/flight_status")
+    response.raise_for_status()
+    for line in response.text.splitlines()[:sample]:
+        status = json.loads(line)
+        ids["flights"].append(status["flight_id"])
+        ids["routes"].append((status["departure_airport"], status["arrival_airport"]))
+
+    missing = [name for name, found in ids.items() if not found]
+    if missing:
+        raise RuntimeError(f"No data found for: {', '.join(missing)}")
+    return ids
@@ -1,12 +1,30 @@
 from cassandra.cluster import Cluster
-from cassandra.query import BatchStatement, SimpleStatement
-from cassandra import ConsistencyLevel
+from cassandra.concurrent import execute_concurrent
+from cassandra.query import BatchStatement, BatchType, SimpleStatement
 from pymongo import MongoClient
-from datetime import datetime, timedelta
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import islice
+import argparse
 import random
 import uuid
 import time
 
+parser = argparse.ArgumentParser(description="Генерация данных Cassandra")
+parser.add_argument(
+    "--backfill", action="store_true",
+    help="Заполнить tickets_by_passenger, tickets_by_flight, flight_seats и baggage_by_flight из существующих таблиц tickets и baggage"
+)
+parser.add_argument(
+    "--rebuild-spend", action="store_true",
+    help="Пересчитать суммы трат пассажиров (passenger_spend) по таблице tickets"
+)
+parser.add_argument("--concurrency", type=int, default=256, help="Число одновременных запросов к Cassandra")
+parser.add_argument("--chunk-size", type=int, default=20_000, help="Запросов в одном окне загрузки")
+parser.add_argument("--retries", type=int, default=3, help="Повторов для запросов, завершившихся ошибкой")
+parser.add_argument("--fetch-size", type=int, default=5_000, help="Размер страницы при чтении MongoDB и Cassandra")
+args = parser.parse_args()
+
 mongo_client = MongoClient('mongodb://localhost:27017/')
 mongo_db = mongo_client['airport_db']
 
@@ -14,15 +32,236 @@ cluster = Cluster(['localhost'])
 session = cluster.connect()
 
 session.execute("""
-CREATE KEYSPACE IF NOT EXISTS airport 
+CREATE KEYSPACE IF NOT EXISTS airport
 WITH replication = {'class': 'SimpleStrategy', 'replication_factor': 1}
 """)
 
 session.set_keyspace('airport')
 
+TICKET_QUERY_TABLES = {
+    "tickets_by_passenger": (
+        "(passenger_id), booking_date, ticket_id",
+        "WITH CLUSTERING ORDER BY (booking_date DESC, ticket_id ASC)"
+    ),
+    "tickets_by_flight": ("(flight_id), booking_date, ticket_id", ""),
+}
+
+# Rows of one passenger share a tickets_by_passenger partition, so they go
+# in one unlogged batch; larger groups are split to stay under the batch
+# size warning threshold.
+MAX_PARTITION_BATCH = 50
+
+def create_ticket_query_tables():
+    for table, (key, options) in TICKET_QUERY_TABLES.items():
+        session.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            passenger_id TEXT,
+            flight_id TEXT,
+            booking_date TIMESTAMP,
+            ticket_id TEXT,
+            seat TEXT,
+            class_place TEXT,
+            price DECIMAL,
+            PRIMARY KEY ({key})
+        ) {options}
+        """)
+
+# Baggage rows repeated under their flight, so a flight manifest counts
+# bags with one partition read instead of one indexed lookup per ticket
+def create_baggage_by_flight_table():
+    session.execute("""
+    CREATE TABLE IF NOT EXISTS baggage_by_flight (
+        flight_id TEXT,
+        ticket_id TEXT,
+        baggage_id UUID,
+        weight FLOAT,
+        status TEXT,
+        PRIMARY KEY ((flight_id), ticket_id, baggage_id)
+    )
+    """)
+
+# Occupied seats per flight. The API claims seats with lightweight
+# transactions; gen_mongodb.py already gives every ticket of a flight its
+# own seat, so the loader writes plain inserts.
+def create_flight_seats_table():
+    session.execute("""
+    CREATE TABLE IF NOT EXISTS flight_seats (
+        flight_id TEXT,
+        seat TEXT,
+        ticket_id TEXT,
+        PRIMARY KEY ((flight_id), seat)
+    )
+    """)
+
+def prepare_seat_insert():
+    return session.prepare("INSERT INTO flight_seats (flight_id, seat, ticket_id) VALUES (?, ?, ?)")
+
+def prepare_baggage_by_flight_insert():
+    return session.prepare("""
+    INSERT INTO baggage_by_flight (flight_id, ticket_id, baggage_id, weight, status)
+    VALUES (?, ?, ?, ?, ?)
+    """)
+
+def prepare_ticket_inserts():
+    return {
+        table: session.prepare(f"""
+        INSERT INTO {table} (ticket_id, passenger_id, flight_id, seat, class_place, price, booking_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """)
+        for table in TICKET_QUERY_TABLES
+    }
+
+def to_cents(price):
+    return int((Decimal(str(price)) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+def chunked(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def load(label, statements, retries=None):
+    """Executes a stream of (statement, params) pairs with at most
+    --concurrency requests in flight. Failed statements are retried with
+    backoff; the ones that still fail are counted and the last error shown."""
+    retries = args.retries if retries is None else retries
+    started = time.perf_counter()
+    done = failed = 0
+    last_error = None
+
+    for chunk in chunked(statements, args.chunk_size):
+        pending = chunk
+        for attempt in range(retries + 1):
+            results = execute_concurrent(
+                session, pending, concurrency=args.concurrency, raise_on_first_error=False
+            )
+            failures = [
+                (item, result) for item, (success, result) in zip(pending, results) if not success
+            ]
+            pending = [item for item, _ in failures]
+            if failures:
+                last_error = failures[-1][1]
+            if not pending or attempt == retries:
+                break
+            time.sleep(min(0.1 * 2 ** attempt, 5))
+
+        done += len(chunk) - len(pending)
+        failed += len(pending)
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        print(f"{label}: {done} ({done / elapsed:,.0f} в секунду), ошибок: {failed}", end="\r")
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"{label} – {done} за {elapsed:.1f} с ({done / elapsed:,.0f} в секунду), ошибок: {failed}")
+    if last_error is not None and failed:
+        print(f"Последняя ошибка: {last_error}")
+    return done, failed
+
+# Counters cannot be overwritten, and TRUNCATE followed by re-incrementing
+# loses or double counts whatever the API books meanwhile. Instead every
+# counter that disagrees with the tickets is re-read together with that
+# passenger's tickets and moved by the difference, so the rebuild can run
+# next to the API: a booking racing the re-read leaves a drift that the
+# next run corrects.
+def rebuild_spend():
+    session.execute("""
+    CREATE TABLE IF NOT EXISTS passenger_spend (
+        passenger_id TEXT PRIMARY KEY,
+        total_cents COUNTER
+    )
+    """)
+
+    totals = {}
+    for row in session.execute(SimpleStatement("SELECT passenger_id, price FROM tickets", fetch_size=args.fetch_size)):
+        totals[row.passenger_id] = totals.get(row.passenger_id, 0) + to_cents(row.price)
+    counters = {
+        row.passenger_id: row.total_cents
+        for row in session.execute(SimpleStatement(
+            "SELECT passenger_id, total_cents FROM passenger_spend", fetch_size=args.fetch_size
+        ))
+    }
+    drifted = [
+        passenger_id for passenger_id in totals.keys() | counters.keys()
+        if totals.get(passenger_id, 0) != (counters.get(passenger_id) or 0)
+    ]
+    print(f"Расхождений в passenger_spend: {len(drifted)}")
+
+    select_prices = session.prepare("SELECT price FROM tickets_by_passenger WHERE passenger_id = ?")
+    select_spend = session.prepare("SELECT total_cents FROM passenger_spend WHERE passenger_id = ?")
+    increment = session.prepare(
+        "UPDATE passenger_spend SET total_cents = total_cents + ? WHERE passenger_id = ?"
+    )
+
+    def corrections():
+        for chunk in chunked(drifted, args.chunk_size):
+            prices = execute_concurrent(
+                session, [(select_prices, (passenger_id,)) for passenger_id in chunk],
+                concurrency=args.concurrency, raise_on_first_error=False
+            )
+            spend = execute_concurrent(
+                session, [(select_spend, (passenger_id,)) for passenger_id in chunk],
+                concurrency=args.concurrency, raise_on_first_error=False
+            )
+            for passenger_id, (prices_ok, rows), (spend_ok, current) in zip(chunk, prices, spend):
+                if not (prices_ok and spend_ok):
+                    print(f"Не удалось перечитать {passenger_id}: {rows if not prices_ok else current}")
+                    continue
+                counter = current.one()
+                delta = sum(to_cents(row.price) for row in rows) - ((counter.total_cents or 0) if counter else 0)
+                if delta:
+                    yield increment, (delta, passenger_id)
+
+    # Counter increments are not idempotent, so a timed-out one is not retried
+    load("Пересчет трат пассажиров", corrections(), retries=0)
+
+if args.rebuild_spend:
+    rebuild_spend()
+    cluster.shutdown()
+    mongo_client.close()
+    raise SystemExit(0)
+
+def backfill_statements(inserts, insert_seat):
+    rows = session.execute(SimpleStatement(
+        "SELECT ticket_id, passenger_id, flight_id, seat, class_place, price, booking_date FROM tickets",
+        fetch_size=args.fetch_size
+    ))
+    for row in rows:
+        for statement in inserts.values():
+            yield statement, tuple(row)
+        yield insert_seat, (row.flight_id, row.seat, row.ticket_id)
+
+def baggage_backfill_statements(insert):
+    flights = {
+        row.ticket_id: row.flight_id
+        for row in session.execute(SimpleStatement("SELECT ticket_id, flight_id FROM tickets", fetch_size=args.fetch_size))
+    }
+    rows = session.execute(SimpleStatement(
+        "SELECT baggage_id, ticket_id, weight, status FROM baggage", fetch_size=args.fetch_size
+    ))
+    for row in rows:
+        flight_id = flights.get(row.ticket_id)
+        if flight_id is not None:
+            yield insert, (flight_id, row.ticket_id, row.baggage_id, row.weight, row.status)
+
+if args.backfill:
+    create_ticket_query_tables()
+    create_flight_seats_table()
+    create_baggage_by_flight_table()
+    load("Перенос билетов в таблицы запросов", backfill_statements(prepare_ticket_inserts(), prepare_seat_insert()))
+    load("Перенос багажа в baggage_by_flight", baggage_backfill_statements(prepare_baggage_by_flight_insert()))
+    cluster.shutdown()
+    mongo_client.close()
+    raise SystemExit(0)
+
 session.execute("DROP TABLE IF EXISTS tickets")
+for table in TICKET_QUERY_TABLES:
+    session.execute(f"DROP TABLE IF EXISTS {table}")
 session.execute("DROP TABLE IF EXISTS baggage")
+session.execute("DROP TABLE IF EXISTS baggage_by_flight")
+session.execute("DROP TABLE IF EXISTS flight_seats")
 session.execute("DROP TABLE IF EXISTS flight_status")
+session.execute("DROP TABLE IF EXISTS passenger_spend")
 
 session.execute("""
 CREATE TABLE tickets (
@@ -56,94 +295,90 @@ CREATE TABLE flight_status (
 )
 """)
 
+create_ticket_query_tables()
+create_flight_seats_table()
+create_baggage_by_flight_table()
+
 insert_ticket = session.prepare("""
 INSERT INTO tickets (ticket_id, passenger_id, flight_id, seat, class_place, price, booking_date)
 VALUES (?, ?, ?, ?, ?, ?, ?)
 """)
 
+ticket_query_inserts = prepare_ticket_inserts()
+
+insert_seat = prepare_seat_insert()
+
 insert_baggage = session.prepare("""
 INSERT INTO baggage (baggage_id, ticket_id, weight, status, last_updated)
 VALUES (?, ?, ?, ?, ?)
 """)
 
+insert_baggage_by_flight = prepare_baggage_by_flight_insert()
+
 insert_status = session.prepare("""
 INSERT INTO flight_status (flight_id, status, last_update, departure_airport, arrival_airport)
 VALUES (?, ?, ?, ?, ?)
 """)
 
-ticket_counter = 0
-baggage_counter = 0
-
-ticket_batch = BatchStatement(consistency_level=ConsistencyLevel.QUORUM)
-baggage_batch = BatchStatement(consistency_level=ConsistencyLevel.QUORUM)
-batch_size = 50
+def passenger_batches(rows):
+    for start in range(0, len(rows), MAX_PARTITION_BATCH):
+        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        for row in rows[start:start + MAX_PARTITION_BATCH]:
+            batch.add(ticket_query_inserts["tickets_by_passenger"], row)
+        yield batch, None
 
-for passenger in mongo_db.passengers.find():
-    for ticket in passenger.get('tickets', []):
-        try:
-            ticket_batch.add(insert_ticket, (
+def ticket_statements():
+    # Only the fields the loader needs are read from MongoDB
+    passengers = mongo_db.passengers.find(
+        {"tickets.0": {"$exists": True}},
+        {"_id": 0, "passenger_id": 1, "tickets": 1},
+        batch_size=args.fetch_size
+    )
+    for passenger in passengers:
+        rows = []
+        for ticket in passenger["tickets"]:
+            row = (
                 ticket['ticket_id'],
                 passenger['passenger_id'],
                 ticket['flight_id'],
                 ticket['seat'],
                 ticket['class_place'],
-                float(ticket['price']),
+                Decimal(str(ticket['price'])),
                 ticket['booking_date']
-            ))
-            
+            )
+            rows.append(row)
+            yield insert_ticket, row
+            yield ticket_query_inserts["tickets_by_flight"], row
+            yield insert_seat, (ticket['flight_id'], ticket['seat'], ticket['ticket_id'])
+
             for _ in range(random.randint(1, 2)):
-                baggage_batch.add(insert_baggage, (
-                    uuid.uuid4(),
-                    ticket['ticket_id'],
-                    round(random.uniform(5, 32), 1),
-                    random.choice(['checked_in', 'in_transit', 'loaded', 'delivered']),
-                    datetime.now()
-                ))
-                baggage_counter += 1
-            
-            ticket_counter += 1
-            
-            if ticket_counter % batch_size == 0:
-                session.execute(ticket_batch)
-                session.execute(baggage_batch)
-                ticket_batch = BatchStatement(consistency_level=ConsistencyLevel.QUORUM)
-                baggage_batch = BatchStatement(consistency_level=ConsistencyLevel.QUORUM)
-                
-        except Exception as e:
-            print(f"Ошибка при обработке билета {ticket['ticket_id']}: {str(e)}")
-
-if ticket_batch:
-    session.execute(ticket_batch)
-if baggage_batch:
-    session.execute(baggage_batch)
-
-status_batch = BatchStatement(consistency_level=ConsistencyLevel.QUORUM)
-status_counter = 0
-
-for flight in mongo_db.flights.find():
-    try:
-        status_batch.add(insert_status, (
+                baggage_id = uuid.uuid4()
+                weight = round(random.uniform(5, 32), 1)
+                status = random.choice(['checked_in', 'in_transit', 'loaded', 'delivered'])
+                yield insert_baggage, (baggage_id, ticket['ticket_id'], weight, status, datetime.now())
+                yield insert_baggage_by_flight, (ticket['flight_id'], ticket['ticket_id'], baggage_id, weight, status)
+        yield from passenger_batches(rows)
+
+def status_statements():
+    flights = mongo_db.flights.find(
+        {},
+        {"_id": 0, "flight_id": 1, "status": 1, "departure.airport": 1, "arrival.airport": 1},
+        batch_size=args.fetch_size
+    )
+    for flight in flights:
+        yield insert_status, (
             flight['flight_id'],
             flight['status'],
             datetime.now(),
             flight['departure']['airport'],
             flight['arrival']['airport']
-        ))
-        status_counter += 1
-        
-        if status_counter % batch_size == 0:
-            session.execute(status_batch)
-            status_batch = BatchStatement(consistency_level=ConsistencyLevel.QUORUM)
-            print(f"Обработано статусов: {status_counter}")
-            
-    except Exception as e:
-        print(f"Ошибка при обработке рейса {flight['flight_id']}: {str(e)}")
-
-if status_batch:
-    session.execute(status_batch)
-
-session.execute("CREATE INDEX ON tickets(passenger_id)")
-session.execute("CREATE INDEX ON tickets(flight_id)")
+        )
+
+load("Загрузка билетов и багажа", ticket_statements())
+load("Загрузка статусов рейсов", status_statements())
+
+rebuild_spend()
+
 session.execute("CREATE INDEX ON baggage(ticket_id)")
 session.execute("CREATE INDEX ON flight_status(departure_airport)")
 session.execute("CREATE INDEX ON flight_status(arrival_airport)")
@@ -151,4 +386,4 @@ session.execute("CREATE INDEX ON flight_status(arrival_airport)")
 print("Созданы индексы")
 
 cluster.shutdown()
-mongo_client.close()  
\ No newline at end of file
+mongo_client.close()
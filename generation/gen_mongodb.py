@@ -1,112 +1,154 @@
 import pymongo
 from faker import Faker
 from datetime import datetime, timedelta
+from array import array
+from multiprocessing import Pool
+import argparse
+import os
 import random
-import uuid
+import time
 
-fake = Faker()
-client = pymongo.MongoClient("mongodb://localhost:27017/")
-db = client["airport_db"]
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+DB_NAME = "airport_db"
 
-db.flights.drop()
-db.passengers.drop()
-db.aircrafts.drop()
-db.airports.drop()
+MAJOR_AIRPORTS = ["SVO", "JFK", "LAX", "LED", "IST", "DXB", "HND", "LHR", "CDG", "FRA"]
+AIRCRAFT_MODELS = [
+    "Boeing 737-800", "Airbus A320", "Boeing 787", "Airbus A350",
+    "Embraer E190", "Boeing 777", "Airbus A380", "Bombardier CRJ900"
+]
+AIRLINES = [
+    {"code": "SU", "name": "Aeroflot"},
+    {"code": "DL", "name": "Delta Airlines"},
+    {"code": "AA", "name": "American Airlines"},
+    {"code": "TK", "name": "Turkish Airlines"}
+]
+FLIGHT_STATUSES = ["scheduled", "boarding", "departed", "delayed", "canceled"]
+TICKET_CLASSES = ["economy", "business", "first"]
+# Seats are numbered row by row up to the aircraft's capacity, as the API's
+# seat map lays them out (SEAT_MAP_LETTERS)
+SEAT_LETTERS = "ABCDEF"
 
-aircraft_reg_numbers = []
-airport_codes = []
-passenger_ids = []
+def parse_args():
+    parser = argparse.ArgumentParser(description="Генерация данных MongoDB")
+    parser.add_argument("--passengers", type=int, default=20_000, help="Число пассажиров")
+    parser.add_argument("--flights", type=int, default=100, help="Число рейсов")
+    parser.add_argument("--tickets-per-flight", type=int, default=100, help="Среднее число билетов на рейс")
+    parser.add_argument("--airports", type=int, default=20, help="Число аэропортов")
+    parser.add_argument("--aircrafts", type=int, default=50, help="Число самолетов")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора, одинаковое зерно дает одинаковые данные")
+    parser.add_argument(
+        "--base-date", type=datetime.fromisoformat, default=datetime(2025, 1, 1),
+        help="Дата, от которой отсчитываются даты рейсов и обслуживания самолетов (ГГГГ-ММ-ДД)"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Число процессов генерации")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="Документов в одной пачке insert_many")
+    return parser.parse_args()
 
-def generate_airports(num=20):
+def report(label, count, started):
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"{label} – {count} за {elapsed:.1f} с ({count / elapsed:,.0f} в секунду)")
+
+# IDs and passports are derived from the passenger index, so every worker
+# produces unique values without coordinating with the others.
+
+def passenger_id(index):
+    return f"pas_{index:08x}"
+
+def passport(index):
+    # 7919 is coprime with 10^9, so the mapping is a bijection
+    return f"{(index * 7919 + 100_000_000) % 1_000_000_000:09d}"
+
+# Small reference collections are generated in the main process
+
+def generate_airports(db, rng, fake, num):
     airports = []
-    major_airports = ["SVO", "JFK", "LAX", "LED", "IST", "DXB", "HND", "LHR", "CDG", "FRA"]
-    
-    for code in major_airports:
+    codes = set(MAJOR_AIRPORTS)
+    for code in MAJOR_AIRPORTS[:num]:
         airports.append({
             "code": code,
             "name": fake.company() + " International Airport",
             "city": fake.city(),
             "country": fake.country(),
-            "runways": random.randint(2, 5)
+            "runways": rng.randint(2, 5)
         })
-        airport_codes.append(code)
-    
-    for _ in range(num - len(major_airports)):
-        code = fake.unique.bothify(text="???", letters="ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+    while len(airports) < num:
+        code = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(3))
+        if code in codes:
+            continue
+        codes.add(code)
         airports.append({
             "code": code,
             "name": fake.city() + " Airport",
             "city": fake.city(),
             "country": fake.country(),
-            "runways": random.randint(1, 3)
+            "runways": rng.randint(1, 3)
         })
-        airport_codes.append(code)
-    
+
     db.airports.insert_many(airports)
+    return [airport["code"] for airport in airports]
 
-def generate_aircrafts(num=50):
-    aircraft_models = [
-        "Boeing 737-800", "Airbus A320", "Boeing 787", "Airbus A350",
-        "Embraer E190", "Boeing 777", "Airbus A380", "Bombardier CRJ900"
-    ]
-    
+def generate_aircrafts(db, rng, num, base_date):
     aircrafts = []
-    for _ in range(num):
-        reg_number = fake.unique.bothify(text="??-#####", letters="ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    reg_numbers = set()
+    while len(aircrafts) < num:
+        reg_number = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(2)) + f"-{rng.randint(0, 99999):05d}"
+        if reg_number in reg_numbers:
+            continue
+        reg_numbers.add(reg_number)
+        model = rng.choice(AIRCRAFT_MODELS)
         aircrafts.append({
             "reg_number": reg_number,
-            "model": random.choice(aircraft_models),
-            "manufacturer": "Boeing" if "Boeing" in aircraft_models else "Airbus",
-            "capacity": random.randint(100, 400),
-            "last_maintenance": datetime.now() - timedelta(days=random.randint(1, 365)),
-            "status": random.choice(["active", "maintenance", "storage"])
+            "model": model,
+            "manufacturer": model.split()[0],
+            "capacity": rng.randint(100, 400),
+            "last_maintenance": base_date - timedelta(days=rng.randint(1, 365)),
+            "status": rng.choice(["active", "maintenance", "storage"])
         })
-        aircraft_reg_numbers.append(reg_number)
-    
+
     db.aircrafts.insert_many(aircrafts)
+    return {aircraft["reg_number"]: aircraft["capacity"] for aircraft in aircrafts}
 
-def generate_passengers(num=20_000):
-    passengers = []
-    for _ in range(num):
-        passenger_id = f"pas_{uuid.uuid4().hex[:8]}"
-        passengers.append({
-            "passenger_id": passenger_id,
-            "full_name": fake.name(),
-            "passport": fake.unique.bothify(text="#########"),
-            "nationality": fake.country_code(),
-            "contact": {
-                "email": fake.email(),
-                "phone": fake.phone_number()
-            },
-            "tickets": []
-        })
-        passenger_ids.append(passenger_id)
-    
-    for i in range(0, len(passengers), 10000):
-        db.passengers.insert_many(passengers[i:i+10000])
-
-def generate_flights_and_tickets(num_flights=100, tickets_per_flight=100):
-    airlines = [
-        {"code": "SU", "name": "Aeroflot"},
-        {"code": "DL", "name": "Delta Airlines"},
-        {"code": "AA", "name": "American Airlines"},
-        {"code": "TK", "name": "Turkish Airlines"}
-    ]
-    
-    flight_statuses = ["scheduled", "boarding", "departed", "delayed", "canceled"]
-    
-    for _ in range(num_flights):
-        departure_airport = random.choice(airport_codes)
-        arrival_airport = random.choice([c for c in airport_codes if c != departure_airport])
-        
-        flight_id = f"{random.choice(airlines)['code']}-{fake.unique.random_int(min=1000, max=9999)}"
-        departure_time = datetime.now() - timedelta(days=random.randint(1, 365))
-        
-        flight_data = {
+def seat_label(index):
+    row, letter = divmod(index, len(SEAT_LETTERS))
+    return f"{row + 1}{SEAT_LETTERS[letter]}"
+
+def generate_flights(db, rng, fake, args, airport_codes, capacities):
+    """Inserts flights and returns their bookings as passenger/flight/seat
+    index arrays grouped by passenger chunk, plus per-flight ids and times.
+    Seats are drawn here, per flight and without repeats, because a
+    flight's passengers are spread over every worker's chunk."""
+    reg_numbers = list(capacities)
+    bookings = {}
+    flight_ids = []
+    departure_times = []
+    flights = []
+
+    for index in range(args.flights):
+        airline = rng.choice(AIRLINES)
+        departure_airport = rng.choice(airport_codes)
+        arrival_airport = rng.choice([code for code in airport_codes if code != departure_airport])
+        flight_id = f"{airline['code']}-{1000 + index}"
+        departure_time = args.base_date - timedelta(days=rng.randint(1, 365), minutes=rng.randint(0, 1439))
+
+        aircraft = rng.choice(reg_numbers)
+        num_tickets = rng.randint(int(args.tickets_per_flight * 0.5), int(args.tickets_per_flight * 1.5))
+        num_tickets = min(num_tickets, args.passengers, capacities[aircraft])
+        booked = rng.sample(range(args.passengers), num_tickets)
+        seats = rng.sample(range(capacities[aircraft]), num_tickets)
+        for passenger_index, seat in zip(booked, seats):
+            passengers, flights_of, seats_of = bookings.setdefault(
+                passenger_index // args.chunk_size, (array("i"), array("i"), array("i"))
+            )
+            passengers.append(passenger_index)
+            flights_of.append(index)
+            seats_of.append(seat)
+
+        flights.append({
             "flight_id": flight_id,
-            "airline": random.choice(airlines),
-            "aircraft": random.choice(aircraft_reg_numbers),
-            "status": random.choice(flight_statuses),
+            "airline": airline,
+            "aircraft": aircraft,
+            "status": rng.choice(FLIGHT_STATUSES),
             "departure": {
                 "airport": departure_airport,
                 "time": departure_time,
@@ -114,46 +156,109 @@ def generate_flights_and_tickets(num_flights=100, tickets_per_flight=100):
             },
             "arrival": {
                 "airport": arrival_airport,
-                "time": departure_time + timedelta(hours=random.randint(1, 12))
+                "time": departure_time + timedelta(hours=rng.randint(1, 12))
             },
-            "passengers": []
-        }
-        
-        num_tickets = random.randint(int(tickets_per_flight*0.5), int(tickets_per_flight*1.5))
-        flight_passengers = random.sample(passenger_ids, min(num_tickets, len(passenger_ids)))
-        
-        for passenger_id in flight_passengers:
-            ticket_id = f"tkt_{uuid.uuid4().hex[:6]}"
-            
-            db.passengers.update_one(
-                {"passenger_id": passenger_id},
-                {"$push": {"tickets": {
-                    "ticket_id": ticket_id,
-                    "flight_id": flight_id,
-                    "seat": f"{random.randint(1, 40)}{random.choice('ABCDEF')}",
-                    "class_place": random.choice(["economy", "business", "first"]),
-                    "price": round(random.uniform(50, 2000), 2),
-                    "booking_date": datetime.now() - timedelta(days=random.randint(1, 365))
-                }}}
-            )
-            
-            flight_data["passengers"].append(passenger_id)
-        
-        db.flights.insert_one(flight_data)
+            "passengers": [passenger_id(passenger_index) for passenger_index in booked]
+        })
+        flight_ids.append(flight_id)
+        departure_times.append(departure_time)
 
-if __name__ == "__main__":
-    generate_airports()
-    print(f"Генерация аэропортов – {db.airports.count_documents({})}")
-    
-    generate_aircrafts()
-    print(f"Генерация самолетов – {db.aircrafts.count_documents({})}")
-    
-    generate_passengers()
-    print(f"Генерация пассажиров – {db.passengers.count_documents({})}")
-    
-    generate_flights_and_tickets()
-    print(f"Генерация рейсов – {db.flights.count_documents({})}")
-    
+        if len(flights) >= args.chunk_size:
+            db.flights.insert_many(flights, ordered=False)
+            flights = []
+
+    if flights:
+        db.flights.insert_many(flights, ordered=False)
+    return bookings, flight_ids, departure_times
+
+# Passenger chunks are generated and written by worker processes; each one
+# opens its own client, so documents never travel back to the parent.
+
+_worker = {}
+
+def init_worker(mongo_uri, flight_ids, departure_times):
+    _worker["client"] = pymongo.MongoClient(mongo_uri)
+    _worker["collection"] = _worker["client"][DB_NAME].passengers
+    _worker["flight_ids"] = flight_ids
+    _worker["departure_times"] = departure_times
+    _worker["fake"] = Faker()
+
+def generate_passenger_chunk(task):
+    chunk, start, end, booked_passengers, booked_flights, booked_seats, seed = task
+    rng = random.Random(seed * 1_000_003 + chunk)
+    fake = _worker["fake"]
+    fake.seed_instance(seed * 1_000_003 + chunk)
+    flight_ids = _worker["flight_ids"]
+    departure_times = _worker["departure_times"]
+
+    tickets_of = {}
+    for passenger_index, flight_index, seat in zip(booked_passengers, booked_flights, booked_seats):
+        tickets_of.setdefault(passenger_index, []).append({
+            "ticket_id": f"tkt_{rng.getrandbits(48):012x}",
+            "flight_id": flight_ids[flight_index],
+            "seat": seat_label(seat),
+            "class_place": rng.choice(TICKET_CLASSES),
+            "price": round(rng.uniform(50, 2000), 2),
+            "booking_date": departure_times[flight_index] - timedelta(days=rng.randint(1, 90))
+        })
+
+    passengers = []
+    for index in range(start, end):
+        passengers.append({
+            "passenger_id": passenger_id(index),
+            "full_name": fake.name(),
+            "passport": passport(index),
+            "nationality": fake.country_code(),
+            "contact": {
+                "email": fake.email(),
+                "phone": fake.phone_number()
+            },
+            "tickets": tickets_of.get(index, [])
+        })
+
+    _worker["collection"].insert_many(passengers, ordered=False)
+    return len(passengers), len(booked_passengers)
+
+def passenger_tasks(args, bookings):
+    empty = (array("i"), array("i"), array("i"))
+    for chunk, start in enumerate(range(0, args.passengers, args.chunk_size)):
+        end = min(start + args.chunk_size, args.passengers)
+        booked_passengers, booked_flights, booked_seats = bookings.pop(chunk, empty)
+        yield chunk, start, end, booked_passengers, booked_flights, booked_seats, args.seed
+
+def generate_passengers(args, bookings, flight_ids, departure_times):
+    started = time.perf_counter()
+    passengers = tickets = 0
+    with Pool(
+        args.workers, initializer=init_worker,
+        initargs=(MONGO_URI, flight_ids, departure_times)
+    ) as pool:
+        for count, ticket_count in pool.imap_unordered(generate_passenger_chunk, passenger_tasks(args, bookings)):
+            passengers += count
+            tickets += ticket_count
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            print(f"Пассажиры: {passengers}/{args.passengers} ({passengers / elapsed:,.0f} в секунду)", end="\r")
+    print()
+    report("Генерация пассажиров", passengers, started)
+    report("Генерация билетов", tickets, started)
+
+# Nationality counts served by /api/passengers/stats/country. The marker
+# document tells the API the counts are complete (RECONCILED_MARKER in
+# api/services/country_stats.py).
+def build_country_stats(db):
+    counts = db.passengers.aggregate(
+        [{"$group": {"_id": "$nationality", "count": {"$sum": 1}}}], allowDiskUse=True
+    )
+    documents = [doc for doc in counts if doc["_id"]]
+    documents.append({"_id": "_reconciled", "reconciled_at": datetime.utcnow()})
+    db.passenger_country_stats.drop()
+    db.passenger_country_stats.insert_many(documents)
+    print(f"Статистика по странам – {len(documents) - 1}")
+
+# Indexes are built once the data is in place: a single index build is far
+# cheaper than maintaining the indexes on every insert.
+
+def create_indexes(db):
     db.flights.create_index("flight_id", unique=True)
     db.flights.create_index("status")
     db.flights.create_index("departure.airport")
@@ -162,5 +267,38 @@ if __name__ == "__main__":
     db.passengers.create_index("passport", unique=True)
     db.aircrafts.create_index("reg_number", unique=True)
     db.airports.create_index("code", unique=True)
-    
-    print("Созданы индексы")
\ No newline at end of file
+
+if __name__ == "__main__":
+    args = parse_args()
+    client = pymongo.MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    rng = random.Random(args.seed)
+    fake = Faker()
+    fake.seed_instance(args.seed)
+
+    db.flights.drop()
+    db.passengers.drop()
+    db.aircrafts.drop()
+    db.airports.drop()
+
+    total_started = time.perf_counter()
+
+    airport_codes = generate_airports(db, rng, fake, args.airports)
+    print(f"Генерация аэропортов – {len(airport_codes)}")
+
+    capacities = generate_aircrafts(db, rng, args.aircrafts, args.base_date)
+    print(f"Генерация самолетов – {len(capacities)}")
+
+    started = time.perf_counter()
+    bookings, flight_ids, departure_times = generate_flights(db, rng, fake, args, airport_codes, capacities)
+    report("Генерация рейсов", len(flight_ids), started)
+
+    generate_passengers(args, bookings, flight_ids, departure_times)
+    build_country_stats(db)
+
+    started = time.perf_counter()
+    create_indexes(db)
+    print(f"Созданы индексы за {time.perf_counter() - started:.1f} с")
+
+    print(f"Всего: {time.perf_counter() - total_started:.1f} с")
+    client.close()
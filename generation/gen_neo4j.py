@@ -1,37 +1,177 @@
 from cassandra.cluster import Cluster
+from cassandra.query import SimpleStatement
 from neo4j import GraphDatabase
-from datetime import datetime
+from pymongo import MongoClient
+from datetime import timezone
+from itertools import islice
+import argparse
+import os
+import time
 
-cassandra = Cluster(['127.0.0.1']).connect('airport')
-rows = cassandra.execute("SELECT * FROM tickets")
+parser = argparse.ArgumentParser(description="Загрузка графа Neo4j")
+parser.add_argument("--batch-size", type=int, default=10_000, help="Строк в одном UNWIND-запросе")
+parser.add_argument("--fetch-size", type=int, default=5_000, help="Размер страницы при чтении MongoDB и Cassandra")
+parser.add_argument("--clear", action="store_true", help="Удалить существующий граф перед загрузкой")
+args = parser.parse_args()
 
-neo4j = GraphDatabase.driver("neo4j://localhost:7687", 
-                            auth=("neo4j", "test1234"))
+mongo_client = MongoClient('mongodb://localhost:27017/')
+mongo_db = mongo_client['airport_db']
 
-with neo4j.session() as session:
+cassandra_cluster = Cluster(['127.0.0.1'])
+cassandra = cassandra_cluster.connect('airport')
+
+neo4j = GraphDatabase.driver(
+    os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+    auth=(os.getenv("NEO4J_USER", "neo4j"), os.getenv("NEO4J_PASSWORD", "test1234"))
+)
+database = os.getenv("NEO4J_DATABASE") or None
+
+# Uniqueness constraints come first: they back every MERGE/MATCH below
+# with an index lookup instead of a label scan.
+CONSTRAINTS = [
+    "CREATE CONSTRAINT airport_code IF NOT EXISTS FOR (a:Airport) REQUIRE a.code IS UNIQUE",
+    "CREATE CONSTRAINT flight_id IF NOT EXISTS FOR (f:Flight) REQUIRE f.flight_id IS UNIQUE",
+    "CREATE CONSTRAINT passenger_id IF NOT EXISTS FOR (p:Passenger) REQUIRE p.passenger_id IS UNIQUE",
+]
+
+LOAD_AIRPORTS = """
+UNWIND $rows AS row
+MERGE (a:Airport {code: row.code})
+SET a.name = row.name, a.city = row.city, a.country = row.country
+"""
+
+LOAD_FLIGHTS = """
+UNWIND $rows AS row
+MERGE (f:Flight {flight_id: row.flight_id})
+SET f.airline_code = row.airline_code,
+    f.airline_name = row.airline_name,
+    f.aircraft = row.aircraft,
+    f.status = row.status,
+    f.departure_gate = row.departure_gate,
+    f.departure_time = row.departure_time,
+    f.arrival_time = row.arrival_time
+WITH f, row
+MATCH (dep:Airport {code: row.departure_airport})
+MATCH (arr:Airport {code: row.arrival_airport})
+MERGE (f)-[:DEPARTS_FROM]->(dep)
+MERGE (f)-[:ARRIVES_AT]->(arr)
+"""
+
+LOAD_PASSENGERS = """
+UNWIND $rows AS row
+MERGE (p:Passenger {passenger_id: row.passenger_id})
+SET p.full_name = row.full_name, p.nationality = row.nationality
+"""
+
+LOAD_BOOKINGS = """
+UNWIND $rows AS row
+MATCH (f:Flight {flight_id: row.flight_id})
+MERGE (p:Passenger {passenger_id: row.passenger_id})
+MERGE (p)-[r:BOOKED_FLIGHT {ticket_id: row.ticket_id}]->(f)
+SET r.seat = row.seat,
+    r.class_place = row.class_place,
+    r.price = row.price,
+    r.booking_date = row.booking_date
+"""
+
+def utc(value):
+    # MongoDB and Cassandra return naive UTC datetimes; stored as zoned DateTime
+    return value.replace(tzinfo=timezone.utc) if value is not None else None
+
+def chunked(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def load(session, label, query, rows):
+    """Sends rows in --batch-size UNWIND batches, one explicit transaction each."""
+    started = time.perf_counter()
+    done = 0
+    for chunk in chunked(rows, args.batch_size):
+        with session.begin_transaction() as tx:
+            tx.run(query, rows=chunk).consume()
+            tx.commit()
+        done += len(chunk)
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        print(f"{label}: {done} ({done / elapsed:,.0f} в секунду)", end="\r")
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"{label} – {done} за {elapsed:.1f} с ({done / elapsed:,.0f} в секунду)")
+
+def clear_graph(session):
+    while True:
+        deleted = session.run(
+            "MATCH (n) WITH n LIMIT $limit DETACH DELETE n RETURN count(*) AS deleted",
+            limit=args.batch_size
+        ).single()["deleted"]
+        if not deleted:
+            return
+
+def airport_rows():
+    for airport in mongo_db.airports.find({}, {"_id": 0, "code": 1, "name": 1, "city": 1, "country": 1}):
+        yield airport
+
+def flight_rows():
+    flights = mongo_db.flights.find(
+        {},
+        {"_id": 0, "flight_id": 1, "airline": 1, "aircraft": 1, "status": 1, "departure": 1, "arrival": 1},
+        batch_size=args.fetch_size
+    )
+    for flight in flights:
+        yield {
+            "flight_id": flight["flight_id"],
+            "airline_code": flight["airline"]["code"],
+            "airline_name": flight["airline"]["name"],
+            "aircraft": flight.get("aircraft"),
+            "status": flight.get("status"),
+            "departure_gate": flight["departure"].get("gate"),
+            "departure_time": utc(flight["departure"]["time"]),
+            "arrival_time": utc(flight["arrival"]["time"]),
+            "departure_airport": flight["departure"]["airport"],
+            "arrival_airport": flight["arrival"]["airport"]
+        }
+
+def passenger_rows():
+    return mongo_db.passengers.find(
+        {}, {"_id": 0, "passenger_id": 1, "full_name": 1, "nationality": 1},
+        batch_size=args.fetch_size
+    )
+
+def booking_rows():
+    rows = cassandra.execute(SimpleStatement(
+        "SELECT ticket_id, passenger_id, flight_id, seat, class_place, price, booking_date FROM tickets",
+        fetch_size=args.fetch_size
+    ))
     for row in rows:
-        ticket = {
+        yield {
             "ticket_id": row.ticket_id,
             "passenger_id": row.passenger_id,
             "flight_id": row.flight_id,
             "seat": row.seat,
-            "class_place":  row.class_place,
+            "class_place": row.class_place,
             "price": float(row.price),
-            "booking_date": row.booking_date
+            "booking_date": utc(row.booking_date)
         }
-        
-        if isinstance(ticket["booking_date"], datetime):
-            ticket["booking_date"] = ticket["booking_date"].isoformat()
-        
-        session.run("""
-            MERGE (p:Passenger {passenger_id: $passenger_id})
-            MERGE (f:Flight {flight_id: $flight_id})
-            MERGE (p)-[r:BOOKED_FLIGHT]->(f)
-            SET r += {
-                ticket_id: $ticket_id,
-                seat: $seat,
-                class_place: $class_place,
-                price: $price,
-                booking_date: datetime($booking_date)
-            }
-        """, parameters=ticket)
\ No newline at end of file
+
+if __name__ == "__main__":
+    total_started = time.perf_counter()
+    with neo4j.session(database=database) as session:
+        if args.clear:
+            clear_graph(session)
+            print("Граф очищен")
+
+        for constraint in CONSTRAINTS:
+            session.run(constraint).consume()
+        print("Созданы ограничения уникальности")
+
+        load(session, "Аэропорты", LOAD_AIRPORTS, airport_rows())
+        load(session, "Рейсы", LOAD_FLIGHTS, flight_rows())
+        load(session, "Пассажиры", LOAD_PASSENGERS, passenger_rows())
+        load(session, "Бронирования", LOAD_BOOKINGS, booking_rows())
+
+    print(f"Всего: {time.perf_counter() - total_started:.1f} с")
+    neo4j.close()
+    cassandra_cluster.shutdown()
+    mongo_client.close()